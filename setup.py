@@ -29,7 +29,7 @@ else:
 setup(
     author="Tyler Collins",
     author_email='tk11br@sharcnet.ca',
-    python_requires='>=3.5',
+    python_requires='>=3.7',
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Intended Audience :: Developers',
@@ -40,6 +40,12 @@ setup(
         'Programming Language :: Python :: 3.8',
     ],
     description="Extension to ViewClust containing dashboard submodules and more.",
+    entry_points={
+        'console_scripts': [
+            'viewclust-batch=viewclust_vis.batch_suite:main',
+            'viewclust-bench=viewclust_vis.benchmark_suite:main',
+        ],
+    },
     install_requires=requirements,
     license="MIT license",
     long_description=readme + '\n\n' + history,
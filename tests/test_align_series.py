@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""Tests for `align_series` and the resampled traces of `insta_plot`."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from viewclust_vis.align_series import align_series, aligned_column
+from viewclust_vis.insta_plot import insta_plot
+
+
+def _hourly(d_from, d_to, seed, gaps=()):
+    """Random hourly series, without the samples of the gap periods."""
+    index = pd.date_range(d_from, d_to, freq='h')
+    rng = np.random.default_rng(seed)
+    values = pd.Series(rng.random(len(index)) * 10, index=index)
+    for gap_from, gap_to in gaps:
+        values = values.drop(values.loc[gap_from:gap_to].index)
+    return values
+
+
+class TestAlignSeries(unittest.TestCase):
+    """One pass resampling against per series .resample().sum()."""
+
+    def setUp(self):
+        gaps = [('2020-01-04', '2020-01-06 23:00')]
+        self.shared = [_hourly('2020-01-01', '2020-01-20', seed, gaps)
+                       for seed in range(3)]
+        # Shorter, half hour offset and with its own gap
+        self.offset = _hourly('2020-01-03 00:30', '2020-01-15 00:30', 3,
+                              [('2020-01-09', '2020-01-10 23:59')])
+
+    def assert_resampled(self, parts, rule):
+        frame, counts = align_series(parts, rule)
+        for col, part in enumerate(parts):
+            expected = part.resample(rule).sum()
+            pd.testing.assert_series_equal(aligned_column(frame, col),
+                                           expected, check_names=False,
+                                           check_freq=False)
+            self.assertEqual(counts[col], part.count())
+
+    def test_shared_index(self):
+        """Series on one index, empty periods included."""
+        for rule in ('6h', '1D', '7D'):
+            self.assert_resampled(self.shared, rule)
+
+    def test_misaligned(self):
+        """Series on different indexes are joined, then resampled."""
+        for rule in ('6h', '1D'):
+            self.assert_resampled(self.shared + [self.offset], rule)
+
+    def test_no_resample(self):
+        """Without a rule each column keeps its own samples."""
+        frame, counts = align_series(self.shared + [self.offset])
+        pd.testing.assert_series_equal(aligned_column(frame, 3), self.offset,
+                                       check_names=False, check_freq=False)
+        self.assertEqual(list(counts), [part.count() for part in
+                                        self.shared + [self.offset]])
+
+    def test_insta_plot(self):
+        """Every resampled trace, users included, matches .resample().sum()."""
+        clust, queued, running = self.shared
+        user_run = pd.DataFrame({'a': running / 4, 'b': running * 3 / 4})
+        fig = insta_plot(clust, queued, running, resample_str='1D',
+                         submit_run=self.offset, user_run=user_run,
+                         query_bounds=False)
+        traces = {trace.name: trace for trace in fig.data}
+        for name, series in (('Allocation', clust),
+                             ('Resources queued', queued),
+                             ('Resources running', running),
+                             ('Resources run at submit (elapsed)',
+                              self.offset),
+                             ('a', user_run['a']), ('b', user_run['b'])):
+            expected = series.resample('1D').sum()
+            trace = traces[name]
+            np.testing.assert_array_equal(pd.to_datetime(trace.x),
+                                          expected.index, err_msg=name)
+            np.testing.assert_allclose(np.asarray(trace.y, dtype=float),
+                                       expected.to_numpy(), err_msg=name)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""Tests for `batch_suite` and the viewclust-batch entry point."""
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from viewclust_vis.batch_suite import batch_suite, main
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+D_FROM = '2020-01-01T00:00:00'
+D_TO = '2020-01-05T00:00:00'
+
+# Only the usage figures, to keep the accounts quick
+SHOW_ARGS = {'plot_jobstack': False, 'plot_cumu': False}
+
+
+def _sacct_jobs(account, d_from, d_to=''):
+    """Stand-in for slurm.sacct_jobs, failing for the 'bad' accounts."""
+    if account.startswith('bad'):
+        raise RuntimeError('no records for ' + account)
+    return synthetic_jobs(200, D_FROM, D_TO, seed=len(account))
+
+
+class TestBatchSuite(unittest.TestCase):
+    """Failing accounts are isolated from the others."""
+
+    def setUp(self):
+        self.jobs = synthetic_jobs(200, D_FROM, D_TO, seed=1)
+
+    def test_error_isolation(self):
+        """A failing account is reported, the others are still written."""
+        accounts = [{'account': 'def-a_cpu', 'override_frame': self.jobs},
+                    {'account': 'def-b_cpu',
+                     'override_frame': self.jobs.drop(columns='submit')},
+                    {'account': 'def-c_cpu', 'override_frame': self.jobs}]
+        for workers in (1, 2):
+            with tempfile.TemporaryDirectory() as out_root:
+                results = batch_suite(accounts, D_FROM, out_root, target=10,
+                                      d_to=D_TO, workers=workers,
+                                      **SHOW_ARGS)
+                self.assertEqual(list(results), ['def-a_cpu', 'def-b_cpu',
+                                                 'def-c_cpu'])
+                self.assertEqual(results['def-b_cpu']['status'], 'error')
+                self.assertIn('submit', results['def-b_cpu']['error'])
+                for account in ('def-a_cpu', 'def-c_cpu'):
+                    self.assertEqual(results[account]['status'], 'ok')
+                    self.assertEqual(results[account]['n_jobs'],
+                                     len(self.jobs))
+                    self.assertTrue(os.listdir(results[account]['folder']))
+                self.assertTrue(os.path.exists(
+                    os.path.join(out_root, 'index.html')))
+
+    def test_duplicate_accounts(self):
+        with tempfile.TemporaryDirectory() as out_root:
+            with self.assertRaises(AttributeError):
+                batch_suite(['def-a_cpu', {'account': 'def-a_cpu'}], D_FROM,
+                            out_root, target=10, d_to=D_TO, workers=1)
+
+    @mock.patch('viewclust_vis.show_job_use.slurm.sacct_jobs', _sacct_jobs)
+    def test_main(self):
+        """The entry point reads the account file and reports failures."""
+        with tempfile.TemporaryDirectory() as out_root:
+            account_file = os.path.join(out_root, 'accounts.csv')
+            pd.DataFrame({'account': ['def-a_cpu', 'bad-b_cpu'],
+                          'core_eqv_award': [10, 20]}).to_csv(account_file,
+                                                              index=False)
+            with mock.patch('builtins.print') as printed:
+                status = main([account_file, D_FROM, '--d-to', D_TO,
+                               '--out-root', out_root, '--workers', '1'])
+            self.assertEqual(status, 1)
+            lines = [' '.join(str(arg) for arg in call.args)
+                     for call in printed.call_args_list]
+            self.assertIn('Failed account:  bad-b_cpu', lines)
+            self.assertIn('Done 1 of 2 accounts.', lines)
+            self.assertTrue(os.path.exists(
+                os.path.join(out_root, 'def-a_cpu')))
+
+            pd.DataFrame({'account': ['def-a_cpu'],
+                          'core_eqv_award': [10]}).to_csv(account_file,
+                                                          index=False)
+            with mock.patch('builtins.print'):
+                status = main([account_file, D_FROM, '--d-to', D_TO,
+                               '--out-root', out_root, '--workers', '1'])
+            self.assertEqual(status, 0)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""Tests for the `viewclust_vis` benchmark suite."""
+
+
+import json
+import os
+import tempfile
+import unittest
+
+from viewclust_vis.benchmark_suite import benchmark_suite, compare_results
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    """Small runs of the benchmark suite."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.out_root = os.path.join(self.tmp_dir.name, 'out')
+        self.results_dir = os.path.join(self.tmp_dir.name, 'results')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_records(self):
+        """Every function and size gets a record, stored as json."""
+        results = benchmark_suite([300], self.out_root,
+                                  functions=['job_stack', 'insta_plot',
+                                             'delta_plot'],
+                                  results_dir=self.results_dir)
+        records = results['records']
+        self.assertEqual([rec['function'] for rec in records],
+                         ['job_stack', 'insta_plot', 'delta_plot'])
+        for rec in records:
+            self.assertEqual(rec['n_jobs'], 300)
+            self.assertGreater(rec['seconds'], 0)
+            self.assertGreater(rec['peak_bytes'], 0)
+            self.assertGreater(rec['html_bytes'], 0)
+
+        stored = os.listdir(self.results_dir)
+        self.assertEqual(len(stored), 1)
+        with open(os.path.join(self.results_dir, stored[0])) as f_in:
+            self.assertEqual(json.load(f_in)['records'], records)
+
+    def test_compare(self):
+        """Ratios are reported per function and size."""
+        results = benchmark_suite([200], self.out_root,
+                                  functions=['viol_plot'], memory=False)
+        rows = compare_results(results, results)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['seconds'], 1)
+        self.assertIsNone(rows[0]['peak_bytes'])
+
+    def test_invalid_function(self):
+        with self.assertRaises(AttributeError):
+            benchmark_suite([100], self.out_root, functions=['nope'])
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""Tests for `compact_jobs`."""
+
+
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from viewclust_vis.compact_jobs import USAGE_COLUMNS, compact_jobs
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+D_FROM = '2020-01-01T00:00:00'
+D_TO = '2020-01-05T00:00:00'
+
+
+class TestCompactJobs(unittest.TestCase):
+    """Compact dtypes keep every value of the job frame."""
+
+    def setUp(self):
+        self.jobs = synthetic_jobs(400, D_FROM, D_TO, seed=3)
+        for col in ('user', 'state', 'partition', 'jobid', 'reqtres'):
+            self.jobs[col] = self.jobs[col].astype(object)
+
+    def test_dtypes(self):
+        """Repeated strings become categories, integers are downcast."""
+        jobs = self.jobs.copy()
+        compact = compact_jobs(jobs)
+        pd.testing.assert_frame_equal(jobs, self.jobs)
+        self.assertEqual(list(compact.columns), list(jobs.columns))
+
+        for col in ('user', 'state', 'partition'):
+            self.assertIsInstance(compact[col].dtype, pd.CategoricalDtype)
+        # Unique job ids would not gain from categories
+        self.assertEqual(compact['jobid'].dtype, object)
+        self.assertEqual(compact['reqcpus'].dtype.kind, 'i')
+        self.assertLess(compact['reqcpus'].dtype.itemsize,
+                        jobs['reqcpus'].dtype.itemsize)
+        for col in ('submit', 'start', 'end', 'timelimit'):
+            self.assertEqual(compact[col].dtype, jobs[col].dtype)
+        pd.testing.assert_frame_equal(compact, jobs, check_dtype=False,
+                                      check_categorical=False)
+        self.assertLess(compact.memory_usage(deep=True).sum(),
+                        jobs.memory_usage(deep=True).sum())
+
+    def test_max_category_share(self):
+        """Columns with more distinct values than the share stay strings."""
+        jobs = pd.DataFrame({'few': ['a', 'b'] * 5,
+                             'many': list('abcdef') + ['a'] * 4})
+        compact = compact_jobs(jobs, max_category_share=0.5)
+        self.assertIsInstance(compact['few'].dtype, pd.CategoricalDtype)
+        self.assertEqual(compact['many'].dtype, object)
+        compact = compact_jobs(jobs, max_category_share=0.6)
+        self.assertIsInstance(compact['many'].dtype, pd.CategoricalDtype)
+        compact = compact_jobs(jobs, max_category_share=0.1)
+        self.assertEqual(compact['few'].dtype, object)
+
+    def test_columns(self):
+        compact = compact_jobs(self.jobs, columns=USAGE_COLUMNS + ['nope'])
+        self.assertEqual(list(compact.columns),
+                         [col for col in self.jobs.columns
+                          if col in USAGE_COLUMNS])
+
+    def test_show_job_use_keeps_columns(self):
+        """show_job_use returns every column unless asked to prune."""
+        from viewclust_vis.show_job_use import show_job_use
+
+        args = {'account': 'def-a_cpu', 'target': 10, 'd_from': D_FROM,
+                'd_to': D_TO, 'plot_jobstack': False, 'plot_cumu': False,
+                'plot_insta': False, 'override_frame': self.jobs}
+        with tempfile.TemporaryDirectory() as out_root, \
+                mock.patch('builtins.print'):
+            _, job_frame = show_job_use(out_path=out_root, **args)
+            for col in self.jobs.columns:
+                self.assertIn(col, job_frame.columns)
+            self.assertIsInstance(job_frame['state'].dtype,
+                                  pd.CategoricalDtype)
+            _, job_frame = show_job_use(out_path=out_root,
+                                        prune_columns=True, **args)
+            self.assertNotIn('priority', job_frame.columns)
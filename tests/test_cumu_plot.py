@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""Tests for the cumulative curves of `cumu_plot`."""
+
+
+import unittest
+
+import numpy as np
+
+from viewclust_vis.cumu_plot import cumu_plot
+from viewclust_vis.multi_job_use import multi_job_use
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+D_FROM = '2020-01-01T00:00:00'
+D_TO = '2020-01-15T00:00:00'
+
+# Trace name -> usage key
+CURVES = {'Allocation': 'clust', 'Resources consumed': 'running',
+          'Resources queued': 'queued',
+          'Resources run at submit (elapsed)': 'submit_run',
+          'Resources run at submit (timelimit)': 'submit_req'}
+
+
+class TestCumuPlot(unittest.TestCase):
+    """Curves end on the same totals, resampled or not."""
+
+    def setUp(self):
+        jobs = synthetic_jobs(1000, D_FROM, D_TO, n_users=5, seed=8)
+        self.usage = multi_job_use(jobs, D_FROM, 30, d_to=D_TO)
+
+    def _curves(self, resample_str):
+        usage = self.usage
+        fig = cumu_plot(usage['clust'], usage['queued'], usage['running'],
+                        resample_str=resample_str,
+                        submit_run=usage['submit_run'],
+                        submit_req=usage['submit_req'],
+                        user_run=usage['user_run'], plot_queued=True)
+        return {trace.name: np.asarray(trace.y, dtype=float)
+                for trace in fig.data}
+
+    def test_no_resample(self):
+        """Each curve is the cumulative sum divided by the sample count."""
+        curves = self._curves('')
+        for name, key in CURVES.items():
+            values = self.usage[key]
+            np.testing.assert_allclose(
+                curves[name], np.cumsum(values).divide(len(values)),
+                err_msg=name)
+        for user in self.usage['user_run']:
+            values = self.usage['user_run'][user]
+            np.testing.assert_allclose(
+                curves[user], np.cumsum(values).divide(len(values)),
+                err_msg=user)
+
+    def test_resample_totals(self):
+        """Resampling changes the sampling of curves, not their totals."""
+        curves = self._curves('')
+        for resample_str in ('6h', '1D', '7D'):
+            resampled = self._curves(resample_str)
+            for name in curves:
+                self.assertLess(len(resampled[name]), len(curves[name]))
+                self.assertAlmostEqual(resampled[name][-1], curves[name][-1],
+                                       msg=name + ' ' + resample_str)
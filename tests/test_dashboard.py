@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Tests for `dashboard`."""
+
+
+import json
+import os
+import re
+import tempfile
+import unittest
+
+import plotly.graph_objects as go
+
+from viewclust_vis.dashboard import dashboard
+
+
+class TestDashboard(unittest.TestCase):
+    """One page holding a tab per figure."""
+
+    def test_tabs(self):
+        """Every figure gets a tab and lazily parsed JSON data."""
+        figs = {'fig_insta_plot': go.Figure(go.Scatter(y=[1, 2])),
+                'fig_cumu_plot': go.Figure(go.Scatter(y=[3, 4],
+                                                      name='</script>')),
+                'fig_mem_delta': None}
+        with tempfile.TemporaryDirectory() as out_root:
+            fig_out = os.path.join(out_root, 'dash.html')
+            dashboard(figs, fig_out, plotlyjs_root=out_root)
+            with open(fig_out, encoding='utf-8') as f_in:
+                page = f_in.read()
+
+        self.assertEqual(re.findall(r'<button[^>]*>([^<]*)', page),
+                         ['insta plot', 'cumu plot'])
+        self.assertEqual(page.count('<script src='), 1)
+        data = re.findall(r'<script type="application/json" id="fig-\d">'
+                          r'(.*?)</script>', page, re.S)
+        self.assertEqual(len(data), 2)
+        self.assertEqual(json.loads(data[1])['data'][0]['name'],
+                         '</script>')
+
+    def test_empty(self):
+        """Without figures no tab is opened."""
+        with tempfile.TemporaryDirectory() as out_root:
+            fig_out = os.path.join(out_root, 'dash.html')
+            dashboard({'fig_mem_delta': None}, fig_out,
+                      plotlyjs_root=out_root)
+            with open(fig_out, encoding='utf-8') as f_in:
+                page = f_in.read()
+
+        self.assertNotIn('id="tab-', page)
+        self.assertNotIn('<button', page)
+        self.assertIn('No figures.', page)
+        self.assertIn("if (document.getElementById('tab-0')) {\n"
+                      "    openTab(0);\n}", page)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""Tests for the downsampling of long series."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from viewclust_vis.downsample import downsample, lttb_indices, minmax_indices
+
+
+class TestDownsample(unittest.TestCase):
+    """Point selections of both methods on a noisy series with a spike."""
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.y = np.cumsum(rng.normal(size=5000))
+        self.y[1234] = self.y.max() + 50
+        self.y[3210] = self.y.min() - 50
+        self.x = np.arange(5000, dtype='float64')
+
+    def _check(self, idx, max_points):
+        self.assertLessEqual(len(idx), max_points)
+        self.assertEqual(idx[0], 0)
+        self.assertEqual(idx[-1], len(self.y) - 1)
+        self.assertTrue((np.diff(idx) > 0).all())
+        self.assertIn(1234, idx)
+        self.assertIn(3210, idx)
+
+    def test_lttb_indices(self):
+        for max_points in (3, 10, 101, 1000):
+            idx = lttb_indices(self.x, self.y, max_points)
+            self.assertEqual(len(idx), max_points)
+            self.assertEqual(idx[0], 0)
+            self.assertEqual(idx[-1], len(self.y) - 1)
+            self.assertTrue((np.diff(idx) > 0).all())
+        self._check(lttb_indices(self.x, self.y, 200), 200)
+
+    def test_minmax_indices(self):
+        for max_points in (4, 11, 200, 1000):
+            self._check(minmax_indices(self.y, max_points), max_points)
+
+    def test_short_series(self):
+        """Series within max_points are kept whole."""
+        np.testing.assert_array_equal(
+            lttb_indices(self.x[:50], self.y[:50], 50), np.arange(50))
+        np.testing.assert_array_equal(
+            minmax_indices(self.y[:50], 80), np.arange(50))
+
+    def test_downsample_frame(self):
+        """Rows of a frame are selected together, on the row sums."""
+        index = pd.date_range('2020-01-01', periods=5000, freq='h')
+        frame = pd.DataFrame({'a': self.y, 'b': -self.y / 2,
+                              'c': self.x}, index=index)
+        for method in ('lttb', 'minmax'):
+            reduced = downsample(frame, 300, method)
+            self.assertLessEqual(len(reduced), 300)
+            self.assertTrue(reduced.index.is_monotonic_increasing)
+            pd.testing.assert_frame_equal(reduced, frame.loc[reduced.index])
+            series = downsample(frame['a'], 300, method)
+            self.assertIn(index[1234], series.index)
+            self.assertIn(index[3210], series.index)
+        self.assertIs(downsample(frame, 0), frame)
+        with self.assertRaises(AttributeError):
+            downsample(frame, 300, 'every_nth')
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""Tests for `encode_fig`."""
+
+
+import base64
+import unittest
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from viewclust_vis.encode_fig import encode_fig
+
+
+def _decode(typed):
+    """Array of a base64 typed array dict."""
+    dtypes = {'f8': '<f8', 'i4': '<i4', 'i2': '<i2', 'i1': 'i1', 'u1': 'u1'}
+    return np.frombuffer(base64.b64decode(typed['bdata']),
+                         dtype=dtypes[typed['dtype']])
+
+
+class TestEncodeFig(unittest.TestCase):
+    """Compact encoding of figure arrays."""
+
+    def test_regular_index(self):
+        """A regular time index becomes an offset and a step."""
+        index = pd.date_range('2020-01-01', periods=50, freq='5min')
+        fig = go.Figure(go.Scatter(x=index, y=np.arange(50.0)))
+        trace = encode_fig(fig)['data'][0]
+        self.assertNotIn('x', trace)
+        self.assertEqual(pd.Timestamp(trace['x0']), index[0])
+        self.assertEqual(trace['dx'], 5 * 60 * 1000)
+        np.testing.assert_array_equal(_decode(trace['y']), np.arange(50.0))
+
+    def test_irregular_dates(self):
+        """Other dates become epoch milliseconds on a date axis."""
+        dates = pd.to_datetime(['2020-01-01 00:00', None, '2020-01-03 12:00'])
+        fig = go.Figure(go.Scatter(x=dates, y=[1, 2, 3]))
+        encoded = encode_fig(fig)
+        millis = _decode(encoded['data'][0]['x'])
+        self.assertEqual(millis[0], pd.Timestamp('2020-01-01').value / 1e6)
+        self.assertTrue(np.isnan(millis[1]))
+        self.assertEqual(encoded['layout']['xaxis']['type'], 'date')
+
+    def test_figure_unchanged(self):
+        """The figure itself keeps its dates."""
+        index = pd.date_range('2020-01-01', periods=3, freq='1D')
+        fig = go.Figure(go.Scatter(x=index, y=[1, 2, 3]))
+        encode_fig(fig)
+        self.assertEqual(len(fig.data[0].x), 3)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""Import time budgets of the `viewclust_vis` package."""
+
+
+import subprocess
+import sys
+import unittest
+
+
+def _run(code):
+    """Runs code in a fresh interpreter and returns its stdout lines."""
+    result = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True)
+    return result.stdout.split()
+
+
+class TestImportTime(unittest.TestCase):
+    """Importing the package must stay cheap for short-lived processes."""
+
+    # Seconds, generous so that slow CI machines do not flake
+    BUDGET = 0.5
+
+    def test_package_import_is_lazy(self):
+        """Importing the package loads none of the heavy dependencies."""
+        loaded = _run('import sys, viewclust_vis\n'
+                      'for mod in ("plotly", "pandas", "viewclust"):\n'
+                      '    print(mod in sys.modules)')
+        self.assertEqual(loaded, ['False', 'False', 'False'])
+
+    def test_package_import_budget(self):
+        """The package import fits in the budget."""
+        elapsed = _run('import time\n'
+                       't = time.perf_counter()\n'
+                       'import viewclust_vis\n'
+                       'print(time.perf_counter() - t)')
+        self.assertLess(float(elapsed[0]), self.BUDGET)
+
+    def test_lazy_attribute(self):
+        """Public functions resolve on first access."""
+        loaded = _run('import sys, viewclust_vis\n'
+                      'print(callable(viewclust_vis.job_stack))\n'
+                      'print("job_stack" in dir(viewclust_vis))\n'
+                      'print("viewclust_vis.show_job_use" in sys.modules)')
+        self.assertEqual(loaded, ['True', 'True', 'False'])
+
+    def test_attribute_after_submodule_import(self):
+        """Submodule imports do not shadow the functions of the same name."""
+        loaded = _run('import types, viewclust_vis\n'
+                      'from viewclust_vis.show_job_use import show_job_use\n'
+                      'for name in ("job_stack", "insta_plot", "cumu_plot"):\n'
+                      '    attr = getattr(viewclust_vis, name)\n'
+                      '    print(isinstance(attr, types.FunctionType))')
+        self.assertEqual(loaded, ['True', 'True', 'True'])
+
+    def test_show_job_use_defers_plotly_express(self):
+        """plotly.express is only imported once show_job_use runs."""
+        loaded = _run('import sys\n'
+                      'from viewclust_vis import show_job_use\n'
+                      'print("plotly.express" in sys.modules)')
+        self.assertEqual(loaded, ['False'])
+
+    def test_unknown_attribute(self):
+        """Unknown names still raise AttributeError."""
+        import viewclust_vis
+        with self.assertRaises(AttributeError):
+            viewclust_vis.not_a_function
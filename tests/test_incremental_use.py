@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""Tests for `incremental_job_use` and its state file."""
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from viewclust_vis.incremental_use import (incremental_job_use,
+                                           load_use_state, save_use_state,
+                                           state_matches)
+from viewclust_vis.multi_job_use import multi_job_use
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+D_FROM = '2020-01-01T00:00:00'
+T1 = '2020-01-20T12:30:00'
+T2 = '2020-02-01T00:00:00'
+
+
+def _snapshot(jobs, t_query):
+    """Jobs as sacct would have returned them at t_query."""
+    t_query = pd.Timestamp(t_query)
+    jobs = jobs[jobs['submit'] <= t_query].copy()
+    pending = jobs['start'].isnull() | (jobs['start'] > t_query)
+    running = ~pending & (jobs['end'].isnull() | (jobs['end'] > t_query))
+    jobs.loc[pending, ['start', 'end']] = pd.NaT
+    jobs.loc[pending, 'state'] = 'PENDING'
+    jobs.loc[running, 'end'] = pd.NaT
+    jobs.loc[running, 'state'] = 'RUNNING'
+    return jobs.reset_index(drop=True)
+
+
+def _changed_since(jobs, t_from):
+    """Jobs a sacct query starting at t_from returns."""
+    active = jobs['end'].isnull() | (jobs['end'] >= pd.Timestamp(t_from))
+    return jobs[active].reset_index(drop=True)
+
+
+class TestIncrementalUse(unittest.TestCase):
+    """A refreshed state matches a full computation at the new time."""
+
+    def setUp(self):
+        self.jobs = synthetic_jobs(2000, D_FROM, T2, n_users=8, seed=11)
+
+    def assert_same_usage(self, usage, expected):
+        self.assertEqual(sorted(usage), sorted(expected))
+        for name, values in expected.items():
+            self.assertTrue(values.index.equals(usage[name].index), name)
+            np.testing.assert_allclose(usage[name].to_numpy(dtype=float),
+                                       values.to_numpy(dtype=float),
+                                       atol=1e-6, err_msg=name)
+        self.assertEqual(list(usage['user_run'].columns),
+                         list(expected['user_run'].columns))
+
+    def test_refresh(self):
+        """T1 state refreshed with the jobs changed since T1 equals T2."""
+        at_t1 = _snapshot(self.jobs, T1)
+        usage, job_frame, state = incremental_job_use(at_t1, D_FROM, 40, T1,
+                                                      use_unit='cpu-eqv')
+        self.assert_same_usage(usage, multi_job_use(at_t1, D_FROM, 40,
+                                                    d_to=T1,
+                                                    use_unit='cpu-eqv'))
+        self.assertEqual(state['watermark'], T1)
+
+        at_t2 = _snapshot(self.jobs, T2)
+        changed = _changed_since(at_t2, T1)
+        # Some jobs end, start or are submitted between the snapshots
+        self.assertLess(len(changed), len(at_t2))
+        self.assertTrue((changed['submit'] > pd.Timestamp(T1)).any())
+        self.assertTrue((changed['end'] < pd.Timestamp(T2)).any())
+
+        usage, job_frame, state = incremental_job_use(
+            changed, D_FROM, 40, T2, use_unit='cpu-eqv', state=state)
+        self.assert_same_usage(usage, multi_job_use(at_t2, D_FROM, 40,
+                                                    d_to=T2,
+                                                    use_unit='cpu-eqv'))
+        self.assertEqual(sorted(job_frame['jobid']), sorted(at_t2['jobid']))
+        self.assertEqual(state['watermark'], T2)
+
+        # Nothing changed: the stored series only get the new baseline
+        usage, _, _ = incremental_job_use(changed.iloc[:0], D_FROM, 40, T2,
+                                          use_unit='cpu-eqv', state=state)
+        self.assert_same_usage(usage, multi_job_use(at_t2, D_FROM, 40,
+                                                    d_to=T2,
+                                                    use_unit='cpu-eqv'))
+
+    def test_state_file(self):
+        """States round trip and only match the query they were built for."""
+        _, _, state = incremental_job_use(_snapshot(self.jobs, T1), D_FROM,
+                                          40, T1)
+        with tempfile.TemporaryDirectory() as out_root:
+            state_path = os.path.join(out_root, 'state.pkl')
+            self.assertIsNone(load_use_state(state_path))
+            save_use_state(state_path, state)
+            self.assertEqual(os.listdir(out_root), ['state.pkl'])
+            loaded = load_use_state(state_path)
+        pd.testing.assert_frame_equal(loaded['jobs'], state['jobs'])
+        pd.testing.assert_frame_equal(loaded['usage']['user_run'],
+                                      state['usage']['user_run'])
+        self.assertEqual(loaded['span_end'], state['span_end'])
+
+        self.assertTrue(state_matches(loaded, D_FROM, 40, 'cpu'))
+        self.assertFalse(state_matches(None, D_FROM, 40, 'cpu'))
+        self.assertFalse(state_matches(loaded, '2020-01-02T00:00:00', 40,
+                                       'cpu'))
+        self.assertFalse(state_matches(loaded, D_FROM, 41, 'cpu'))
+        self.assertFalse(state_matches(loaded, D_FROM, 40, 'cpu-eqv'))
+        self.assertFalse(state_matches(loaded, D_FROM,
+                                       state['usage']['clust'], 'cpu'))
+
+    def test_mismatch_recomputes(self):
+        """show_job_use queries everything again if the state differs."""
+        from viewclust_vis.show_job_use import show_job_use
+
+        at_t1 = _snapshot(self.jobs, T1)
+        with tempfile.TemporaryDirectory() as out_root:
+            args = {'account': 'def-a_cpu', 'd_from': D_FROM,
+                    'plot_jobstack': False, 'plot_cumu': False,
+                    'plot_insta': False, 'out_path': out_root,
+                    'state_path': os.path.join(out_root, 'state.pkl')}
+            with mock.patch('viewclust_vis.show_job_use.slurm.sacct_jobs',
+                            return_value=at_t1) as sacct, \
+                    mock.patch('builtins.print'):
+                show_job_use(target=40, d_to=T1, **args)
+                show_job_use(target=40, d_to=T2, **args)
+                show_job_use(target=50, d_to=T2, **args)
+            self.assertEqual([call.args[1] for call in sacct.call_args_list],
+                             [D_FROM, T1, D_FROM])
+            self.assertEqual(load_use_state(args['state_path'])['target'],
+                             50)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""Tests for `JobIndex`."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from viewclust_vis.job_index import JobIndex
+from viewclust_vis.job_stack import job_stack
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+
+class TestJobIndex(unittest.TestCase):
+    """Window queries against full scans of the job frame."""
+
+    def setUp(self):
+        self.jobs = synthetic_jobs(3000, '2020-01-01', '2020-03-01', seed=5)
+        self.jobs.loc[::40, 'end'] = pd.NaT
+        self.jobs.loc[::90, 'submit'] = pd.NaT
+
+    def test_overlapping(self):
+        """Overlapping jobs match a scan, for both span kinds."""
+        jobs = self.jobs
+        req_end = jobs['start'] + jobs['timelimit']
+        index = JobIndex(jobs)
+        request_index = JobIndex(jobs, span='request')
+        for d_from, d_to in (('2020-01-10', '2020-01-17'),
+                             ('2020-02-20T06:00:00', '2020-02-20T07:00:00'),
+                             ('2019-01-01', '2019-02-01')):
+            expected = ((jobs['submit'] <= d_to) &
+                        (jobs['end'].isna() | (jobs['end'] >= d_from)))
+            np.testing.assert_array_equal(index.overlapping(d_from, d_to),
+                                          np.flatnonzero(expected))
+            expected = ((jobs['start'] <= d_to) &
+                        (req_end.isna() | (req_end >= d_from)))
+            np.testing.assert_array_equal(
+                request_index.overlapping(d_from, d_to),
+                np.flatnonzero(expected))
+        self.assertEqual(len(index.overlapping()), jobs['submit'].count())
+
+    def test_windows(self):
+        """Weekly windows cover every job of the period."""
+        index = JobIndex(self.jobs)
+        weeks = list(index.windows('2020-01-01', '2020-03-01', '7D'))
+        self.assertEqual(len(weeks), 9)
+        found = np.unique(np.concatenate([pos for _, pos in weeks]))
+        np.testing.assert_array_equal(
+            found, index.overlapping('2020-01-01', '2020-03-01'))
+
+    def test_job_stack_window(self):
+        """job_stack draws only the jobs of its window."""
+        index = JobIndex(self.jobs)
+        fig = job_stack(self.jobs, d_from='2020-01-10', d_to='2020-01-11',
+                        job_index=index)
+        n_jobs = len(index.overlapping('2020-01-10', '2020-01-11'))
+        self.assertEqual(len(fig.data[3].x), n_jobs)
+
+    def test_invalid_span(self):
+        with self.assertRaises(AttributeError):
+            JobIndex(self.jobs, span='wait')
+
+    def test_job_stack_invalid_index(self):
+        """job_stack refuses an index of another frame or span."""
+        args = {'d_from': '2020-01-10', 'd_to': '2020-01-11'}
+        with self.assertRaises(AttributeError):
+            job_stack(self.jobs.copy(), job_index=JobIndex(self.jobs),
+                      **args)
+        with self.assertRaises(AttributeError):
+            job_stack(self.jobs, job_index=JobIndex(self.jobs, 'request'),
+                      **args)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""Tests for the per partition figures of `job_scatter`."""
+
+
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from viewclust_vis.job_scatter import (_job_groups, _partition_histogram,
+                                       _partition_scatter, job_scatter)
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+D_FROM = '2020-01-01T00:00:00'
+D_TO = '2020-01-05T00:00:00'
+
+
+class TestJobScatter(unittest.TestCase):
+    """Traces match the px figures they replace."""
+
+    def setUp(self):
+        jobs = synthetic_jobs(600, D_FROM, D_TO, seed=9)
+        jobs['waittime_hours'] = (jobs['start'] -
+                                  jobs['submit']).dt.total_seconds() / 3600
+        jobs['mem_c'] = jobs['mem'] / jobs['reqcpus']
+        self.jobs = jobs
+
+    def assert_same_traces(self, fig, px_fig, axes):
+        self.assertEqual([trace.name for trace in fig.data],
+                         [trace.name for trace in px_fig.data])
+        for trace, px_trace in zip(fig.data, px_fig.data):
+            self.assertEqual(trace.marker.color.lower(),
+                             px_trace.marker.color.lower())
+            for axis in axes:
+                np.testing.assert_allclose(
+                    np.asarray(trace[axis], dtype=float),
+                    np.asarray(px_trace[axis], dtype=float))
+            # px indexes its 2D customdata, ours is one column
+            self.assertEqual(trace.hovertemplate,
+                             px_trace.hovertemplate.replace('customdata[0]',
+                                                            'customdata'))
+
+    def test_histograms(self):
+        """Per partition counts and colors, all, pending and running."""
+        jobs = self.jobs
+        groups, pend_groups, run_groups = _job_groups(jobs)
+        priority = jobs['priority'].to_numpy()
+        for part_groups, state in ((groups, None), (pend_groups, 'PENDING'),
+                                   (run_groups, 'RUNNING')):
+            frame = jobs if state is None else jobs[jobs['state'] == state]
+            self.assertGreater(len(frame), 0)
+            fig = _partition_histogram(part_groups, priority, 'priority',
+                                       'y')
+            px_fig = px.histogram(frame, y='priority', color='partition')
+            self.assert_same_traces(fig, px_fig, ['y'])
+
+        waittime = jobs['waittime_hours'].to_numpy()
+        fig = _partition_histogram(groups, waittime, 'waittime_hours', 'x')
+        px_fig = px.histogram(jobs, x='waittime_hours', color='partition')
+        self.assert_same_traces(fig, px_fig, ['x'])
+
+    def test_scatters(self):
+        """Points, colors and hover fields of both scatters."""
+        jobs = self.jobs
+        groups, _, run_groups = _job_groups(jobs)
+        fig = _partition_scatter(go.Scatter, groups,
+                                 jobs['waittime_hours'].to_numpy(),
+                                 jobs['priority'].to_numpy(),
+                                 'waittime_hours')
+        px_fig = px.scatter(jobs, x='waittime_hours', y='priority',
+                            opacity=.3, color='partition')
+        self.assert_same_traces(fig, px_fig, ['x', 'y'])
+
+        running = jobs[jobs['state'] == 'RUNNING']
+        fig = _partition_scatter(go.Scatter, run_groups,
+                                 jobs['mem_c'].to_numpy(),
+                                 jobs['priority'].to_numpy(), 'mem_c',
+                                 jobs['jobid'].to_numpy())
+        px_fig = px.scatter(running, x='mem_c', y='priority', opacity=.3,
+                            color='partition', hover_data=['jobid'])
+        self.assert_same_traces(fig, px_fig, ['x', 'y'])
+        for trace, px_trace in zip(fig.data, px_fig.data):
+            np.testing.assert_array_equal(trace.customdata,
+                                          px_trace.customdata[:, 0])
+
+    def test_job_scatter(self):
+        """Every figure is written and the frame is not printed."""
+        with tempfile.TemporaryDirectory() as out_root, \
+                mock.patch('builtins.print') as printed:
+            job_scatter('def-a_cpu', 10, D_FROM, d_to=D_TO,
+                        out_path=out_root, override_frame=self.jobs,
+                        workers=1)
+        self.assertEqual([call.args for call in printed.call_args_list],
+                         [('Number of jobs in query: 600',)])
+
+    def test_keeps_columns(self):
+        """The returned frame keeps every column unless asked to prune."""
+        args = {'account': 'def-a_cpu', 'target': 10, 'd_from': D_FROM,
+                'd_to': D_TO, 'workers': 1}
+        with tempfile.TemporaryDirectory() as out_root, \
+                mock.patch('builtins.print'):
+            job_frame = job_scatter(out_path=out_root,
+                                    override_frame=self.jobs.copy(), **args)
+            for col in self.jobs.columns:
+                self.assertIn(col, job_frame.columns)
+            job_frame = job_scatter(out_path=out_root,
+                                    override_frame=self.jobs.copy(),
+                                    prune_columns=True, **args)
+            self.assertNotIn('reqtres', job_frame.columns)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""Tests for the rectangles and density layers of `job_stack`."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from viewclust_vis.job_index import JobIndex
+from viewclust_vis.job_stack import job_stack, stack_density
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+
+class TestJobStackDensity(unittest.TestCase):
+    """Binned rectangles against the area of every job in every cell."""
+
+    def setUp(self):
+        self.jobs = synthetic_jobs(300, '2020-01-01', '2020-01-10', seed=3)
+
+    def test_stack_density(self):
+        """Covered fractions match the exact overlap areas."""
+        jobs = self.jobs.copy()
+        jobs['use_unit'] = jobs['reqcpus']
+        n_x, n_y = 40, 20
+        _, _, layers = stack_density(jobs, (n_x, n_y))
+
+        def _ns(times):
+            return times.to_numpy(dtype='datetime64[ns]').astype('int64')
+
+        submit, start, end = (_ns(jobs['submit']), _ns(jobs['start']),
+                              _ns(jobs['end']))
+        req_end = _ns(jobs['start'] + jobs['timelimit'])
+        top = np.cumsum(jobs['use_unit'].to_numpy(dtype='float64'))
+        bottom = top - jobs['use_unit'].to_numpy(dtype='float64')
+        x_edges = np.linspace(submit.min(), max(end.max(), req_end.max()),
+                              n_x + 1)
+        y_edges = np.linspace(0, top[-1], n_y + 1)
+
+        def _overlap(lo, hi, edges):
+            cover = (np.minimum(hi[:, None], edges[None, 1:]) -
+                     np.maximum(lo[:, None], edges[None, :-1]))
+            return np.clip(cover, 0, None) / (edges[1] - edges[0])
+
+        y_cover = _overlap(bottom, top, y_edges)
+        for name, t_a, t_b in (('queued', submit, start),
+                               ('running', start, end),
+                               ('requested', end, req_end)):
+            x_cover = _overlap(np.minimum(t_a, t_b), np.maximum(t_a, t_b),
+                               x_edges)
+            np.testing.assert_allclose(np.nan_to_num(layers[name]),
+                                       y_cover.T @ x_cover, atol=1e-5)
+
+    def test_auto_aggregate(self):
+        """Large stacks are binned, narrow windows draw every job."""
+        fig = job_stack(self.jobs, density_threshold=100,
+                        density_bins=(60, 30))
+        self.assertEqual([trace.type for trace in fig.data],
+                         ['heatmap'] * 3)
+        self.assertEqual(fig.data[0].z.shape, (30, 60))
+
+        index = JobIndex(self.jobs)
+        fig = job_stack(self.jobs, d_from='2020-01-05',
+                        d_to='2020-01-05T03:00:00', job_index=index,
+                        density_threshold=100)
+        n_jobs = len(index.overlapping('2020-01-05', '2020-01-05T03:00:00'))
+        self.assertLess(n_jobs, 100)
+        self.assertEqual(len(fig.data[3].x), n_jobs)
+
+    def test_invalid_aggregate(self):
+        with self.assertRaises(AttributeError):
+            job_stack(self.jobs, aggregate='hexbin')
+
+
+def _loop_geometry(jobs):
+    """Rectangles as the former per row job_stack loop built them."""
+    x_queue, x_run, x_req, y_cumu = [], [], [], []
+    res_count = 0
+    for _, row in jobs.iterrows():
+        req_end = row['start'] + row['timelimit']
+        x_queue += [row['submit'], row['start'], row['start'],
+                    row['submit'], row['submit'], None]
+        x_run += [row['start'], row['end'], row['end'], row['start'],
+                  row['start'], None]
+        x_req += [row['end'], req_end, req_end, row['end'], row['end'],
+                  None]
+        y_cumu += [res_count, res_count, res_count + row['use_unit'],
+                   res_count + row['use_unit'], res_count, None]
+        res_count = res_count + row['use_unit']
+    return x_queue, x_run, x_req, y_cumu
+
+
+class TestJobStackGeometry(unittest.TestCase):
+    """Vectorized rectangles against the former per row loop."""
+
+    def setUp(self):
+        hour = pd.Timedelta(hours=1)
+        t_0 = pd.Timestamp('2020-01-01')
+        self.jobs = pd.DataFrame({
+            'jobid': ['1', '2', '3'],
+            'submit': [t_0, t_0 + hour / 2, t_0 + hour],
+            'start': [t_0 + hour, t_0 + 2 * hour, pd.NaT],
+            'end': [t_0 + 3 * hour, t_0 + 2.5 * hour, pd.NaT],
+            'timelimit': [4 * hour, hour, 2 * hour],
+            'reqcpus': [2, 4, 1],
+            'mem': [4000, 32000, 1000],
+            'reqtres': ['billing=2,cpu=2,mem=4000M,node=1,gres/gpu=1',
+                        'billing=8,cpu=4,mem=32000M,node=1,gres/gpu=2',
+                        'billing=1,cpu=1,mem=1000M,node=1,gres/gpu=4']})
+
+    def test_units(self):
+        """Heights stack each unit, separators are NaN and NaT."""
+        heights = {'cpu': [2, 4, 1], 'cpu-eqv': [2, 8, 1],
+                   'gpu': [1, 2, 4]}
+        for use_unit, use in heights.items():
+            fig = job_stack(self.jobs, use_unit=use_unit, aggregate='jobs')
+            top = np.cumsum(use)
+            bottom = top - use
+            expected_y = np.column_stack([bottom, bottom, top, top, bottom,
+                                          np.full(3, np.nan)]).ravel()
+            for trace in fig.data[:3]:
+                np.testing.assert_array_equal(
+                    np.asarray(trace.y, dtype=float), expected_y,
+                    err_msg=use_unit)
+
+            jobs = self.jobs.copy()
+            jobs['use_unit'] = use
+            loop = _loop_geometry(jobs)
+            for trace, loop_x in zip(fig.data[:3], loop[:3]):
+                x = pd.to_datetime(pd.Series(trace.x))
+                pd.testing.assert_series_equal(
+                    x, pd.to_datetime(pd.Series(loop_x)), check_names=False)
+                self.assertTrue(x[5::6].isna().all())
+            np.testing.assert_array_equal(
+                np.asarray(fig.data[0].y, dtype=float),
+                np.asarray(loop[3], dtype=float))
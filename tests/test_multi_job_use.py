@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""Tests for `multi_job_use` against the viewclust calls it replaces."""
+
+
+import unittest
+import warnings
+
+import numpy as np
+import viewclust as vc
+
+from viewclust_vis.multi_job_use import multi_job_use
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+D_FROM = '2020-01-01T00:00:00'
+D_TO = '2020-01-04T00:00:00'
+
+
+class TestMultiJobUse(unittest.TestCase):
+    """Every usage series matches viewclust, for each use unit."""
+
+    def setUp(self):
+        self.jobs = synthetic_jobs(150, D_FROM, D_TO, n_users=4, seed=7)
+
+    def _viewclust_use(self, use_unit):
+        """The five job_use calls and get_users_run of the docstring."""
+        jobs = self.jobs
+        args = (D_FROM, 40)
+        kwargs = {'d_to': D_TO, 'use_unit': use_unit}
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            clust, queued, running, dist = vc.job_use(jobs.copy(), *args,
+                                                      **kwargs)
+            run_running = vc.job_use(jobs.copy(), *args, job_state='running',
+                                     **kwargs)[2]
+            q_queued = vc.job_use(jobs.copy(), *args, job_state='queued',
+                                  **kwargs)[2]
+            submit_run = vc.job_use(jobs.copy(), *args, time_ref='sub',
+                                    **kwargs)[2]
+            submit_req = vc.job_use(jobs.copy(), *args, time_ref='sub+req',
+                                    **kwargs)[2]
+            user_run = vc.get_users_run(jobs.copy(), *args, **kwargs)
+        return {'clust': clust, 'queued': queued, 'running': running,
+                'dist': dist, 'run_running': run_running,
+                'q_queued': q_queued, 'submit_run': submit_run,
+                'submit_req': submit_req, 'user_run': user_run}
+
+    def test_use_units(self):
+        for use_unit in ('cpu', 'cpu-eqv', 'gpu'):
+            expected = self._viewclust_use(use_unit)
+            usage = multi_job_use(self.jobs, D_FROM, 40, d_to=D_TO,
+                                  use_unit=use_unit)
+            self.assertEqual(sorted(usage), sorted(expected))
+            for name, values in expected.items():
+                msg = use_unit + ' ' + name
+                self.assertTrue(values.index.equals(usage[name].index), msg)
+                np.testing.assert_allclose(
+                    usage[name].to_numpy(dtype=float),
+                    values.to_numpy(dtype=float), atol=1e-9, err_msg=msg)
+            self.assertEqual(list(usage['user_run'].columns),
+                             list(expected['user_run'].columns))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""Tests for the SVG / WebGL trace selection."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from viewclust_vis.render_mode import (resolve_render_mode, scatter_type,
+                                       stacked_traces)
+
+
+class TestRenderMode(unittest.TestCase):
+    """Threshold switch and stacking of both trace types."""
+
+    def test_auto_threshold(self):
+        """'auto' switches to WebGL strictly above the threshold."""
+        self.assertEqual(resolve_render_mode(100, 'auto', 100), 'svg')
+        self.assertEqual(resolve_render_mode(101, 'auto', 100), 'webgl')
+        self.assertIs(scatter_type(100, 'auto', 100), go.Scatter)
+        self.assertIs(scatter_type(101, 'auto', 100), go.Scattergl)
+        self.assertIs(scatter_type(10**6, 'svg', 100), go.Scatter)
+        self.assertIs(scatter_type(1, 'webgl', 100), go.Scattergl)
+        with self.assertRaises(AttributeError):
+            resolve_render_mode(1, 'canvas')
+
+    def test_stacked_traces(self):
+        """Stacked heights are the running sum of the columns."""
+        index = pd.date_range('2020-01-01', periods=24, freq='h')
+        rng = np.random.default_rng(2)
+        frame = pd.DataFrame(rng.random((24, 3)), index=index,
+                             columns=['a', 'b', 'c'])
+        frame.iloc[3, 1] = np.nan
+        expected = frame.fillna(0).cumsum(axis=1)
+
+        traces = stacked_traces(frame, go.Scatter)
+        self.assertEqual([trace.stackgroup for trace in traces],
+                         ['use'] * 3)
+        # plotly stacks these itself, missing values as zero
+        stacked = np.cumsum([np.nan_to_num(np.asarray(trace.y, dtype=float))
+                             for trace in traces], axis=0)
+        np.testing.assert_allclose(stacked.T, expected.to_numpy())
+
+        traces = stacked_traces(frame, go.Scattergl)
+        self.assertEqual([trace.fill for trace in traces],
+                         ['tozeroy', 'tonexty', 'tonexty'])
+        for trace, col in zip(traces, frame):
+            np.testing.assert_allclose(trace.y, expected[col])
+            np.testing.assert_array_equal(trace.text, frame[col])
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""Tests for `cached_sacct_jobs`, with slurm replaced by synthetic jobs."""
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from viewclust_vis.sacct_cache import _evict, cached_sacct_jobs
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+
+class FakeSacct:
+    """Records every query and answers with jobs submitted in its window.
+
+    Job ids are unique per window, except for 'shared', which every query
+    returns with the window start as its state.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, account, d_from, d_to=''):
+        self.calls.append((account, d_from, d_to))
+        jobs = synthetic_jobs(40, d_from, d_to, seed=len(self.calls))
+        jobs['jobid'] = str(pd.Timestamp(d_from).value) + '_' + jobs['jobid']
+        jobs.loc[0, 'jobid'] = 'shared'
+        jobs.loc[0, 'state'] = d_from
+        return jobs
+
+
+class TestSacctCache(unittest.TestCase):
+    """Month partitions, open tail and eviction of the cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+        self.sacct = FakeSacct()
+        patcher = mock.patch('viewclust_vis.sacct_cache.slurm.sacct_jobs',
+                             self.sacct)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_final_months(self):
+        """Final months are queried once, then read from disk."""
+        jobs = cached_sacct_jobs('def-a_cpu', '2020-01-01T00:00:00',
+                                 d_to='2020-03-15T00:00:00',
+                                 cache_dir=self.cache_dir)
+        self.assertEqual([call[1][:10] for call in self.sacct.calls],
+                         ['2020-01-01', '2020-02-01', '2020-03-01'])
+        self.assertEqual(len(os.listdir(
+            os.path.join(self.cache_dir, 'def-a_cpu'))), 3)
+        self.assertTrue(jobs['jobid'].is_unique)
+
+        rerun = cached_sacct_jobs('def-a_cpu', '2020-01-01T00:00:00',
+                                  d_to='2020-03-15T00:00:00',
+                                  cache_dir=self.cache_dir)
+        self.assertEqual(len(self.sacct.calls), 3)
+        pd.testing.assert_frame_equal(rerun, jobs)
+
+    def test_open_tail(self):
+        """Months ending within settle are queried in one open call."""
+        settle = str(pd.Timestamp.now() - pd.Timestamp('2020-02-20'))
+        for _ in range(2):
+            jobs = cached_sacct_jobs('def-a_cpu', '2020-01-01T00:00:00',
+                                     d_to='2020-03-15T00:00:00',
+                                     cache_dir=self.cache_dir, settle=settle)
+        self.assertEqual(self.sacct.calls, [
+            ('def-a_cpu', '2020-01-01T00:00:00', '2020-02-01T00:00:00'),
+            ('def-a_cpu', '2020-02-01T00:00:00', '2020-03-15T00:00:00'),
+            ('def-a_cpu', '2020-02-01T00:00:00', '2020-03-15T00:00:00')])
+        self.assertEqual(os.listdir(os.path.join(self.cache_dir,
+                                                 'def-a_cpu'))[0][:7],
+                         '2020-01')
+        self.assertFalse(jobs.empty)
+
+    def test_dedup_keeps_last(self):
+        """A job found in several partitions keeps its latest record."""
+        jobs = cached_sacct_jobs('def-a_cpu', '2020-01-01T00:00:00',
+                                 d_to='2020-03-15T00:00:00',
+                                 cache_dir=self.cache_dir)
+        shared = jobs[jobs['jobid'] == 'shared']
+        self.assertEqual(len(shared), 1)
+        self.assertEqual(shared['state'].iloc[0], '2020-03-01T00:00:00')
+
+    def test_evict(self):
+        """Least recently used partitions go first, down to max_bytes."""
+        part_dir = os.path.join(self.cache_dir, 'def-a_cpu')
+        os.makedirs(part_dir)
+        for age, name in enumerate(['2020-03.pkl', '2020-01.pkl',
+                                    '2020-02.pkl']):
+            path = os.path.join(part_dir, name)
+            with open(path, 'wb') as f_out:
+                f_out.write(b'x' * 100)
+            os.utime(path, (1e9 - age * 1000, 1e9 - age * 1000))
+        _evict(self.cache_dir, 250)
+        self.assertEqual(sorted(os.listdir(part_dir)),
+                         ['2020-01.pkl', '2020-03.pkl'])
+        _evict(self.cache_dir, 100)
+        self.assertEqual(os.listdir(part_dir), ['2020-03.pkl'])
+        _evict(self.cache_dir, 0)
+        self.assertEqual(os.listdir(part_dir), [])
+
+    def test_show_job_use_refresh(self):
+        """A state refresh queries from its watermark through the cache."""
+        from viewclust_vis.show_job_use import show_job_use
+
+        args = {'account': 'def-a_cpu', 'target': 10,
+                'd_from': '2020-01-01T00:00:00', 'plot_jobstack': False,
+                'plot_cumu': False, 'cache_dir': self.cache_dir,
+                'state_path': os.path.join(self.cache_dir, 'state.pkl'),
+                'out_path': os.path.join(self.cache_dir, 'out')}
+        with mock.patch('viewclust_vis.show_job_use.cached_sacct_jobs',
+                        wraps=cached_sacct_jobs) as cached, \
+                mock.patch('builtins.print'):
+            show_job_use(d_to='2020-03-01T00:00:00', **args)
+            show_job_use(d_to='2020-03-15T00:00:00', **args)
+        self.assertEqual([call.args[1] for call in cached.call_args_list],
+                         ['2020-01-01T00:00:00', '2020-03-01T00:00:00'])
+        # March is final, the refresh caches it as one partition
+        self.assertEqual(self.sacct.calls[-1][1], '2020-03-01T00:00:00')
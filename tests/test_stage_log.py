@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""Tests for `StageLog`."""
+
+
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+from viewclust_vis.stage_log import StageLog, _max_rss_mb, log_stage
+
+
+class TestStageLog(unittest.TestCase):
+    """Per stage records and their export."""
+
+    def test_records(self):
+        """Stages are recorded in order with their costs."""
+        seen = []
+        stage_log = StageLog(callback=seen.append, context={'account': 'a'})
+        with stage_log.stage('query') as record:
+            record['rows'] = 10
+        with log_stage(stage_log, 'write', figure='f.html') as record:
+            record['bytes'] = 5
+
+        self.assertEqual(seen, stage_log.records)
+        self.assertEqual([r['stage'] for r in seen], ['query', 'write'])
+        self.assertEqual(seen[0]['rows'], 10)
+        self.assertEqual(seen[1]['figure'], 'f.html')
+        for record in seen:
+            self.assertEqual(record['account'], 'a')
+            self.assertGreaterEqual(record['wall_s'], 0)
+            self.assertIn('cpu_s', record)
+
+    @unittest.skipUnless(hasattr(tracemalloc, 'reset_peak'),
+                         'needs Python 3.9')
+    def test_peak_memory(self):
+        """Stages record the peak of traced memory."""
+        stage_log = StageLog(trace_memory=True)
+        try:
+            with stage_log.stage('usage'):
+                bytearray(2**21)
+        finally:
+            tracemalloc.stop()
+        self.assertGreaterEqual(stage_log.records[0]['peak_mb'], 2)
+
+    def test_trace_memory(self):
+        """Without reset_peak, stages record the traced memory delta."""
+        traced = mock.Mock(spec=['start', 'is_tracing', 'get_traced_memory'])
+        traced.is_tracing.return_value = False
+        traced.get_traced_memory.side_effect = [(2**20, 2**21),
+                                                (3 * 2**20, 2**22)]
+        with mock.patch('viewclust_vis.stage_log.tracemalloc', traced):
+            stage_log = StageLog(trace_memory=True)
+            with stage_log.stage('usage'):
+                pass
+        traced.start.assert_called_once_with()
+        self.assertEqual(stage_log.records[0]['delta_mb'], 2)
+        self.assertNotIn('peak_mb', stage_log.records[0])
+
+    def test_max_rss(self):
+        """ru_maxrss is read as kB on Linux and bytes on macOS."""
+        usage = mock.Mock(ru_maxrss=2**21)
+        with mock.patch('resource.getrusage', return_value=usage):
+            with mock.patch('sys.platform', 'linux'):
+                self.assertEqual(_max_rss_mb(), 2**11)
+            with mock.patch('sys.platform', 'darwin'):
+                self.assertEqual(_max_rss_mb(), 2)
+
+    def test_no_log(self):
+        """Without a log, stages still run."""
+        with log_stage(None, 'query') as record:
+            record['rows'] = 1
+
+    def test_jsonl(self):
+        """Records are appended as JSON lines."""
+        stage_log = StageLog()
+        with stage_log.stage('usage'):
+            pass
+        with tempfile.TemporaryDirectory() as out_root:
+            path = os.path.join(out_root, 'stages.jsonl')
+            stage_log.to_jsonl(path)
+            stage_log.to_jsonl(path)
+            with open(path, encoding='utf-8') as f_in:
+                lines = [json.loads(line) for line in f_in]
+        self.assertEqual([line['stage'] for line in lines], ['usage'] * 2)
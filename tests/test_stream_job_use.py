@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""Tests for `stream_job_use`."""
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from viewclust_vis.multi_job_use import multi_job_use
+from viewclust_vis.stream_job_use import read_job_chunks, stream_job_use
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+D_FROM = '2020-01-01T00:00:00'
+D_TO = '2020-02-01T00:00:00'
+
+
+class TestStreamJobUse(unittest.TestCase):
+    """Chunked usage against the in-memory computation."""
+
+    def setUp(self):
+        self.jobs = synthetic_jobs(2000, D_FROM, D_TO, n_users=8, seed=2)
+        self.expected = multi_job_use(self.jobs, D_FROM, 40, d_to=D_TO,
+                                      use_unit='cpu-eqv')
+
+    def assert_same_usage(self, usage):
+        for name, expected in self.expected.items():
+            self.assertTrue(expected.index.equals(usage[name].index), name)
+            np.testing.assert_allclose(usage[name].to_numpy(dtype=float),
+                                       expected.to_numpy(dtype=float),
+                                       atol=1e-6, err_msg=name)
+        self.assertEqual(list(usage['user_run'].columns),
+                         list(self.expected['user_run'].columns))
+
+    def test_chunks(self):
+        """Folding chunks in any order gives the multi_job_use series."""
+        chunks = [self.jobs.iloc[i:i + 300]
+                  for i in range(0, len(self.jobs), 300)]
+        usage, job_stats = stream_job_use(chunks, D_FROM, 40, D_TO,
+                                          use_unit='cpu-eqv')
+        self.assert_same_usage(usage)
+        self.assertEqual(job_stats['n_jobs'].sum(), len(self.jobs))
+
+        wait = (self.jobs['start'] - self.jobs['submit']).dt.total_seconds()
+        wait_max = (wait / 3600).groupby(self.jobs['partition']).max()
+        np.testing.assert_allclose(
+            job_stats['waittime_hours_max'].sort_index(),
+            wait_max.sort_index())
+
+    def test_csv(self):
+        """A csv file is read in chunks with its dates and timelimits."""
+        with tempfile.TemporaryDirectory() as out_root:
+            path = os.path.join(out_root, 'jobs.csv')
+            self.jobs.to_csv(path, index=False)
+            usage, _ = stream_job_use(read_job_chunks(path, chunk_rows=700),
+                                      D_FROM, 40, D_TO, use_unit='cpu-eqv')
+        self.assert_same_usage(usage)
+
+    def test_show_job_use(self):
+        """show_job_use streams chunks and prints the job count only."""
+        from viewclust_vis.show_job_use import show_job_use
+
+        chunks = [self.jobs.iloc[i:i + 700]
+                  for i in range(0, len(self.jobs), 700)]
+        with tempfile.TemporaryDirectory() as out_root, \
+                mock.patch('builtins.print') as printed:
+            _, job_stats = show_job_use(
+                'def-a_cpu', 40, D_FROM, d_to=D_TO, use_unit='cpu-eqv',
+                out_path=out_root, plot_jobstack=False, plot_cumu=False,
+                plot_insta=False, job_chunks=chunks)
+        self.assertEqual(job_stats['n_jobs'].sum(), len(self.jobs))
+        self.assertIn(('Number of jobs in query: 2000',),
+                      [call.args for call in printed.call_args_list])
+        for call in printed.call_args_list:
+            self.assertTrue(all(isinstance(arg, str) for arg in call.args))
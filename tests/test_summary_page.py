@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Tests for `summary_page`."""
+
+
+import json
+import os
+import tempfile
+import unittest
+
+from viewclust_vis.summary_page import summary_page
+
+
+class TestSummaryPage(unittest.TestCase):
+    """Index pages over report folders."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.folders = []
+        for account in ('acc_a', 'acc_b', 'acc_c'):
+            folder = os.path.join(self.root, account)
+            os.makedirs(folder)
+            for name in ('_insta_plot.html', '_cumu_plot.html',
+                         '_notes.txt'):
+                open(os.path.join(folder, account + name), 'w').close()
+            open(os.path.join(folder, '.hidden.html'), 'w').close()
+            self.folders.append(folder)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read(self, name):
+        with open(os.path.join(self.root, name), encoding='utf-8') as f_in:
+            return f_in.read()
+
+    def test_links(self):
+        """Every html report is linked relative to the page."""
+        pages = summary_page(self.folders, os.path.join(self.root, 'i.html'))
+        self.assertEqual(len(pages), 1)
+        page = self._read('i.html')
+        self.assertEqual(page.count('<a href='), 6)
+        self.assertIn('href="acc_b/acc_b_cumu_plot.html"', page)
+        self.assertNotIn('notes', page)
+        self.assertNotIn('hidden', page)
+
+    def test_pages_and_search(self):
+        """Folders are split over pages sharing one search index."""
+        pages = summary_page(self.folders, os.path.join(self.root, 'i.html'),
+                             page_size=2, search=True)
+        self.assertEqual([os.path.basename(page) for page in pages],
+                         ['i.html', 'i_2.html'])
+        self.assertIn('acc_b', self._read('i.html'))
+        self.assertIn('acc_c', self._read('i_2.html'))
+        self.assertIn('href="i_2.html"', self._read('i.html'))
+
+        index = self._read('i_index.js')
+        entries = json.loads(index[index.index('['):index.rindex(';')])
+        self.assertEqual([entry[0] for entry in entries],
+                         ['acc_a', 'acc_b', 'acc_c'])
+
+    def test_manifest(self):
+        """Unchanged folders are served from the manifest."""
+        page_name = os.path.join(self.root, 'i.html')
+        manifest_path = os.path.join(self.root, 'm.json')
+        summary_page(self.folders, page_name, manifest_path=manifest_path)
+
+        # A stale entry is reused as long as the folder time matches
+        with open(manifest_path, encoding='utf-8') as f_in:
+            manifest = json.load(f_in)
+        manifest['folders'][self.folders[0]][1] = ['cached.html']
+        with open(manifest_path, 'w', encoding='utf-8') as f_out:
+            json.dump(manifest, f_out)
+
+        open(os.path.join(self.folders[1], 'new.html'), 'w').close()
+        stat = os.stat(self.folders[1])
+        os.utime(self.folders[1], ns=(stat.st_atime_ns,
+                                      stat.st_mtime_ns + 10 ** 9))
+
+        summary_page(self.folders, page_name, manifest_path=manifest_path)
+        page = self._read('i.html')
+        self.assertIn('acc_a/cached.html', page)
+        self.assertIn('acc_b/new.html', page)
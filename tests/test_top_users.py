@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Tests for `rank_users` and `top_users`."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from viewclust_vis.top_users import OTHER_USERS, rank_users, top_users
+from viewclust_vis.user_matrix import user_matrix
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+
+class TestTopUsers(unittest.TestCase):
+    """Top users keep their columns, the rest sum into one."""
+
+    def setUp(self):
+        index = pd.date_range('2020-01-01', periods=48, freq='h')
+        rng = np.random.default_rng(6)
+        self.user_run = pd.DataFrame(rng.random((48, 5)) *
+                                     [1, 5, 3, 5, 2],
+                                     index=index,
+                                     columns=['u1', 'u2', 'u3', 'u4', 'u5'])
+        # Tie with u2, kept after it
+        self.user_run['u4'] = self.user_run['u2']
+
+    def test_rank_users(self):
+        ranking = rank_users(self.user_run)
+        self.assertEqual(list(ranking.index), ['u2', 'u4', 'u3', 'u5', 'u1'])
+        np.testing.assert_allclose(ranking['u3'], self.user_run['u3'].sum())
+
+    def test_top_users(self):
+        top = top_users(self.user_run, 2)
+        self.assertEqual(list(top.columns), ['u2', 'u4', OTHER_USERS])
+        np.testing.assert_allclose(top[OTHER_USERS],
+                                   self.user_run[['u1', 'u3', 'u5']].sum(
+                                       axis=1))
+        pd.testing.assert_frame_equal(top[['u2', 'u4']],
+                                      self.user_run[['u2', 'u4']])
+        np.testing.assert_allclose(top.sum(axis=1),
+                                   self.user_run.sum(axis=1))
+
+        self.assertIs(top_users(self.user_run, 0), self.user_run)
+        self.assertIs(top_users(self.user_run, 5), self.user_run)
+        ranking = rank_users(self.user_run)
+        pd.testing.assert_frame_equal(top_users(self.user_run, 2, ranking),
+                                      top)
+
+    def test_user_named_other(self):
+        """A real user named like the aggregate keeps its own trace."""
+        user_run = self.user_run.rename(columns={'u2': OTHER_USERS,
+                                                 'u3': OTHER_USERS + ' (2)'})
+        top = top_users(user_run, 2)
+        self.assertEqual(list(top.columns),
+                         [OTHER_USERS, 'u4', OTHER_USERS + ' (3)'])
+        pd.testing.assert_series_equal(top[OTHER_USERS],
+                                       user_run[OTHER_USERS])
+
+    def test_user_matrix(self):
+        """A UserMatrix gives the same columns as its dense frame."""
+        jobs = synthetic_jobs(500, '2020-01-01', '2020-01-08', n_users=9,
+                              seed=4)
+        matrix = user_matrix(jobs, '2020-01-01T00:00:00',
+                             '2020-01-08T00:00:00')
+        dense = matrix.dense()
+        pd.testing.assert_series_equal(rank_users(matrix), rank_users(dense))
+        pd.testing.assert_frame_equal(top_users(matrix, 3),
+                                      top_users(dense, 3))
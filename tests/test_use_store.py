@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""Tests for `UseStore`."""
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from viewclust_vis.cumu_plot import cumu_plot
+from viewclust_vis.insta_plot import insta_plot
+from viewclust_vis.use_store import UseStore
+
+
+def _usage(d_from, d_to, level):
+    index = pd.date_range(d_from, d_to, freq='h')
+    running = pd.Series(np.arange(len(index)) + level, index=index,
+                        dtype='float64')
+    users = pd.DataFrame({'a': running / 2, 'b': running / 2})
+    return {'clust': pd.Series(10.0, index=index), 'queued': running * 0,
+            'running': running, 'user_run': users}
+
+
+class TestUseStore(unittest.TestCase):
+    """Windows read back from the mapped arrays."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = UseStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_window(self):
+        """A window equals .loc on the written series, as a mapped view."""
+        usage = _usage('2020-01-01', '2020-03-01', 0)
+        self.store.write(usage)
+        window = self.store.series('running', '2020-01-10', '2020-01-12')
+        expected = usage['running'].loc['2020-01-10':'2020-01-12']
+        pd.testing.assert_series_equal(window, expected, check_freq=False)
+        self.assertIsInstance(window.values.base, np.memmap)
+
+        users = self.store.usage('2020-02-01')['user_run']
+        self.assertEqual(list(users.columns), ['a', 'b'])
+        self.assertEqual(len(users), len(usage['user_run'].loc['2020-02-01':]))
+
+    def test_merge(self):
+        """Later periods extend the stored history, new samples win."""
+        self.store.write(_usage('2020-01-01', '2020-01-03', 0))
+        later = _usage('2020-01-02', '2020-01-05', 100)
+        later['user_run']['c'] = 1.0
+        self.store.write(later)
+
+        running = self.store.series('running')
+        self.assertEqual(running.index[0], pd.Timestamp('2020-01-01'))
+        self.assertEqual(running.index[-1], pd.Timestamp('2020-01-05'))
+        self.assertEqual(running['2020-01-01 05:00'], 5)
+        self.assertEqual(running['2020-01-02 00:00'], 100)
+        users = self.store.series('user_run', d_to='2020-01-01 23:00')
+        self.assertEqual(list(users.columns), ['a', 'b', 'c'])
+        self.assertTrue(users['c'].isna().all())
+
+    def test_plot(self):
+        """Plots read their series from the store."""
+        self.store.write(_usage('2020-01-01', '2020-03-01', 0))
+        fig = insta_plot(store=self.store, d_from='2020-02-01',
+                         d_to='2020-02-02')
+        self.assertEqual(len(fig.data[-1].y), 48)
+
+    def test_versioned_files(self):
+        """Writes go to new files, a header read before keeps its data."""
+        self.store.write(_usage('2020-01-01', '2020-01-03', 0))
+        old = self.store.header()
+        old_running = self.store.series('running')
+        self.store.write(_usage('2020-01-02', '2020-01-05', 100))
+        new = self.store.header()
+
+        files = {info['file'] for info in new['series'].values()}
+        self.assertEqual(set(os.listdir(self.tmp.name)),
+                         files | {'header.json'})
+        self.assertNotEqual(old['series']['running']['file'],
+                            new['series']['running']['file'])
+        # Mapped before the write, still the old samples
+        self.assertEqual(old_running.iloc[-1], 48)
+        self.assertEqual(len(old_running), old['series']['running']['length'])
+
+    def test_missing_file(self):
+        """A replaced file is read from the new header, a lost one raises."""
+        self.store.write(_usage('2020-01-01', '2020-01-03', 0))
+        old = self.store.header()
+        self.store.write(_usage('2020-01-01', '2020-01-03', 100))
+        new = self.store.header()
+        # The header is read before the write, then after it
+        with mock.patch.object(UseStore, 'header',
+                               side_effect=[old, new]):
+            running = self.store.series('running')
+        self.assertEqual(running.iloc[0], 100)
+
+        lost = new['series']['clust']['file']
+        os.remove(os.path.join(self.tmp.name, lost))
+        with self.assertRaisesRegex(FileNotFoundError, lost):
+            self.store.series('clust')
+
+    def test_missing_series(self):
+        """Plots without series nor a store say what they need."""
+        for plot in (insta_plot, cumu_plot):
+            with self.assertRaisesRegex(AttributeError, 'invalid series'):
+                plot()
+            with self.assertRaisesRegex(AttributeError, 'invalid series'):
+                plot(store=self.store)
+
+    def test_overwrite(self):
+        """Without merge, only the files of the new header are left."""
+        self.store.write(_usage('2020-01-01', '2020-01-03', 0))
+        self.store.write({'running': _usage('2020-01-02', '2020-01-05',
+                                            100)['running']}, merge=False)
+        header = self.store.header()
+        self.assertEqual(sorted(header['series']), ['running'])
+        self.assertEqual(set(os.listdir(self.tmp.name)),
+                         {header['series']['running']['file'],
+                          'header.json'})
+        self.assertEqual(self.store.series('running').iloc[0], 100)
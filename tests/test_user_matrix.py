@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Tests for `UserMatrix`."""
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from viewclust_vis.multi_job_use import job_events, users_use
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+from viewclust_vis.top_users import OTHER_USERS, rank_users, top_users
+from viewclust_vis.user_matrix import user_matrix
+
+D_FROM = '2020-01-01T00:00:00'
+D_TO = '2020-02-01T00:00:00'
+
+
+class TestUserMatrix(unittest.TestCase):
+    """Sparse per-user usage against the dense per-user series."""
+
+    def setUp(self):
+        self.jobs = synthetic_jobs(1500, D_FROM, D_TO, n_users=120, seed=6)
+        self.jobs.loc[::11, 'start'] = pd.NaT
+        events = job_events(self.jobs, D_TO, 'cpu')
+        self.dense = users_use(events, self.jobs['user'].to_numpy(),
+                               D_FROM, D_TO)
+        self.matrix = user_matrix(self.jobs, D_FROM, D_TO)
+
+    def test_dense(self):
+        """Densified, the matrix equals the users_use frame."""
+        dense = self.matrix.dense()
+        self.assertEqual(list(dense.columns), list(self.dense.columns))
+        self.assertTrue(dense.index.equals(self.dense.index))
+        np.testing.assert_allclose(dense.to_numpy(), self.dense.to_numpy(),
+                                   atol=1e-6)
+        self.assertLess(self.matrix.nnz, self.dense.size / 2)
+
+    def test_top_users(self):
+        """Ranking and the top users match, other users are summed."""
+        ranking = rank_users(self.matrix)
+        self.assertEqual(list(ranking.index[:10]),
+                         list(rank_users(self.dense).index[:10]))
+        top = top_users(self.matrix, 10, ranking)
+        expected = top_users(self.dense, 10)
+        self.assertEqual(list(top.columns), list(expected.columns))
+        self.assertEqual(top.columns[-1], OTHER_USERS)
+        np.testing.assert_allclose(top.to_numpy(), expected.to_numpy(),
+                                   atol=1e-6)
+
+    def test_off_hour(self):
+        with self.assertRaises(AttributeError):
+            user_matrix(self.jobs, '2020-01-01T00:30:00', D_TO)
@@ -4,30 +4,40 @@
 
 
 import unittest
-from click.testing import CliRunner
 
-from viewclust_vis import viewclust_vis
-from viewclust_vis import cli
+import viewclust_vis
+from viewclust_vis.synthetic_jobs import synthetic_jobs
 
 
 class TestViewclust_vis(unittest.TestCase):
     """Tests for `viewclust_vis` package."""
 
-    def setUp(self):
-        """Set up test fixtures, if any."""
-
-    def tearDown(self):
-        """Tear down test fixtures, if any."""
-
-    def test_000_something(self):
-        """Test something."""
-
-    def test_command_line_interface(self):
-        """Test the CLI."""
-        runner = CliRunner()
-        result = runner.invoke(cli.main)
-        assert result.exit_code == 0
-        assert 'viewclust_vis.cli.main' in result.output
-        help_result = runner.invoke(cli.main, ['--help'])
-        assert help_result.exit_code == 0
-        assert '--help  Show this message and exit.' in help_result.output
+    def test_000_version(self):
+        """The package exposes its version."""
+        self.assertIsInstance(viewclust_vis.__version__, str)
+
+    def test_synthetic_jobs(self):
+        """Synthetic frames are shaped like sacct_jobs output."""
+        jobs = synthetic_jobs(500, '2020-01-01T00:00:00',
+                              '2020-01-15T00:00:00')
+        for column in ('jobid', 'user', 'submit', 'start', 'end',
+                       'timelimit', 'reqcpus', 'mem', 'reqtres',
+                       'partition', 'state', 'priority'):
+            self.assertIn(column, jobs.columns)
+        self.assertEqual(len(jobs), 500)
+        self.assertTrue(jobs['submit'].is_monotonic_increasing)
+        self.assertTrue(jobs['jobid'].is_unique)
+
+        pending = jobs['state'] == 'PENDING'
+        self.assertTrue(jobs.loc[pending, 'start'].isnull().all())
+        self.assertTrue((jobs.loc[~pending, 'start'] >=
+                         jobs.loc[~pending, 'submit']).all())
+        self.assertTrue((jobs['end'] <=
+                         '2020-01-15T00:00:00').all())
+
+    def test_synthetic_jobs_seed(self):
+        """Frames are reproducible from their seed."""
+        args = (200, '2020-01-01T00:00:00', '2020-01-03T00:00:00')
+        self.assertTrue(synthetic_jobs(*args).equals(synthetic_jobs(*args)))
+        self.assertFalse(synthetic_jobs(*args).equals(
+            synthetic_jobs(*args, seed=1)))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Tests for the concurrent figure writers."""
+
+
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import plotly.graph_objects as go
+
+from viewclust_vis.synthetic_jobs import synthetic_jobs
+from viewclust_vis.write_fig import MAX_WORKERS, FigWriter, write_figs
+
+
+def _line(n):
+    """Builder of a small line figure."""
+    return lambda: go.Figure(go.Scatter(x=list(range(n)), y=list(range(n))))
+
+
+class TestWriteFig(unittest.TestCase):
+    """Pools write the same files as serial writes."""
+
+    def _write(self, workers, pool):
+        with tempfile.TemporaryDirectory() as out_root:
+            builders = {os.path.join(out_root, str(n) + '.html'): _line(n)
+                        for n in (3, 5, 8)}
+            figs = write_figs(builders, plotlyjs_root=out_root,
+                              workers=workers, pool=pool)
+            self.assertEqual(list(figs), list(builders))
+            pages = {}
+            for fig_out in builders:
+                with open(fig_out, encoding='utf-8') as f_in:
+                    pages[os.path.basename(fig_out)] = f_in.read()
+            return figs, pages
+
+    def test_pools(self):
+        """Thread and process pools write the serial pages byte for byte."""
+        figs, pages = self._write(1, 'thread')
+        for pool in ('thread', 'process'):
+            pool_figs, pool_pages = self._write(3, pool)
+            self.assertEqual(len(pool_pages), len(pages))
+            for fig in pool_figs.values():
+                self.assertIsInstance(fig, go.Figure)
+            self.assertEqual(pool_pages, pages)
+
+    def test_default_workers(self):
+        """The default pool is bounded whatever the cpu count."""
+        with mock.patch('os.cpu_count', return_value=64):
+            with FigWriter() as writer:
+                self.assertEqual(writer.executor._max_workers, MAX_WORKERS)
+        with mock.patch('os.cpu_count', return_value=1):
+            with FigWriter() as writer:
+                self.assertIsNone(writer.executor)
+
+    def test_error_drops_queued(self):
+        """An error inside the writer drops the figures not started yet."""
+        def slow():
+            time.sleep(.2)
+            return _line(3)()
+
+        with tempfile.TemporaryDirectory() as out_root:
+            outs = [os.path.join(out_root, str(n) + '.html')
+                    for n in range(6)]
+            with self.assertRaises(ValueError):
+                with FigWriter(workers=2) as writer:
+                    for fig_out in outs:
+                        writer.submit(fig_out, slow)
+                    raise ValueError('failed run')
+            self.assertIsNone(writer.executor)
+            self.assertTrue(writer.futures[outs[-1]].cancelled())
+            self.assertFalse(os.path.exists(outs[-1]))
+
+    def test_show_job_use_error(self):
+        """show_job_use shuts its pool down when the usage fails."""
+        from viewclust_vis.show_job_use import show_job_use
+
+        closed = []
+        close = FigWriter.close
+
+        def _close(writer):
+            closed.append(writer)
+            close(writer)
+
+        jobs = synthetic_jobs(50, '2020-01-01', '2020-01-03', seed=1)
+        with tempfile.TemporaryDirectory() as out_root, \
+                mock.patch.object(FigWriter, 'close', _close), \
+                mock.patch('viewclust_vis.show_job_use.multi_job_use',
+                           side_effect=AttributeError('invalid use_unit')), \
+                mock.patch('builtins.print'):
+            with self.assertRaises(AttributeError):
+                show_job_use('def-a_cpu', 10, '2020-01-01T00:00:00',
+                             d_to='2020-01-03T00:00:00', out_path=out_root,
+                             override_frame=jobs, workers=2,
+                             plot_cumu=False, plot_insta=False)
+        self.assertEqual(len(closed), 1)
+        self.assertIsNone(closed[0].executor)
+
+    def test_invalid_pool(self):
+        """Unknown pools are rejected."""
+        with self.assertRaises(AttributeError):
+            FigWriter(pool='fibers')
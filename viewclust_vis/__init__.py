@@ -1,16 +1,66 @@
 """Top-level package for ViewClust-Vis."""
 
+import importlib
+import sys
+import types
+
 # Version output
 from ._version import __version__
 
 __author__ = """Tyler Collins"""
 __email__ = 'tk11br@sharcnet.ca'
 
-from .delta_plot import delta_plot
-from .job_stack import job_stack
-from .summary_page import summary_page
-from .use_suite import use_suite
-from .viol_plot import viol_plot
-from .show_job_use import show_job_use
-from .insta_plot import insta_plot
-from .cumu_plot import cumu_plot
+# Public functions, imported from their module on first access (PEP 562)
+# so that importing the package does not load plotly, pandas or viewclust
+_LAZY_ATTRS = {
+    'delta_plot': '.delta_plot',
+    'job_stack': '.job_stack',
+    'summary_page': '.summary_page',
+    'use_suite': '.use_suite',
+    'viol_plot': '.viol_plot',
+    'show_job_use': '.show_job_use',
+    'insta_plot': '.insta_plot',
+    'cumu_plot': '.cumu_plot',
+    'batch_suite': '.batch_suite',
+    'compact_jobs': '.compact_jobs',
+    'dashboard': '.dashboard',
+    'encode_fig': '.encode_fig',
+    'JobIndex': '.job_index',
+    'rank_users': '.top_users',
+    'read_job_chunks': '.stream_job_use',
+    'StageLog': '.stage_log',
+    'stream_job_use': '.stream_job_use',
+    'top_users': '.top_users',
+    'UseStore': '.use_store',
+    'user_matrix': '.user_matrix',
+    'UserMatrix': '.user_matrix',
+}
+
+__all__ = ['__version__'] + list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError('module ' + repr(__name__) +
+                             ' has no attribute ' + repr(name))
+    module = importlib.import_module(_LAZY_ATTRS[name], __name__)
+    attr = getattr(module, name)
+    globals()[name] = attr
+    return attr
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRS))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule binds it on the package under its own name,
+        # keep the function of that name bound instead, as eager imports did
+        if isinstance(value, types.ModuleType) and \
+                _LAZY_ATTRS.get(name) == '.' + name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+
+def align_series(parts, resample_str=''):
+    """Puts usage series and frames on one shared index, resampled once.
+
+    Inputs sharing the same sorted index, as returned by job_use, are
+    resampled straight from their own values: the resample bins are found
+    once and every column is summed over them, without first copying the
+    inputs into a common frame. Other inputs are outer joined, missing
+    samples being NaN, and the joined frame is resampled.
+
+    Parameters
+    -------
+    parts: list of Series or DataFrame
+        Series to align. Frames contribute one column per column.
+    resample_str: pandas freq str, optional
+        If given, every column is summed per period. As with
+        .resample().sum() of each column on its own, periods without any
+        sample between the first and last samples of a column are 0, the
+        periods outside of them are NaN.
+
+    Returns
+    -------
+    frame: DataFrame
+        Columns numbered in the order of parts.
+    counts: ndarray
+        Number of samples of each column before resampling.
+    """
+
+    index = parts[0].index
+    shared = all(part.index.equals(index) for part in parts[1:])
+
+    if resample_str != '' and shared and index.is_monotonic_increasing:
+        frame, counts = _resample_shared(parts, index, resample_str)
+        return _fill_inner(frame), counts
+
+    if shared:
+        frame = pd.DataFrame(np.column_stack([part.to_numpy(dtype='float64')
+                                              for part in parts]),
+                             index=index)
+    else:
+        frame = pd.concat(parts, axis=1, ignore_index=True)
+    counts = len(frame) - np.isnan(frame.to_numpy(dtype='float64')).sum(axis=0)
+
+    if resample_str != '':
+        frame = _fill_inner(frame.resample(resample_str).sum(min_count=1))
+
+    return frame, counts
+
+
+def aligned_column(frame, col):
+    """Column of an aligned frame, without the samples it did not have."""
+
+    column = frame[col]
+    if column.hasnans:
+        column = column.dropna()
+    return column
+
+
+def _fill_inner(frame):
+    """Zeros the empty periods between the first and last sums of each
+    column."""
+
+    values = frame.to_numpy(dtype='float64')
+    summed = ~np.isnan(values)
+    inner = (np.logical_or.accumulate(summed, axis=0) &
+             np.logical_or.accumulate(summed[::-1], axis=0)[::-1])
+    if (inner & ~summed).any():
+        values = np.where(inner & ~summed, 0.0, values)
+        frame = pd.DataFrame(values, index=frame.index, columns=frame.columns)
+    return frame
+
+
+def _resample_shared(parts, index, resample_str):
+    """Resampled sums of columns sharing one sorted index."""
+
+    # Samples per bin, bins being contiguous runs of the sorted index
+    sizes = pd.Series(np.zeros(len(index), dtype='int8'), index=index)
+    sizes = sizes.resample(resample_str).count()
+    bin_index = sizes.index
+    sizes = sizes.to_numpy()
+    filled = sizes > 0
+    starts = (np.cumsum(sizes) - sizes)[filled]
+
+    sums = []
+    counts = []
+    for part in parts:
+        values = part.to_numpy(dtype='float64')
+        if values.ndim == 1:
+            values = values[:, None]
+        present = ~np.isnan(values)
+        part_sums = np.full((len(sizes), values.shape[1]), np.nan)
+        if present.all():
+            part_sums[filled] = np.add.reduceat(values, starts, axis=0)
+        else:
+            part_sums[filled] = np.add.reduceat(np.where(present, values, 0),
+                                                starts, axis=0)
+            n_present = np.zeros(part_sums.shape, dtype='int64')
+            n_present[filled] = np.add.reduceat(present.astype('int64'),
+                                                starts, axis=0)
+            part_sums[n_present == 0] = np.nan
+        sums.append(part_sums)
+        counts.append(present.sum(axis=0))
+
+    frame = pd.DataFrame(np.hstack(sums), index=bin_index)
+    return frame, np.concatenate(counts)
@@ -0,0 +1,172 @@
+import argparse
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from viewclust_vis.summary_page import summary_page
+
+
+def batch_suite(accounts, d_from, out_root, target='', d_to='', workers=None,
+                page_name='index.html', page_size=0, search=False,
+                **show_args):
+    """Runs show_job_use over many accounts in a process pool.
+
+    Each account is written to its own folder under out_root and, unless
+    overridden, all of them share one plotly.js copy in out_root.
+    A failing account is recorded and does not stop the others. Once all
+    accounts are done, summary_page is built over the successful folders.
+
+    Parameters
+    -------
+    accounts: list of str or dict
+        Account names, or dicts of show_job_use arguments which must at
+        least hold 'account'. Dict entries override the shared arguments.
+        Each account may only appear once.
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    out_root: str
+        Folder under which one folder per account is created.
+    target: int-like, optional
+        Target share used for accounts that do not set their own.
+    d_to: date str, optional
+        End of the query period, e.g. '2020-01-01T00:00:00'.
+        Defaults to now if empty.
+    workers: int, optional
+        Number of worker processes. Defaults to the number of cores.
+        1 runs every account in the calling process. With worker
+        processes, each account writes its figures serially unless its
+        dict sets its own 'workers'.
+    page_name: str, optional
+        Name of the summary page written in out_root. If empty, skips it.
+        Defaults to 'index.html'. Its manifest, see summary_page, is kept
+        next to it so that reruns only rescan the folders that changed.
+    page_size: int, optional
+        Folders per summary page, see summary_page. Defaults to 0, one page.
+    search: boolean, optional
+        If True, the summary pages get a search box. Defaults to False.
+    show_args: optional
+        Further show_job_use arguments shared by all accounts.
+
+    Returns
+    -------
+    results: dict
+        Per account: 'status' ('ok' or 'error'), 'folder', 'n_jobs' and,
+        on failure, 'error' holding the formatted traceback.
+
+    See Also
+    -------
+    show_job_use: Generates the figures of one account.
+    summary_page: Builds the index page over all account folders.
+    """
+
+    show_args.setdefault('plotlyjs_root', out_root)
+
+    tasks = []
+    for entry in accounts:
+        if isinstance(entry, str):
+            entry = {'account': entry}
+        task = dict(show_args, target=target, d_from=d_from, d_to=d_to)
+        task.update(entry)
+        task.setdefault('out_path', os.path.join(out_root, task['account']))
+        if workers != 1:
+            # Accounts already run one per core, their figures in turn
+            task.setdefault('workers', 1)
+        tasks.append(task)
+
+    names = [task['account'] for task in tasks]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise AttributeError('invalid accounts, listed more than once: ' +
+                             ', '.join(duplicates))
+
+    results = {}
+    if workers == 1:
+        for task in tasks:
+            results[task['account']] = _run_account(task)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {task['account']: pool.submit(_run_account, task)
+                       for task in tasks}
+            for account, future in futures.items():
+                try:
+                    results[account] = future.result()
+                except Exception:
+                    # The worker itself died, e.g. out of memory
+                    results[account] = {'status': 'error', 'folder': '',
+                                        'n_jobs': 0,
+                                        'error': traceback.format_exc()}
+
+    if page_name != '':
+        folders = [res['folder'] for res in results.values()
+                   if res['status'] == 'ok']
+        page_path = os.path.join(out_root, page_name)
+        summary_page(folders, page_path,
+                     manifest_path=os.path.splitext(page_path)[0] +
+                     '_manifest.json',
+                     page_size=page_size, search=search)
+
+    return results
+
+
+def _run_account(task):
+    """Process pool entry: runs show_job_use and reports instead of raising.
+
+    Only small, picklable results are sent back to the parent process.
+    """
+
+    # Imported here so worker start up does not depend on the parent
+    from viewclust_vis.show_job_use import show_job_use
+
+    try:
+        _, job_frame = show_job_use(**task)
+        n_jobs = len(job_frame)
+        if 'job_chunks' in task:
+            # Streamed accounts return statistics per partition
+            n_jobs = int(job_frame['n_jobs'].sum())
+        return {'status': 'ok', 'folder': task['out_path'],
+                'n_jobs': n_jobs}
+    except Exception:
+        return {'status': 'error', 'folder': task['out_path'], 'n_jobs': 0,
+                'error': traceback.format_exc()}
+
+
+def main(argv=None):
+    """Command line entry point, see viewclust-batch --help."""
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(
+        description='Generate show_job_use reports for many accounts.')
+    parser.add_argument('account_file',
+                        help='csv with an account column and a target column')
+    parser.add_argument('d_from', help="e.g. '2019-04-01T00:00:00'")
+    parser.add_argument('--d-to', default='',
+                        help='end of the query period, defaults to now')
+    parser.add_argument('--out-root', default='.',
+                        help='folder receiving one folder per account')
+    parser.add_argument('--target-column', default='core_eqv_award',
+                        help="column holding each account's target")
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes, defaults to the core count')
+    parser.add_argument('--page-size', type=int, default=0,
+                        help='account folders per summary page, 0 for one')
+    parser.add_argument('--search', action='store_true',
+                        help='add a search box to the summary pages')
+    args = parser.parse_args(argv)
+
+    account_frame = pd.read_csv(args.account_file)
+    accounts = [{'account': row['account'],
+                 'target': int(row[args.target_column])}
+                for _, row in account_frame.iterrows()]
+
+    results = batch_suite(accounts, args.d_from, args.out_root,
+                          d_to=args.d_to, workers=args.workers,
+                          page_size=args.page_size, search=args.search)
+
+    failed = [acc for acc, res in results.items() if res['status'] != 'ok']
+    for account in failed:
+        print('Failed account: ', account)
+        print(results[account]['error'])
+    print('Done', len(results) - len(failed), 'of', len(results), 'accounts.')
+
+    return 1 if failed else 0
@@ -0,0 +1,232 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+from viewclust_vis._version import __version__
+
+# Benchmarked functions, in the order they are run
+BENCHMARKS = ['job_stack', 'insta_plot', 'cumu_plot', 'viol_plot',
+              'delta_plot', 'job_scatter', 'show_job_use']
+
+
+def benchmark_suite(sizes, out_root, functions=[],
+                    d_from='2020-01-01T00:00:00', d_to='2020-04-01T00:00:00',
+                    target=500, memory=True, results_dir='', seed=0):
+    """Times the public plotting functions on synthetic job frames.
+
+    For every size a synthetic_jobs frame is generated and every function
+    is run once against it, writing its html into out_root. Each run
+    records the wall time, the peak memory traced by tracemalloc during a
+    second run, and the size of the html written.
+
+    Parameters
+    -------
+    sizes: list of int
+        Job counts to benchmark, e.g. [1000, 10000, 100000].
+    out_root: str
+        Folder receiving the generated html files.
+    functions: list of str, optional
+        Subset of BENCHMARKS to run. Defaults to all of them.
+    d_from: date str, optional
+        Beginning of the synthetic query period.
+    d_to: date str, optional
+        End of the synthetic query period.
+    target: int, optional
+        Target share of the synthetic account. Defaults to 500.
+    memory: bool, optional
+        If True, runs each function a second time under tracemalloc to
+        record its peak memory. Defaults to True.
+    results_dir: str, optional
+        If given, the results are written there as a json file named after
+        the package version and commit, see compare_results.
+    seed: int, optional
+        Seed of synthetic_jobs. Defaults to 0.
+
+    Returns
+    -------
+    results: dict
+        'meta' describing the run and 'records', one dict per function and
+        size with 'function', 'n_jobs', 'seconds', 'peak_bytes' and
+        'html_bytes'.
+    """
+
+    # Imported here so that only benchmark runs pay for them
+    from viewclust_vis.multi_job_use import multi_job_use
+    from viewclust_vis.synthetic_jobs import synthetic_jobs
+
+    if functions == []:
+        functions = BENCHMARKS
+    for name in functions:
+        if name not in BENCHMARKS:
+            raise AttributeError('invalid benchmark: ' + name)
+
+    records = []
+    for n_jobs in sizes:
+        jobs = synthetic_jobs(n_jobs, d_from, d_to, seed=seed)
+        usage = multi_job_use(jobs, d_from, target, d_to=d_to)
+        for name in functions:
+            out_path = os.path.join(out_root, name + '_' + str(n_jobs))
+            os.makedirs(out_path, exist_ok=True)
+            run = _case(name, jobs, usage, d_from, d_to, target, out_path)
+
+            gc.collect()
+            t_start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - t_start
+
+            peak_bytes = None
+            if memory:
+                gc.collect()
+                tracemalloc.start()
+                run()
+                _, peak_bytes = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            records.append({'function': name, 'n_jobs': n_jobs,
+                            'seconds': seconds, 'peak_bytes': peak_bytes,
+                            'html_bytes': _html_bytes(out_path)})
+            print('%-14s %9d jobs %9.2f s' % (name, n_jobs, seconds))
+
+    results = {'meta': _meta(), 'records': records}
+    if results_dir != '':
+        os.makedirs(results_dir, exist_ok=True)
+        meta = results['meta']
+        file_name = 'bench-' + meta['version'] + '-' + meta['commit'] + '.json'
+        with open(os.path.join(results_dir, file_name), 'w') as f_out:
+            json.dump(results, f_out, indent=1)
+    return results
+
+
+def compare_results(old_results, new_results):
+    """Ratios of new over old runtime, peak memory and html size.
+
+    Parameters
+    -------
+    old_results, new_results: dict or str
+        Results of benchmark_suite, or paths of their json files.
+
+    Returns
+    -------
+    rows: list of dict
+        One per function and size present in both, with the ratios
+        'seconds', 'peak_bytes' and 'html_bytes' (None if not recorded).
+    """
+
+    old_results, new_results = (_load(res) for res in
+                                (old_results, new_results))
+    old = {(rec['function'], rec['n_jobs']): rec
+           for rec in old_results['records']}
+
+    rows = []
+    for rec in new_results['records']:
+        key = (rec['function'], rec['n_jobs'])
+        if key not in old:
+            continue
+        row = {'function': key[0], 'n_jobs': key[1]}
+        for field in ('seconds', 'peak_bytes', 'html_bytes'):
+            if rec[field] and old[key][field]:
+                row[field] = rec[field] / old[key][field]
+            else:
+                row[field] = None
+        rows.append(row)
+    return rows
+
+
+def _case(name, jobs, usage, d_from, d_to, target, out_path):
+    """Callable running one benchmarked function on fresh inputs."""
+
+    import viewclust_vis as vcv
+
+    fig_out = os.path.join(out_path, name + '.html')
+    if name == 'job_stack':
+        return lambda: vcv.job_stack(jobs, fig_out=fig_out)
+    elif name in ('insta_plot', 'cumu_plot'):
+        plot = getattr(vcv, name)
+        return lambda: plot(usage['clust'], usage['queued'],
+                            usage['running'], fig_out=fig_out,
+                            submit_run=usage['submit_run'],
+                            user_run=usage['user_run'])
+    elif name == 'viol_plot':
+        return lambda: vcv.viol_plot(d_from, usage['queued'],
+                                     usage['running'], target, d_to=d_to,
+                                     fig_out=fig_out)
+    elif name == 'delta_plot':
+        return lambda: vcv.delta_plot(['synthetic'], [usage['dist']],
+                                      fig_out=fig_out)
+    elif name == 'job_scatter':
+        from viewclust_vis.job_scatter import job_scatter
+        return lambda: job_scatter(jobs['account'][0], target, d_from,
+                                   d_to=d_to, out_path=out_path,
+                                   override_frame=jobs.copy())
+    else:
+        return lambda: vcv.show_job_use(jobs['account'][0], target, d_from,
+                                        d_to=d_to, out_path=out_path,
+                                        use_unit='cpu',
+                                        override_frame=jobs.copy())
+
+
+def _html_bytes(folder):
+    return sum(entry.stat().st_size for entry in os.scandir(folder)
+               if entry.name.endswith('.html'))
+
+
+def _meta():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'version': __version__, 'commit': commit or 'unknown',
+            'date': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine()}
+
+
+def _load(results):
+    if isinstance(results, str):
+        with open(results) as f_in:
+            return json.load(f_in)
+    return results
+
+
+def main(argv=None):
+    """Command line entry point, see viewclust-bench --help."""
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the plotting functions on synthetic jobs.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='job counts, e.g. 1000 10000 1000000')
+    parser.add_argument('--functions', nargs='+', default=[],
+                        choices=BENCHMARKS, help='defaults to all')
+    parser.add_argument('--out-root', default='bench_output',
+                        help='folder receiving the generated html')
+    parser.add_argument('--results-dir', default='benchmarks',
+                        help='folder receiving the json results')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the traced memory runs')
+    parser.add_argument('--compare', default='',
+                        help='json results of an older run to compare with')
+    args = parser.parse_args(argv)
+
+    results = benchmark_suite(args.sizes, args.out_root,
+                              functions=args.functions,
+                              memory=not args.no_memory,
+                              results_dir=args.results_dir)
+
+    if args.compare != '':
+        print('Ratios new / old:')
+        for row in compare_results(args.compare, results):
+            print('%-14s %9d jobs  time %s  memory %s  html %s' % (
+                row['function'], row['n_jobs'],
+                *('%.2f' % row[field] if row[field] is not None else '-'
+                  for field in ('seconds', 'peak_bytes', 'html_bytes'))))
+
+    return 0
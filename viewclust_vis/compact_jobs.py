@@ -0,0 +1,48 @@
+import pandas as pd
+
+# Columns read by multi_job_use, incremental_job_use and job_stack
+USAGE_COLUMNS = ['jobid', 'user', 'account', 'submit', 'eligible', 'start',
+                 'end', 'timelimit', 'state', 'reqcpus', 'mem', 'reqtres']
+
+
+def compact_jobs(jobs, columns=[], max_category_share=0.5):
+    """Shrinks a job frame to compact dtypes before analysis.
+
+    String columns with few distinct values, such as partition, state,
+    account, user and reqtres, become categoricals, so that filters like
+    state == 'PENDING' compare integer codes. Integer columns, e.g.
+    reqcpus, mem and priority, are downcast to the smallest integer type
+    holding their values. Datetime, timedelta and float columns are kept.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job DataFrame typically generated by slurm/sacct_jobs.
+        Not modified.
+    columns: list of str, optional
+        Columns to keep, others are dropped. Names missing from jobs are
+        ignored. Defaults to empty, keeping every column.
+    max_category_share: float, optional
+        A string column becomes categorical when its number of distinct
+        values is at most this share of its length. Defaults to 0.5.
+
+    Returns
+    -------
+    DataFrame
+        New frame with the compact columns.
+    """
+
+    if len(columns) > 0:
+        jobs = jobs[[col for col in jobs.columns if col in columns]]
+
+    compact = {}
+    for col in jobs.columns:
+        values = jobs[col]
+        if values.dtype == object:
+            if values.nunique() <= max_category_share * len(values):
+                values = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            values = pd.to_numeric(values, downcast='integer')
+        compact[col] = values
+
+    return pd.DataFrame(compact, index=jobs.index)
@@ -1,12 +1,25 @@
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 import sys
 
+from viewclust_vis.align_series import align_series, aligned_column
+from viewclust_vis.downsample import downsample
+from viewclust_vis.render_mode import (WEBGL_THRESHOLD, scatter_type,
+                                       stacked_traces)
+from viewclust_vis.top_users import top_users
+from viewclust_vis.use_store import store_series
+from viewclust_vis.write_fig import write_fig
 
-def cumu_plot(clust_info, cores_queued, cores_running, resample_str='',
+
+def cumu_plot(clust_info=[], cores_queued=[], cores_running=[],
+              resample_str='',
               fig_out='', y_label='Usage', fig_title='', query_bounds=True,
               running=[], queued=[], submit_run=[], submit_req=[], user_run=[],
-              plot_queued=False):
+              plot_queued=False, render_mode='auto',
+              webgl_threshold=WEBGL_THRESHOLD, max_points=0,
+              downsample_method='lttb', plotlyjs_root='', max_users=0,
+              user_rank=[], binary=False, store=None, d_from='', d_to=''):
     """Cumulative usage plot.
 
     Parameters
@@ -21,8 +34,8 @@ def cumu_plot(clust_info, cores_queued, cores_running, resample_str='',
         Series displaying running resources at a particular time.
         See job_use from viewclust.
     resample_str: pandas freq str, optional
-        Defaults to empty, meaning no resampling. Passing this parameter
-        does not do sanity checking and will only run the below code example.
+        Defaults to empty, meaning no resampling. Every series, users
+        included, is summed per resample period before accumulating, e.g.
         cores_queued = cores_queued.resample('1D').sum()
     fig_out: str, optional
         Writes the generated figure to file as the given name.
@@ -44,81 +57,140 @@ def cumu_plot(clust_info, cores_queued, cores_running, resample_str='',
         if jobs had started instantly and ran for their requested duration.
         Allows for easier interpretation of
         the queued series. Defaults to not plotting.
+    user_run: DataFrame or UserMatrix, optional
+        Running usage per user, stacked as one trace per user.
+        See get_users_run from viewclust. A UserMatrix, see
+        multi_job_use, is only made dense for the users drawn.
+    render_mode: str, optional
+        One of: {'auto', 'svg', 'webgl'}. 'auto' draws WebGL traces when
+        the longest plotted series has more than webgl_threshold points.
+        Defaults to 'auto'.
+    webgl_threshold: int, optional
+        Point count above which 'auto' switches to WebGL.
+    max_points: int, optional
+        Reduces every plotted series to at most this many points after
+        accumulating, keeping its shape. Query bounds still use the full
+        series. Defaults to 0, meaning no downsampling.
+    downsample_method: str, optional
+        One of: {'lttb', 'minmax'}. See downsample. Defaults to 'lttb'.
+    max_users: int, optional
+        Plots only the max_users users of largest total usage, the others
+        being stacked as a single 'other' trace. See top_users.
+        Defaults to 0, plotting every user.
+    user_rank: Series, optional
+        Ranking of user_run from rank_users, reused instead of ranking
+        the users again. Defaults to ranking them here.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs.
+        If given, fig_out references it by relative path instead of
+        embedding it. Defaults to empty, embedding plotly.js.
+    binary: boolean, optional
+        If True, fig_out is written with base64 typed arrays and epoch
+        offset dates, which is smaller and faster to load, see encode_fig.
+        Defaults to False.
+    store: UseStore, optional
+        If given, every series left empty is read from the store, over
+        the d_from to d_to window only. Defaults to None.
+    d_from: date str, optional
+        Beginning of the window read from store. Defaults to its start.
+    d_to: date str, optional
+        End of the window read from store. Defaults to its end.
 
     See Also
     -------
     jobUse: Generates the input frames for this function.
     """
 
-    # Avoid recalculations via these:
-    clust_sum = np.cumsum(clust_info).divide(len(clust_info))
-    run_sum = np.cumsum(cores_running).divide(len(cores_running))
-    queue_sum = np.cumsum(cores_queued).divide(len(cores_queued))
+    if store is not None:
+        (clust_info, cores_queued, cores_running, submit_run, submit_req,
+         user_run) = store_series(
+            store, d_from, d_to, clust=clust_info, queued=cores_queued,
+            running=cores_running, submit_run=submit_run,
+            submit_req=submit_req, user_run=user_run)
 
-    if resample_str != '':
-        clust_sum = clust_sum.resample(resample_str).sum()
-        run_sum = run_sum.resample(resample_str).sum()
-        queue_sum = queue_sum.resample(resample_str).sum()
+    if (len(clust_info) == 0 or len(cores_queued) == 0 or
+            len(cores_running) == 0):
+        raise AttributeError('invalid series, pass clust_info, cores_queued '
+                             'and cores_running or a store holding them')
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=clust_info.index,
-                             y=clust_sum,
-                             fill='tozeroy',
-                             mode='none',
-                             name='Allocation',
-                             fillcolor='rgba(180, 180, 180, .3)'))
+    if len(user_run) > 0:
+        user_run = top_users(user_run, max_users, user_rank)
+
+    # All series are accumulated together, users after the fixed series
+    series = [clust_info, cores_running, cores_queued]
+    if len(submit_run) > 0:
+        series.append(submit_run)
+    if len(submit_req) > 0:
+        series.append(submit_req)
+    cumu = _cumulative(series, user_run, resample_str)
+    clust_sum, run_sum, queue_sum = (aligned_column(cumu, i)
+                                     for i in range(3))
 
+    # Plotted copies, the full series still set the query bounds
+    clust_plot = downsample(clust_sum, max_points, downsample_method)
+    run_plot = downsample(run_sum, max_points, downsample_method)
+    queue_plot = downsample(queue_sum, max_points, downsample_method)
+
+    user_sum = []
     if len(user_run) > 0:
-        for user in user_run:
-            fig.add_trace(go.Scatter(
-                x=user_run.index,
-                y=np.cumsum(user_run[user]).divide(len(user_run[user])),
-                line=dict(width=0),
-                hoverinfo='x+y',
-                opacity=.1,
-                mode='none',
-                name=user,
-                stackgroup='use'  # define stack group
-                ))
+        user_sum = cumu.iloc[:, len(series):].dropna(how="all")
+        user_sum.columns = user_run.columns
+        user_sum = downsample(user_sum, max_points, downsample_method)
+
+    n_points = max(len(clust_plot), len(run_plot), len(user_sum))
+    scatter = scatter_type(n_points, render_mode, webgl_threshold)
+
+    fig = go.Figure()
+    fig.add_trace(scatter(x=clust_plot.index,
+                          y=clust_plot,
+                          fill='tozeroy',
+                          mode='none',
+                          name='Allocation',
+                          fillcolor='rgba(180, 180, 180, .3)'))
+
+    if len(user_sum) > 0:
+        fig.add_traces(stacked_traces(user_sum, scatter,
+                                      line=dict(width=0),
+                                      hoverinfo='x+y',
+                                      opacity=.1,
+                                      mode='none'))
 
     if plot_queued:
-        fig.add_trace(go.Scatter(x=cores_queued.index,
-                                 y=queue_sum,
-                                 mode='lines',
-                                 name='Resources queued',
-                                 marker_color='rgba(160,160,220, .8)'))
+        fig.add_trace(scatter(x=queue_plot.index,
+                              y=queue_plot,
+                              mode='lines',
+                              name='Resources queued',
+                              marker_color='rgba(160,160,220, .8)'))
 
+    col = 3
     if len(submit_run) > 0:
-        submit_run_tmp = submit_run.copy()
-        if resample_str != '':
-            submit_run_tmp = submit_run_tmp.resample(resample_str).sum()
+        submit_run_tmp = downsample(aligned_column(cumu, col), max_points,
+                                    downsample_method)
+        col += 1
 
-        fig.add_trace(go.Scatter(x=submit_run.index,
-                                 y=np.cumsum(submit_run_tmp).divide(
-                                     len(submit_run_tmp)),
-                                 mode='lines',
-                                 name='Resources run at submit (elapsed)',
-                                 marker_color='rgba(220,80,80, .8)'))
+        fig.add_trace(scatter(x=submit_run_tmp.index,
+                              y=submit_run_tmp,
+                              mode='lines',
+                              name='Resources run at submit (elapsed)',
+                              marker_color='rgba(220,80,80, .8)'))
 
     if len(submit_req) > 0:
-        submit_req_tmp = submit_req.copy()
-        if resample_str != '':
-            submit_req_tmp = submit_req_tmp.resample(resample_str).sum()
-
-        fig.add_trace(go.Scatter(x=submit_req_tmp.index,
-                                 y=np.cumsum(submit_req_tmp).divide(
-                                     len(submit_req_tmp)),
-                                 mode='lines',
-                                 name='Resources run at submit (timelimit)',
-                                 marker_color='rgba(220,160,00, .8)'))
-
-    fig.add_trace(go.Scatter(x=cores_running.index,
-                             y=run_sum,
-                             mode='lines',
-                             name='Resources consumed',
-                             marker_color='rgba(80,80,220, .8)'))
+        submit_req_tmp = downsample(aligned_column(cumu, col), max_points,
+                                    downsample_method)
+
+        fig.add_trace(scatter(x=submit_req_tmp.index,
+                              y=submit_req_tmp,
+                              mode='lines',
+                              name='Resources run at submit (timelimit)',
+                              marker_color='rgba(220,160,00, .8)'))
+
+    fig.add_trace(scatter(x=run_plot.index,
+                          y=run_plot,
+                          mode='lines',
+                          name='Resources consumed',
+                          marker_color='rgba(80,80,220, .8)'))
     if query_bounds:
-        max_y = max(clust_sum.max(), run_sum.max(), queue_sum.max())
+        max_y = cumu[[0, 1, 2]].max().max()
         min_x = clust_info.index.min()
         max_x = clust_info.index.max()
         fig.add_shape(dict(type="line", x0=min_x, y0=0, x1=min_x, y1=max_y,
@@ -154,6 +226,32 @@ def cumu_plot(clust_info, cores_queued, cores_running, resample_str='',
         )
     )
     if fig_out != '':
-        fig.write_html(fig_out)
+        write_fig(fig, fig_out, plotlyjs_root, binary)
 
     return fig
+
+
+def _cumulative(series, user_run, resample_str):
+    """Cumulative use of every series and user in one frame-wide pass.
+
+    Series are resampled before accumulating, and each column is divided
+    by its own number of original samples, so the final values do not
+    depend on resample_str. Columns are numbered in the order of series,
+    followed by the users.
+    """
+
+    parts = list(series)
+    if len(user_run) > 0:
+        parts.append(user_run)
+
+    frame, counts = align_series(parts, resample_str)
+    values = frame.to_numpy(dtype='float64')
+
+    missing = np.isnan(values)
+    if missing.any():
+        cumu = np.nancumsum(values, axis=0)
+        cumu[missing] = np.nan
+    else:
+        cumu = np.cumsum(values, axis=0)
+    cumu /= counts
+    return pd.DataFrame(cumu, index=frame.index)
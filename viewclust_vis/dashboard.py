@@ -0,0 +1,114 @@
+import html
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from viewclust_vis.encode_fig import encode_fig
+from viewclust_vis.write_fig import plotlyjs_src
+
+_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+.tabs button {{ padding: 6px 12px; border: 1px solid #ccc;
+               background: #f4f4f4; cursor: pointer; }}
+.tabs button.active {{ background: #fff; border-bottom-color: #fff; }}
+.tab {{ display: none; height: 85vh; }}
+.tab.active {{ display: block; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+"""
+
+# Figures stay as unparsed JSON text until their tab is first opened
+_SCRIPT = """
+<script>
+function openTab(i) {
+    document.querySelectorAll('.tabs button').forEach(function (b, j) {
+        b.classList.toggle('active', i === j); });
+    document.querySelectorAll('.tab').forEach(function (t, j) {
+        t.classList.toggle('active', i === j); });
+    var tab = document.getElementById('tab-' + i);
+    if (!tab.dataset.drawn) {
+        var fig = JSON.parse(
+            document.getElementById('fig-' + i).textContent);
+        Plotly.newPlot(tab, fig.data, fig.layout, {responsive: true});
+        tab.dataset.drawn = '1';
+    }
+}
+if (document.getElementById('tab-0')) {
+    openTab(0);
+}
+</script>
+</body>
+</html>
+"""
+
+
+def dashboard(fig_dict, fig_out, title='', plotlyjs_root='', binary=False):
+    """Writes several figures to one html file, one tab per figure.
+
+    The page holds a single plotly.js copy. Each figure is stored as JSON
+    text that the browser only parses and draws once its tab is opened,
+    so that the page opens quickly even with every figure requested.
+
+    Parameters
+    -------
+    fig_dict: dict of str to plotly Figure
+        Figures by tab name, e.g. the fig_dict of show_job_use or the
+        output of use_suite. A leading 'fig_' is dropped from the tab
+        labels. Entries that are not figures are skipped.
+    fig_out: str
+        Output html file name.
+    title: str, optional
+        Title of the page. Defaults to 'ViewClust Dashboard'.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs.
+        If given, the page references it by relative path instead of
+        embedding it. Defaults to empty, embedding plotly.js.
+    binary: boolean, optional
+        If True, figure data is stored as base64 typed arrays and epoch
+        offset dates, see encode_fig. Defaults to False.
+
+    See Also
+    -------
+    show_job_use: Generates the figures of one account.
+    """
+
+    figs = [(name, fig) for name, fig in fig_dict.items()
+            if hasattr(fig, 'to_plotly_json')]
+    if title == '':
+        title = 'ViewClust Dashboard'
+
+    with open(fig_out, 'w', encoding='utf-8') as f_out:
+        f_out.write(_HEAD.format(title=html.escape(title)))
+
+        if plotlyjs_root != '':
+            f_out.write('<script src="' +
+                        html.escape(plotlyjs_src(fig_out, plotlyjs_root)) +
+                        '"></script>\n')
+        else:
+            f_out.write('<script>' + get_plotlyjs() + '</script>\n')
+
+        f_out.write('<div class="tabs">')
+        for i, (name, _) in enumerate(figs):
+            label = name[4:] if name.startswith('fig_') else name
+            f_out.write('<button onclick="openTab(' + str(i) + ')">' +
+                        html.escape(label.replace('_', ' ')) + '</button>')
+        f_out.write('</div>\n')
+        if len(figs) == 0:
+            f_out.write('<p>No figures.</p>\n')
+
+        for i, (_, fig) in enumerate(figs):
+            if binary:
+                fig = encode_fig(fig)
+            fig_json = pio.to_json(fig, validate=False)
+            f_out.write('<div class="tab" id="tab-' + str(i) + '"></div>\n')
+            f_out.write('<script type="application/json" id="fig-' +
+                        str(i) + '">' + fig_json.replace('</', '<\\/') +
+                        '</script>\n')
+
+        f_out.write(_SCRIPT)
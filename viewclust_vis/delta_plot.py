@@ -1,7 +1,9 @@
 import plotly.graph_objects as go
 
+from viewclust_vis.write_fig import write_fig
 
-def delta_plot(account_list, dist_list, fig_out=''):
+
+def delta_plot(account_list, dist_list, fig_out='', plotlyjs_root=''):
     """Takes a list of distance from target frames
     and generates the delta plot.
 
@@ -15,6 +17,10 @@ def delta_plot(account_list, dist_list, fig_out=''):
     fig_out: str, optional
         Writes the generated figure to file as the given name.
         If empty, skips writing. Defaults to empty.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs.
+        If given, fig_out references it by relative path instead of
+        embedding it. Defaults to empty, embedding plotly.js.
 
     See Also
     -------
@@ -28,4 +34,4 @@ def delta_plot(account_list, dist_list, fig_out=''):
                                  name=account_list[i],
                                  fillcolor='rgba(200, 128, 128, 1.0)'))
     if fig_out != '':
-        fig.write_html(fig_out)
+        write_fig(fig, fig_out, plotlyjs_root)
@@ -0,0 +1,122 @@
+import numpy as np
+
+
+def lttb_indices(x, y, max_points):
+    """Largest-triangle-three-buckets point selection.
+
+    Keeps the first and last points and, for every bucket in between,
+    the point forming the largest triangle with the previously kept point
+    and the mean of the next bucket.
+
+    Parameters
+    -------
+    x: array_like of float
+        Monotonic x coordinates.
+    y: array_like of float
+        Values at x. NaN is treated as 0 for selection.
+    max_points: int
+        Number of points to keep. Must be at least 3.
+
+    Returns
+    -------
+    idx: ndarray of int
+        Sorted positions of the kept points.
+    """
+
+    x = np.asarray(x, dtype='float64')
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype('int64')
+    idx = np.empty(max_points, dtype='int64')
+    idx[0] = 0
+    idx[-1] = n - 1
+
+    prev = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nxt = slice(edges[i + 1], edges[i + 2])
+            x_next, y_next = x[nxt].mean(), y[nxt].mean()
+        else:
+            x_next, y_next = x[-1], y[-1]
+        area = np.abs((x[prev] - x_next) * (y[lo:hi] - y[prev]) -
+                      (x[prev] - x[lo:hi]) * (y_next - y[prev]))
+        prev = lo + int(np.argmax(area))
+        idx[i + 1] = prev
+
+    return idx
+
+
+def minmax_indices(y, max_points):
+    """Per-bucket minimum and maximum point selection.
+
+    Parameters
+    -------
+    y: array_like of float
+        Values to downsample. NaN is treated as 0 for selection.
+    max_points: int
+        Upper bound on the number of points to keep.
+
+    Returns
+    -------
+    idx: ndarray of int
+        Sorted positions of the first, last and each bucket's extreme points.
+    """
+
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+    n = len(y)
+    if max_points >= n or max_points < 4:
+        return np.arange(n)
+
+    n_buckets = (max_points - 2) // 2
+    bucket = np.arange(n) * n_buckets // n
+
+    # Order by bucket then value, the ends of each run are min and max
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+
+    return np.unique(np.concatenate(([0, n - 1], order[starts],
+                                     order[ends])))
+
+
+def downsample(series, max_points, method='lttb'):
+    """Reduces a time series or frame to at most max_points rows.
+
+    Frames are reduced with a single selection computed on the row sums,
+    so stacked columns stay aligned on a shared index.
+
+    Parameters
+    -------
+    series: Series or DataFrame
+        Time indexed data, e.g. any of the job_use outputs.
+    max_points: int
+        Number of rows to keep. Zero or less disables downsampling.
+    method: str, optional
+        One of: {'lttb', 'minmax'}. Defaults to 'lttb'.
+
+    Returns
+    -------
+    reduced: Series or DataFrame
+        Row subset of series, or series itself if no reduction is needed.
+    """
+
+    if max_points <= 0 or len(series) <= max_points:
+        return series
+
+    values = series.to_numpy(dtype='float64')
+    if values.ndim > 1:
+        values = np.nansum(values, axis=1)
+
+    if method == 'lttb':
+        x = series.index.to_numpy().astype('int64').astype('float64')
+        idx = lttb_indices(x, values, max_points)
+    elif method == 'minmax':
+        idx = minmax_indices(values, max_points)
+    else:
+        raise AttributeError('invalid downsample method')
+
+    return series.iloc[idx]
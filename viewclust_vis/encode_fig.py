@@ -0,0 +1,107 @@
+import base64
+
+import numpy as np
+
+# Trace types drawing coordinates from an offset and a step, see x0 and dx
+_STEP_TRACES = ('scatter', 'scattergl', 'bar')
+
+# Typed array names understood by plotly.js
+_TYPED = {'float64': 'f8', 'float32': 'f4', 'int32': 'i4', 'int16': 'i2',
+          'int8': 'i1', 'uint32': 'u4', 'uint16': 'u2', 'uint8': 'u1'}
+
+
+def encode_fig(fig):
+    """Compacts the data arrays of a figure before it is written to html.
+
+    Numeric arrays become base64 typed arrays instead of JSON number lists.
+    Date coordinates, which plotly otherwise writes as one ISO string per
+    point, become milliseconds since the epoch on a date axis. A regular
+    time index is reduced further to its first date and fixed step,
+    using the x0 and dx trace attributes. Typed arrays need plotly.js 2.28
+    or later in the page.
+
+    Parameters
+    -------
+    fig: plotly Figure or dict
+        Figure to encode, not modified.
+
+    Returns
+    -------
+    dict
+        Figure dict ready for write_fig, which writes it as is.
+    """
+
+    if not isinstance(fig, dict):
+        fig = fig.to_dict()
+
+    layout = dict(fig.get('layout', {}))
+    data = []
+    for trace in fig.get('data', []):
+        trace = dict(trace)
+        for axis in ('x', 'y'):
+            values = trace.get(axis)
+            if values is None:
+                continue
+            values = np.asarray(values) if _is_array(values) else values
+            if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+                _encode_dates(trace, axis, values)
+                _date_axis(layout, trace.get(axis + 'axis', axis))
+        for key, values in trace.items():
+            if isinstance(values, np.ndarray) and values.ndim == 1:
+                trace[key] = _typed_array(values)
+        data.append(trace)
+
+    return dict(fig, data=data, layout=layout)
+
+
+def _encode_dates(trace, axis, values):
+    """Replaces dates by epoch milliseconds, or an offset and step."""
+
+    ns = values.astype('datetime64[ns]').view('int64')
+    missing = np.isnat(values)
+    steps = np.diff(ns)
+    if trace.get('type', 'scatter') in _STEP_TRACES and len(ns) > 1 and \
+            not missing.any() and (steps == steps[0]).all():
+        del trace[axis]
+        first = np.datetime_as_string(values[0], unit='us')
+        trace[axis + '0'] = str(first)
+        trace['d' + axis] = float(steps[0]) / 1e6
+        return
+
+    millis = ns / 1e6
+    millis[missing] = np.nan
+    trace[axis] = millis
+
+
+def _date_axis(layout, axis_ref):
+    """Marks the axis behind a trace axis reference, e.g. 'x2', as dates."""
+
+    name = axis_ref[0] + 'axis' + axis_ref[1:]
+    axis = dict(layout.get(name, {}))
+    axis.setdefault('type', 'date')
+    layout[name] = axis
+
+
+def _is_array(values):
+    """Lists and array-likes, but not strings or typed array dicts."""
+
+    return hasattr(values, '__len__') and not isinstance(values, (str, dict))
+
+
+def _typed_array(values):
+    """base64 typed array of a numeric array, other arrays are kept."""
+
+    if values.dtype.kind == 'b':
+        values = values.astype('uint8')
+    elif values.dtype.kind in 'iu' and values.dtype.name not in _TYPED:
+        info = np.iinfo('int32')
+        if len(values) == 0 or (values.min() >= info.min and
+                                values.max() <= info.max):
+            values = values.astype('int32')
+        else:
+            values = values.astype('float64')
+    if values.dtype.name not in _TYPED:
+        return values
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+    return {'dtype': _TYPED[values.dtype.name],
+            'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
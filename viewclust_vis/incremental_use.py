@@ -0,0 +1,195 @@
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from viewclust.target_series import target_series
+from viewclust_vis.multi_job_use import (USAGE_SERIES, job_events, series_use,
+                                         target_dist, users_use)
+
+_HOUR = 3600
+_NAT = np.iinfo('int64').min
+
+# Series that depend on the full job history, the others only on the
+# jobs currently running or pending and are always rebuilt
+_HISTORY_SERIES = [name for name, (_, _, jobs) in USAGE_SERIES.items()
+                   if jobs == 'all']
+
+
+def incremental_job_use(jobs, d_from, target, d_to, use_unit='cpu',
+                        state=None):
+    """multi_job_use that carries its results over from the previous run.
+
+    Without a state this is a full multi_job_use computation. With the
+    state of a previous run, jobs only needs to hold the jobs whose records
+    changed since state['watermark'], i.e. a sacct query starting at the
+    watermark. They replace their previous records, and each history series
+    is recomputed only from the first hour any of their events moved.
+    Users without changed jobs keep their previous series.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        All jobs of the query if state is None, else the changed jobs.
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    target: int-like
+        Target share of the account, see multi_job_use.
+    d_to: date str
+        End of the query period. Becomes the watermark of the new state.
+    use_unit: str, optional
+        Usage unit to examine, see multi_job_use. Defaults to 'cpu'.
+    state: dict, optional
+        State returned by the previous run, see state_matches.
+
+    Returns
+    -------
+    usage: dict
+        As returned by multi_job_use.
+    job_frame: DataFrame
+        All jobs of the query period after folding in the changes.
+    state: dict
+        State to pass to the next run, see save_use_state.
+    """
+
+    baseline = target_series([(d_from, d_to, 0)])
+
+    if state is None:
+        job_frame = jobs
+        cuts = {}
+        changed_users = None
+    else:
+        job_frame, cuts, changed_users = _fold_changes(state, jobs, d_to,
+                                                       use_unit)
+
+    events = job_events(job_frame, d_to, use_unit)
+
+    usage = {}
+    span_end = {}
+    for name, (on, off, job_mask) in USAGE_SERIES.items():
+        if name not in cuts or state['span_end'][name] is None:
+            part = series_use(events, name)
+        elif cuts[name] is None:
+            # Same events, only the baseline grows
+            part = state['usage'][name]
+        else:
+            # Hours are means over the covered seconds, so everything
+            # after the end of the old spans is recomputed as well
+            cut = min(cuts[name], state['span_end'][name])
+            old = state['usage'][name]
+            old = old[old.index < pd.Timestamp(cut // _HOUR * _HOUR,
+                                               unit='s')]
+            part = pd.concat([old, series_use(events, name, since=cut)])
+            part = part.ffill()
+        usage[name] = part.add(baseline, fill_value=0)
+        span_end[name] = _span_end(events, on, off, events[job_mask])
+
+    usage['clust'], usage['dist'] = target_dist(target, usage['running'],
+                                                d_from, d_to)
+
+    user_names = job_frame['user'].to_numpy()
+    if changed_users is None:
+        usage['user_run'] = users_use(events, user_names, d_from, d_to)
+    else:
+        old_users = state['usage']['user_run']
+        user_series = []
+        for user in pd.unique(user_names):
+            if user in changed_users or user not in old_users:
+                user_run = series_use(events, 'running',
+                                      mask=user_names == user)
+            else:
+                user_run = old_users[user].dropna()
+            user_run = user_run.add(baseline, fill_value=0)
+            user_series.append(pd.Series(user_run.loc[d_from:d_to],
+                                         name=user))
+        usage['user_run'] = pd.concat(user_series, axis=1)
+
+    state = {'d_from': d_from, 'target': target, 'use_unit': use_unit,
+             'watermark': d_to, 'jobs': job_frame, 'usage': usage,
+             'span_end': span_end}
+    return usage, job_frame, state
+
+
+def state_matches(state, d_from, target, use_unit):
+    """True if state was computed for the same query and can be refreshed."""
+
+    if state is None:
+        return False
+    if state['d_from'] != d_from or state['use_unit'] != use_unit:
+        return False
+    if isinstance(target, int) or isinstance(state['target'], int):
+        return type(target) is type(state['target']) and \
+            target == state['target']
+    return target.equals(state['target'])
+
+
+def load_use_state(state_path):
+    """Reads a state saved by save_use_state, None if there is none."""
+
+    if not os.path.exists(state_path):
+        return None
+    return pd.read_pickle(state_path)
+
+
+def save_use_state(state_path, state):
+    """Pickles the state of incremental_job_use, atomically."""
+
+    tmp_path = state_path + '.' + uuid.uuid4().hex + '.tmp'
+    pd.to_pickle(state, tmp_path, protocol=4)
+    os.replace(tmp_path, state_path)
+
+
+def _fold_changes(state, changed, d_to, use_unit):
+    """Merges changed jobs into the stored jobs and finds what moved.
+
+    Returns the merged frame, the first moved epoch second of each history
+    series (None if nothing moved) and the users owning changed jobs.
+    """
+
+    old_jobs = state['jobs']
+    if len(changed) == 0:
+        return old_jobs, dict.fromkeys(_HISTORY_SERIES), set()
+
+    changed = changed.drop_duplicates(subset='jobid', keep='last')
+    is_changed = old_jobs['jobid'].isin(changed['jobid'])
+    job_frame = pd.concat([old_jobs[~is_changed], changed],
+                          ignore_index=True)
+    job_frame = job_frame.sort_values(by=['submit'], kind='stable',
+                                      ignore_index=True)
+
+    before = old_jobs[is_changed].drop_duplicates(subset='jobid',
+                                                  keep='last')
+    before = before.set_index('jobid').reindex(changed['jobid'])
+    before = before.reset_index()
+    ev_old = job_events(before, state['watermark'], use_unit)
+    ev_new = job_events(changed, d_to, use_unit)
+
+    cuts = {}
+    for name in _HISTORY_SERIES:
+        on, off, _ = USAGE_SERIES[name]
+        moved = ((ev_old[on] != ev_new[on]) | (ev_old[off] != ev_new[off]) |
+                 (ev_old['use'] != ev_new['use']))
+        times = np.concatenate([ev[key][moved] for ev in (ev_old, ev_new)
+                                for key in (on, off)])
+        times = times[times != _NAT]
+        cuts[name] = int(times.min()) if len(times) > 0 else None
+
+    moved_users = set(changed['user']) | set(before['user'].dropna())
+    return job_frame, cuts, moved_users
+
+
+def _span_end(events, on, off, keep):
+    """Earliest of the last on and last off event of a series.
+
+    Hours after it can change when later events are added, because
+    job_use averages only over the seconds its event spans cover.
+    """
+
+    ends = []
+    for key in (on, off):
+        times = events[key][keep]
+        times = times[times != _NAT]
+        if len(times) > 0:
+            ends.append(int(times.max()))
+    return min(ends) if ends else None
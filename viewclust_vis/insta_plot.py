@@ -1,11 +1,23 @@
 import plotly.graph_objects as go
 import sys
 
+from viewclust_vis.align_series import align_series, aligned_column
+from viewclust_vis.downsample import downsample
+from viewclust_vis.render_mode import (WEBGL_THRESHOLD, scatter_type,
+                                       stacked_traces)
+from viewclust_vis.top_users import top_users
+from viewclust_vis.use_store import store_series
+from viewclust_vis.write_fig import write_fig
 
-def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
+
+def insta_plot(clust_info=[], cores_queued=[], cores_running=[],
+               resample_str='',
                fig_out='', y_label='Usage', fig_title='', query_bounds=True,
                running=[], queued=[], submit_run=[], submit_req=[], eligible_queued=[],
-               user_run=[], plot_queued=True):
+               user_run=[], plot_queued=True, render_mode='auto',
+               webgl_threshold=WEBGL_THRESHOLD, max_points=0,
+               downsample_method='lttb', plotlyjs_root='', max_users=0,
+               user_rank=[], binary=False, store=None, d_from='', d_to=''):
     """Instantaneous usage plot.
 
     Parameters
@@ -20,9 +32,10 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         Series displaying running resources at a particular time.
         See job_use from viewclust.
     resample_str: pandas freq str, optional
-        Defaults to empty, meaning no resampling. Passing this parameter
-        does not do sanity checking and will only run the below code example.
-        cores_queued = cores_queued.resample('1D').sum()
+        Defaults to empty, meaning no resampling. Every series, the
+        user_run stacks included, is summed per resample period in one
+        pass, as cores_queued.resample('1D').sum() would: empty periods
+        inside a series are drawn as 0. See align_series.
     fig_out: str, optional
         Writes the generated figure to file as the given name.
         If empty, skips writing. Defaults to empty.
@@ -51,107 +64,158 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         Allows for easier interpretation of
         the queued series. Defaults to not plotting.
     eligible_queued:  DataFrame, optional
+    user_run: DataFrame or UserMatrix, optional
+        Running usage per user, stacked as one trace per user.
+        See get_users_run from viewclust. A UserMatrix, see
+        multi_job_use, is only made dense for the users drawn.
+    render_mode: str, optional
+        One of: {'auto', 'svg', 'webgl'}. 'auto' draws WebGL traces when
+        the longest plotted series has more than webgl_threshold points.
+        Defaults to 'auto'.
+    webgl_threshold: int, optional
+        Point count above which 'auto' switches to WebGL.
+    max_points: int, optional
+        Reduces every plotted series to at most this many points after
+        resampling, keeping peaks and troughs. Defaults to 0, meaning no
+        downsampling.
+    downsample_method: str, optional
+        One of: {'lttb', 'minmax'}. See downsample. Defaults to 'lttb'.
+    max_users: int, optional
+        Plots only the max_users users of largest total usage, the others
+        being stacked as a single 'other' trace. See top_users.
+        Defaults to 0, plotting every user.
+    user_rank: Series, optional
+        Ranking of user_run from rank_users, reused instead of ranking
+        the users again. Defaults to ranking them here.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs.
+        If given, fig_out references it by relative path instead of
+        embedding it. Defaults to empty, embedding plotly.js.
+    binary: boolean, optional
+        If True, fig_out is written with base64 typed arrays and epoch
+        offset dates, which is smaller and faster to load, see encode_fig.
+        Defaults to False.
+    store: UseStore, optional
+        If given, every series left empty is read from the store, over
+        the d_from to d_to window only. Defaults to None.
+    d_from: date str, optional
+        Beginning of the window read from store. Defaults to its start.
+    d_to: date str, optional
+        End of the window read from store. Defaults to its end.
 
     See Also
     -------
     jobUse: Generates the input frames for this function.
     """
 
-    # Temp vars so that we aren't touching anything by ref
-    clust_info_tmp = clust_info.copy()
-    cores_queued_tmp = cores_queued.copy()
-    cores_running_tmp = cores_running.copy()
+    if store is not None:
+        (clust_info, cores_queued, cores_running, running, queued,
+         submit_run, submit_req, user_run) = store_series(
+            store, d_from, d_to, clust=clust_info, queued=cores_queued,
+            running=cores_running, run_running=running, q_queued=queued,
+            submit_run=submit_run, submit_req=submit_req, user_run=user_run)
+
+    if (len(clust_info) == 0 or len(cores_queued) == 0 or
+            len(cores_running) == 0):
+        raise AttributeError('invalid series, pass clust_info, cores_queued '
+                             'and cores_running or a store holding them')
+
+    if len(user_run) > 0:
+        user_run = top_users(user_run, max_users, user_rank)
+
+    # Supplied series, keyed by the trace they feed
+    series = {'clust': clust_info, 'queued': cores_queued,
+              'running': cores_running}
+    for name, extra in (('run_running', running), ('q_queued', queued),
+                        ('submit_run', submit_run),
+                        ('submit_req', submit_req),
+                        ('eligible', eligible_queued)):
+        if len(extra) > 0:
+            series[name] = extra
 
+    # Inputs are only read, so they are used as is unless resampled
     if resample_str != '':
-        clust_info_tmp = clust_info_tmp.resample(resample_str).sum()
-        cores_queued_tmp = cores_queued_tmp.resample(resample_str).sum()
-        cores_running_tmp = cores_running_tmp.resample(resample_str).sum()
+        parts = list(series.values())
+        if len(user_run) > 0:
+            parts.append(user_run)
+        frame, _ = align_series(parts, resample_str)
+        if len(user_run) > 0:
+            users = frame.iloc[:, len(series):].dropna(how='all')
+            users.columns = user_run.columns
+            user_run = users
+        series = {name: aligned_column(frame, col)
+                  for col, name in enumerate(series)}
+
+    plotted = {name: downsample(values, max_points, downsample_method)
+               for name, values in series.items()}
+    user_run = downsample(user_run, max_points, downsample_method)
+
+    n_points = max(len(plotted['clust']), len(plotted['running']),
+                   len(user_run))
+    scatter = scatter_type(n_points, render_mode, webgl_threshold)
 
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=clust_info_tmp.index,
-                             y=clust_info_tmp,
-                             fill='tozeroy',
-                             mode='none',
-                             name='Allocation',
-                             fillcolor='rgba(180, 180, 180, .3)'))
+    fig.add_trace(scatter(x=plotted['clust'].index,
+                          y=plotted['clust'],
+                          fill='tozeroy',
+                          mode='none',
+                          name='Allocation',
+                          fillcolor='rgba(180, 180, 180, .3)'))
 
     if len(user_run) > 0:
-        for user in user_run:
-            fig.add_trace(go.Scatter(
-                          x=user_run.index, y=user_run[user],
-                          line=dict(width=0),
-                          hoverinfo='x+y',
-                          opacity=.1,
-                          mode='none',
-                          name=user,
-                          stackgroup='use'  # define stack group
-                          ))
+        fig.add_traces(stacked_traces(user_run, scatter,
+                                      line=dict(width=0),
+                                      hoverinfo='x+y',
+                                      opacity=.1,
+                                      mode='none'))
 
     if plot_queued:
-        fig.add_trace(go.Scatter(x=cores_queued_tmp.index,
-                                 y=cores_queued_tmp,
-                                 mode='lines',
-                                 name='Resources queued',
-                                 marker_color='rgba(160,160,220, .8)'))
-
-    if len(running) > 0:
-        running_tmp = running.copy()
-        if resample_str != '':
-            running_tmp = running_tmp.resample(resample_str).sum()
-
-        fig.add_trace(go.Scatter(x=running_tmp.index, y=running_tmp,
-                                 mode='lines',
-                                 name='Resources running',
-                                 marker_color='rgba(80,240,80, .8)'))
-
-    if len(queued) > 0:
-        queued_tmp = queued.copy()
-        if resample_str != '':
-            queued_tmp = queued_tmp.resample(resample_str).sum()
-
-        fig.add_trace(go.Scatter(x=queued_tmp.index, y=queued_tmp,
-                                 mode='lines',
-                                 name='Resources queued',
-                                 marker_color='rgba(80,80,80, .8)'))
-
-    if len(submit_run) > 0:
-        submit_run_tmp = submit_run.copy()
-        if resample_str != '':
-            submit_run_tmp = submit_run_tmp.resample(resample_str).sum()
-
-        fig.add_trace(go.Scatter(x=submit_run_tmp.index,
-                                 y=submit_run_tmp,
-                                 mode='lines',
-                                 name='Resources run at submit (elapsed)',
-                                 marker_color='rgba(220,80,80, .8)'))
-
-    if len(submit_req) > 0:
-        submit_req_tmp = submit_req.copy()
-        if resample_str != '':
-            submit_req_tmp = submit_req_tmp.resample(resample_str).sum()
-
-        fig.add_trace(go.Scatter(x=submit_req_tmp.index,
-                                 y=submit_req_tmp,
-                                 mode='lines',
-                                 name='Resources run at submit (timelimit)',
-                                 marker_color='rgba(220,160,00, .8)'))
-
-    if len(eligible_queued) > 0:
-        eligible_queued_tmp = eligible_queued.copy()
-        if resample_str != '':
-            eligible_queued_tmp = eligible_queued_tmp.resample(resample_str).sum()
-
-        fig.add_trace(go.Scatter(x=eligible_queued_tmp.index,
-                                 y=eligible_queued_tmp,
-                                 mode='lines',
-                                 name='Eligible resources queued',
-                                 marker_color='rgba(40,40,40, .6)'))
-
-    fig.add_trace(go.Scatter(x=cores_running_tmp.index,
-                             y=cores_running_tmp,
-                             mode='lines',
-                             name='Resources running',
-                             marker_color='rgba(80,80,220, .8)'))
+        fig.add_trace(scatter(x=plotted['queued'].index,
+                              y=plotted['queued'],
+                              mode='lines',
+                              name='Resources queued',
+                              marker_color='rgba(160,160,220, .8)'))
+
+    if 'run_running' in plotted:
+        fig.add_trace(scatter(x=plotted['run_running'].index,
+                              y=plotted['run_running'],
+                              mode='lines',
+                              name='Resources running',
+                              marker_color='rgba(80,240,80, .8)'))
+
+    if 'q_queued' in plotted:
+        fig.add_trace(scatter(x=plotted['q_queued'].index,
+                              y=plotted['q_queued'],
+                              mode='lines',
+                              name='Resources queued',
+                              marker_color='rgba(80,80,80, .8)'))
+
+    if 'submit_run' in plotted:
+        fig.add_trace(scatter(x=plotted['submit_run'].index,
+                              y=plotted['submit_run'],
+                              mode='lines',
+                              name='Resources run at submit (elapsed)',
+                              marker_color='rgba(220,80,80, .8)'))
+
+    if 'submit_req' in plotted:
+        fig.add_trace(scatter(x=plotted['submit_req'].index,
+                              y=plotted['submit_req'],
+                              mode='lines',
+                              name='Resources run at submit (timelimit)',
+                              marker_color='rgba(220,160,00, .8)'))
+
+    if 'eligible' in plotted:
+        fig.add_trace(scatter(x=plotted['eligible'].index,
+                              y=plotted['eligible'],
+                              mode='lines',
+                              name='Eligible resources queued',
+                              marker_color='rgba(40,40,40, .6)'))
+
+    fig.add_trace(scatter(x=plotted['running'].index,
+                          y=plotted['running'],
+                          mode='lines',
+                          name='Resources running',
+                          marker_color='rgba(80,80,220, .8)'))
     if query_bounds:
         max_y = max(cores_running.max(), cores_queued.max())
         min_x = clust_info.index.min()
@@ -189,6 +253,6 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         )
     )
     if fig_out != '':
-        fig.write_html(fig_out)
+        write_fig(fig, fig_out, plotlyjs_root, binary)
 
     return fig
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+_NAT = np.iinfo('int64').min
+_OPEN = np.iinfo('int64').max
+
+# Job spans that can be indexed: name -> (from column, to column)
+JOB_SPANS = {
+    'job': ('submit', 'end'),
+    'request': ('start', 'req_end'),
+}
+
+
+class JobIndex:
+    """Sorted interval index over the time spans of a job frame.
+
+    Built once, it finds the jobs overlapping any time window with two
+    binary searches instead of comparing every job: spans are sorted by
+    their beginning and the running maximum of their ends bounds the
+    first span that can still reach the window. Only the spans between
+    those two positions are checked.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job DataFrame typically generated by slurm/sacct_jobs.
+        Not modified, and not copied.
+    span: str, optional
+        One of: {'job', 'request'}. 'job' indexes each job from submit to
+        end, 'request' from start to start plus timelimit. Jobs without
+        a beginning are never found, jobs without an end are taken as
+        still open. Defaults to 'job'.
+
+    Examples
+    -------
+    Weekly slices of a year of jobs::
+
+        index = JobIndex(jobs)
+        for week_from, positions in index.windows(d_from, d_to, '7D'):
+            job_stack(jobs.iloc[positions], fig_out=str(week_from.date()))
+    """
+
+    def __init__(self, jobs, span='job'):
+        if span not in JOB_SPANS:
+            raise AttributeError('invalid span')
+        self.jobs = jobs
+        self.span = span
+
+        col_from, col_to = JOB_SPANS[span]
+        lo = _nanoseconds(jobs[col_from])
+        if col_to == 'req_end':
+            hi = _nanoseconds(jobs['start'] + jobs['timelimit'])
+        else:
+            hi = _nanoseconds(jobs[col_to])
+        hi[hi == _NAT] = _OPEN
+
+        known = np.flatnonzero(lo != _NAT)
+        order = known[np.argsort(lo[known], kind='stable')]
+        self._order = order
+        self._lo = lo[order]
+        self._hi = hi[order]
+        self._max_hi = np.maximum.accumulate(self._hi)
+
+    def __len__(self):
+        return len(self._order)
+
+    def overlapping(self, d_from='', d_to=''):
+        """Positions of the jobs whose span overlaps d_from to d_to.
+
+        Both bounds are inclusive, and an empty bound leaves the window
+        open on that side. Positions are in frame order, for
+        use with jobs.iloc.
+        """
+
+        lo_end = len(self._lo)
+        if d_to != '':
+            lo_end = np.searchsorted(self._lo, pd.Timestamp(d_to).value,
+                                     side='right')
+        first = 0
+        if d_from != '':
+            t_from = pd.Timestamp(d_from).value
+            # Spans before first all end before the window starts
+            first = np.searchsorted(self._max_hi, t_from, side='left')
+        if first >= lo_end:
+            return np.zeros(0, dtype='int64')
+
+        positions = self._order[first:lo_end]
+        if d_from != '':
+            positions = positions[self._hi[first:lo_end] >= t_from]
+        return np.sort(positions)
+
+    def window(self, d_from='', d_to=''):
+        """Rows of jobs overlapping d_from to d_to, see overlapping."""
+
+        return self.jobs.iloc[self.overlapping(d_from, d_to)]
+
+    def windows(self, d_from, d_to, freq='7D'):
+        """Yields the start and job positions of consecutive windows.
+
+        Windows of length freq cover d_from to d_to, each including its
+        start and excluding the next window's start.
+        """
+
+        step = pd.Timedelta(freq)
+        t_end = pd.Timestamp(d_to)
+        w_from = pd.Timestamp(d_from)
+        while w_from < t_end:
+            w_to = min(w_from + step, t_end) - pd.Timedelta(1, 'ns')
+            yield w_from, self.overlapping(w_from, w_to)
+            w_from += step
+
+
+def _nanoseconds(times):
+    """Epoch nanoseconds of a datetime column, NaT as the int64 minimum."""
+
+    return times.to_numpy(dtype='datetime64[ns]').view('int64').copy()
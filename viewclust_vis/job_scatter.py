@@ -2,19 +2,33 @@ import pandas as pd
 import datetime as dt
 from datetime import datetime
 from pathlib import Path
-import plotly.express as px
 import plotly.graph_objects as go
+from plotly.colors import qualitative
 
 import viewclust as vc
 from viewclust import slurm
 from viewclust.target_series import target_series
 
+from viewclust_vis.compact_jobs import compact_jobs
 from viewclust_vis.job_stack import job_stack
+from viewclust_vis.render_mode import WEBGL_THRESHOLD, scatter_type
+from viewclust_vis.sacct_cache import cached_sacct_jobs
+from viewclust_vis.stage_log import log_stage
+from viewclust_vis.write_fig import write_figs
+
+# Columns read by the job_scatter figures
+_SCATTER_COLUMNS = ['jobid', 'user', 'account', 'submit', 'start', 'end',
+                    'timelimit', 'state', 'reqcpus', 'mem', 'partition',
+                    'priority']
 
 
 def job_scatter(account, target, d_from, d_to='', d_from_drop='', out_name='',
                 out_path='', plot_jobstack=True, plot_insta=True,
-                plot_cumu=True, plot_mem_delta=False, plot_start_wait=False):
+                plot_cumu=True, plot_mem_delta=False, plot_start_wait=False,
+                render_mode='auto', webgl_threshold=WEBGL_THRESHOLD,
+                plotlyjs_root='', cache_dir='', override_frame=[],
+                compact=True, workers=0, binary=False, stage_log=None,
+                prune_columns=False):
 
     """Accepts an account name and query period to
     generate job usage summary figures.
@@ -59,6 +73,43 @@ def job_scatter(account, target, d_from, d_to='', d_from_drop='', out_name='',
     plot_start_wait: boolean, optional
         If True create the start-time by wait-hours scatter plot figure.
         Defaults to False.
+    render_mode: str, optional
+        One of: {'auto', 'svg', 'webgl'}. Passed on to every scatter figure.
+        'auto' draws WebGL traces above webgl_threshold points.
+        Defaults to 'auto'.
+    webgl_threshold: int, optional
+        Point count above which 'auto' switches to WebGL.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs.
+        If given, every written html file references it by relative path
+        instead of embedding it. Defaults to empty, embedding plotly.js.
+    cache_dir: str, optional
+        If given, job records are read through cached_sacct_jobs, which
+        keeps finished months on disk in this folder and only queries
+        slurm for the open tail of the window. Defaults to empty, no cache.
+    override_frame: Dataframe
+        Defaults to empty.
+        If non empty, overrides the sacct call with the supplied Dataframe
+    compact: boolean, optional
+        If True, the job records go through compact_jobs first: strings
+        become categoricals and integers are downcast. The returned
+        job_frame is this compact copy, with every column unless
+        prune_columns. Defaults to True.
+    workers: int, optional
+        Number of threads building and writing the figures.
+        See write_figs. Defaults to 0, one per figure up to the cpu count
+        and MAX_WORKERS of write_fig.
+    binary: boolean, optional
+        If True, every figure is written with base64 typed arrays,
+        see encode_fig. Defaults to False.
+    stage_log: StageLog, optional
+        If given, records the 'query', 'compact' and 'partition' stages,
+        then 'build', 'serialize' and 'write' per figure. Defaults to None.
+    prune_columns: boolean, optional
+        If True along with compact, the columns that no figure reads, e.g.
+        reqtres, are dropped as well, which saves memory on large accounts.
+        The returned job_frame then lacks them. Defaults to False, keeping
+        every column.
 
     Output
     -------
@@ -76,14 +127,27 @@ def job_scatter(account, target, d_from, d_to='', d_from_drop='', out_name='',
     Path(safe_folder).mkdir(parents=True, exist_ok=True)
 
     # Perform ES job record query
-    job_frame = slurm.sacct_jobs(account, d_from, d_to=d_to)
+    with log_stage(stage_log, 'query') as record:
+        if len(override_frame) != 0:
+            job_frame = override_frame
+        elif cache_dir != '':
+            job_frame = cached_sacct_jobs(account, d_from, d_to=d_to,
+                                          cache_dir=cache_dir)
+        else:
+            job_frame = slurm.sacct_jobs(account, d_from, d_to=d_to)
+        record['rows'] = len(job_frame)
 
     if d_from_drop != '':
         job_frame = job_frame[job_frame['start'] > d_from_drop]
         job_frame = job_frame[job_frame['submit'] > d_from_drop]
 
-    print(job_frame)
-    print('Number of josb in query: '+str(len(job_frame)))
+    # Compact dtypes, and on request drop the columns no figure reads
+    if compact:
+        with log_stage(stage_log, 'compact', rows=len(job_frame)) as record:
+            keep = _SCATTER_COLUMNS if prune_columns else []
+            job_frame = compact_jobs(job_frame, columns=keep)
+            record['bytes'] = int(job_frame.memory_usage(deep=True).sum())
+
     print('Number of jobs in query: '+str(len(job_frame)))
     job_frame['waittime'] = job_frame['start'] - job_frame['submit']
 
@@ -93,80 +157,139 @@ def job_scatter(account, target, d_from, d_to='', d_from_drop='', out_name='',
 
     job_frame['mem_c'] = job_frame['mem']/job_frame['reqcpus']
 
-    fig_viol = px.violin(job_frame,
-                         y='priority')
-    fig_viol.write_html(safe_folder + account + out_name + 'violin.html')
+    # Jobs are split by partition and by state once, every figure then
+    # reads its traces straight from these positions
+    with log_stage(stage_log, 'partition', rows=len(job_frame)):
+        groups, pend_groups, run_groups = _job_groups(job_frame)
 
-    fig_scat = px.scatter(job_frame,
-                          x='waittime_hours',
-                          y='priority',
-                          opacity=.3,
-                          color="partition")
-    fig_scat.update_layout(
-        title=go.layout.Title(
-            text="Job scatter: ",
-            xref="paper",
-            x=0
-        ),
-        xaxis=go.layout.XAxis(
-            title=go.layout.xaxis.Title(
-                text="Wait time hours",
-                font=dict(
-                    family="Courier New, monospace",
-                    size=18,
-                    color="#7f7f7f"
-                )
-            )
-        ),
-        yaxis=go.layout.YAxis(
-            title=go.layout.yaxis.Title(
-                text='Priority',
-                font=dict(
-                    family="Courier New, monospace",
-                    size=18,
-                    color="#7f7f7f"
-                )
-            )
-        )
-    )
-    fig_scat.write_html(safe_folder + account + out_name + 'scatter.html')
-
-    fig_hist = px.histogram(job_frame,
-                            y='priority',
-                            color="partition")
-    fig_hist.write_html(safe_folder + account + out_name + 'histogram_y.html')
-
-    fig_hist = px.histogram(job_frame,
-                            x='waittime_hours',
-                            color="partition")
-    fig_hist.write_html(safe_folder + account + out_name + 'histogram_x.html')
-
-    job_frame_pend = job_frame.copy()
-    job_frame_pend = job_frame_pend[
-        job_frame_pend['state'].str.match('PENDING')]
-
-    fig_hist = px.histogram(job_frame_pend,
-                            y='priority',
-                            color="partition")
-    fig_hist.write_html(
-        safe_folder + account + out_name + 'pend_histogram_y.html')
-
-    job_frame_run = job_frame.copy()
-    job_frame_run = job_frame_run[job_frame_run['state'].str.match('RUNNING')]
-
-    fig_hist = px.histogram(job_frame_run,
-                            y='priority',
-                            color="partition")
-    fig_hist.write_html(
-        safe_folder + account + out_name + 'run_histogram_y.html')
-
-    fig_scat = px.scatter(job_frame_run,
-                          x='mem_c',
-                          y='priority',
-                          opacity=.3,
-                          color="partition",
-                          hover_data=['jobid'])
-    fig_scat.update_layout(
+    priority = job_frame['priority'].to_numpy()
+    waittime_hours = job_frame['waittime_hours'].to_numpy()
+    mem_c = job_frame['mem_c'].to_numpy()
+    jobid = job_frame['jobid'].to_numpy()
+
+    n_run = sum(len(pos) for pos in run_groups.values())
+    scatter = scatter_type(len(job_frame), render_mode, webgl_threshold)
+    run_scatter = scatter_type(n_run, render_mode, webgl_threshold)
+
+    def violin():
+        fig = go.Figure(go.Violin(y=priority, x0=' ', name='',
+                                  hovertemplate='priority=%{y}'
+                                                '<extra></extra>'))
+        fig.update_layout(yaxis_title_text='priority', violinmode='group')
+        return fig
+
+    def wait_scatter():
+        fig = _partition_scatter(scatter, groups, waittime_hours,
+                                 priority, 'waittime_hours')
+        return _scatter_layout(fig, 'Wait time hours')
+
+    def mem_scatter():
+        fig = _partition_scatter(run_scatter, run_groups, mem_c,
+                                 priority, 'mem_c', jobid)
+        return _scatter_layout(fig, 'Memory per cpu')
+
+    prefix = safe_folder + account + out_name
+    builders = {
+        prefix + 'violin.html': violin,
+        prefix + 'scatter.html': wait_scatter,
+        prefix + 'histogram_y.html':
+            lambda: _partition_histogram(groups, priority,
+                                         'priority', 'y'),
+        prefix + 'histogram_x.html':
+            lambda: _partition_histogram(groups, waittime_hours,
+                                         'waittime_hours', 'x'),
+        prefix + 'pend_histogram_y.html':
+            lambda: _partition_histogram(pend_groups, priority,
+                                         'priority', 'y'),
+        prefix + 'run_histogram_y.html':
+            lambda: _partition_histogram(run_groups, priority,
+                                         'priority', 'y'),
+        prefix + 'run_scatter.html': mem_scatter,
+    }
+    write_figs(builders, plotlyjs_root, workers, binary=binary,
+               stage_log=stage_log)
+
+    return job_frame
+
+
+def _job_groups(job_frame):
+    """Positions of the jobs of each partition: all, pending and running.
+
+    Partitions are in order of first appearance, as px orders its traces.
+    """
+
+    groups = job_frame.groupby('partition', observed=True, sort=False,
+                               dropna=False).indices
+    groups = dict(sorted(groups.items(), key=lambda item: item[1][0]))
+    state = job_frame['state'].to_numpy()
+    is_pend = state == 'PENDING'
+    is_run = state == 'RUNNING'
+    pend_groups = {name: pos[is_pend[pos]] for name, pos in groups.items()}
+    run_groups = {name: pos[is_run[pos]] for name, pos in groups.items()}
+    return groups, pend_groups, run_groups
+
+
+def _partition_colors(groups):
+    """px colors of the non-empty groups, in order of first appearance."""
+
+    present = sorted((pos[0], name) for name, pos in groups.items()
+                     if len(pos) > 0)
+    palette = qualitative.Plotly
+    return {name: palette[i % len(palette)]
+            for i, (_, name) in enumerate(present)}
+
+
+def _partition_histogram(groups, values, label, axis):
+    """Histogram of values stacked by partition, as px.histogram draws it."""
+
+    # Hover fields in px order, x axis first
+    count_axis = 'x' if axis == 'y' else 'y'
+    fields = [label + '=%{' + axis + '}', 'count=%{' + count_axis + '}']
+    if axis == 'y':
+        fields.reverse()
+
+    colors = _partition_colors(groups)
+    fig = go.Figure()
+    for name in colors:
+        pos = groups[name]
+        fig.add_trace(go.Histogram(
+            {axis: values[pos]}, name=str(name), legendgroup=str(name),
+            marker_color=colors[name], bingroup=1,
+            orientation='h' if axis == 'y' else 'v',
+            hovertemplate='<br>'.join(['partition=' + str(name)] + fields) +
+                          '<extra></extra>'))
+
+    fig.update_layout({axis + 'axis_title_text': label,
+                       count_axis + 'axis_title_text': 'count'},
+                      barmode='relative', legend_title_text='partition')
+    return fig
+
+
+def _partition_scatter(scatter, groups, x, y, x_label, jobid=[]):
+    """Scatter of y against x with one trace per partition."""
+
+    hover = x_label + '=%{x}<br>priority=%{y}'
+    if len(jobid) > 0:
+        hover += '<br>jobid=%{customdata}'
+
+    colors = _partition_colors(groups)
+    fig = go.Figure()
+    for name in colors:
+        pos = groups[name]
+        fig.add_trace(scatter(
+            x=x[pos], y=y[pos], mode='markers', opacity=.3, name=str(name),
+            legendgroup=str(name), marker_color=colors[name],
+            customdata=jobid[pos] if len(jobid) > 0 else None,
+            hovertemplate='partition=' + str(name) + '<br>' + hover +
+                          '<extra></extra>'))
+    fig.update_layout(legend_title_text='partition')
+    return fig
+
+
+def _scatter_layout(fig, x_title):
+    """Titles of the job scatter figures."""
+
+    fig.update_layout(
         title=go.layout.Title(
             text="Job scatter: ",
             xref="paper",
@@ -174,7 +297,7 @@ def job_scatter(account, target, d_from, d_to='', d_from_drop='', out_name='',
         ),
         xaxis=go.layout.XAxis(
             title=go.layout.xaxis.Title(
-                text="Memory per cpu",
+                text=x_title,
                 font=dict(
                     family="Courier New, monospace",
                     size=18,
@@ -193,6 +316,4 @@ def job_scatter(account, target, d_from, d_to='', d_from_drop='', out_name='',
             )
         )
     )
-    fig_scat.write_html(safe_folder + account + out_name + 'run_scatter.html')
-
-    return job_frame
+    return fig
@@ -1,8 +1,30 @@
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 
+from viewclust_vis.job_index import JobIndex, _nanoseconds
+from viewclust_vis.render_mode import WEBGL_THRESHOLD, scatter_type
+from viewclust_vis.write_fig import write_fig
+
+_NAT = np.iinfo('int64').min
+
+# Job count past which 'auto' aggregation draws density layers
+DENSITY_THRESHOLD = 20000
+
+# Default (time, resource) resolution of the density layers
+DENSITY_BINS = (600, 300)
+
+# Density layer name, rgb and opacity, the job rectangles' fill colours
+_LAYERS = [('queued', '200,200,200', .5), ('running', '140,180,140', .9),
+           ('requested', '120,120,180', .2)]
+
 
 def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
-              query_bounds=True):
+              query_bounds=True, render_mode='auto',
+              webgl_threshold=WEBGL_THRESHOLD, plotlyjs_root='',
+              binary=False, d_from='', d_to='', job_index=None,
+              aggregate='auto', density_threshold=DENSITY_THRESHOLD,
+              density_bins=DENSITY_BINS):
     """Create job stack figure based on a given DataFrame and
     specified use unit.
 
@@ -25,8 +47,67 @@ def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
     query_bounds: bool, optional
         Draws red lines on the figure to represent where query is valid.
         Defaults to true.
+    render_mode: str, optional
+        One of: {'auto', 'svg', 'webgl'}. 'auto' draws WebGL traces when
+        the rectangle traces have more than webgl_threshold vertices.
+        Defaults to 'auto'.
+    webgl_threshold: int, optional
+        Point count above which 'auto' switches to WebGL.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs.
+        If given, fig_out references it by relative path instead of
+        embedding it. Defaults to empty, embedding plotly.js.
+    binary: boolean, optional
+        If True, fig_out is written with base64 typed arrays and epoch
+        offset dates, which is smaller and faster to load, see encode_fig.
+        Defaults to False.
+    d_from: date str, optional
+        If given, or if d_to is, only the jobs whose submit to end span
+        overlaps this window are stacked. Defaults to empty.
+    d_to: date str, optional
+        End of the window, see d_from. Defaults to empty.
+    job_index: JobIndex, optional
+        JobIndex of jobs with the 'job' span, built once and reused to
+        find the jobs of many windows. Must be built on this jobs frame.
+        Defaults to building one here.
+    aggregate: str, optional
+        One of: {'auto', 'jobs', 'density'}. 'jobs' draws every job's
+        rectangles and markers. 'density' bins the queued, running and
+        requested rectangles into heatmap layers of density_bins cells,
+        each cell holding the fraction of it that is covered, so that the
+        figure size does not grow with the job count. 'auto' draws
+        'density' when more than density_threshold jobs are stacked.
+        Defaults to 'auto'.
+    density_threshold: int, optional
+        Job count above which 'auto' aggregates. Narrowing d_from and
+        d_to below it brings back the rectangles of every job.
+    density_bins: tuple of int, optional
+        Number of (time, resource) cells of the density layers.
+
+    Examples
+    -------
+    An overview of a large account, then the jobs of one of its days::
+
+        index = JobIndex(jobs)
+        job_stack(jobs, fig_out='stack.html', job_index=index)
+        job_stack(jobs, fig_out='stack_day.html', job_index=index,
+                  d_from='2020-01-10', d_to='2020-01-11')
     """
 
+    if aggregate not in ('auto', 'jobs', 'density'):
+        raise AttributeError('invalid aggregate')
+    if job_index is not None:
+        if job_index.jobs is not jobs:
+            raise AttributeError('invalid job_index, built on another frame')
+        if job_index.span != 'job':
+            raise AttributeError('invalid job_index span')
+
+    if d_from != '' or d_to != '':
+        if job_index is None:
+            job_index = JobIndex(jobs)
+        # Columns are added below, the window gets its own copy
+        jobs = job_index.window(d_from, d_to).copy()
+
     if use_unit == 'cpu':
         jobs['use_unit'] = jobs['reqcpus']
     elif use_unit == 'cpu-eqv':
@@ -40,45 +121,58 @@ def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
         print('gpu equiv to be supported soon')
         return
 
-    cumu_sum_units = jobs['use_unit'].cumsum()
-
-    res_count = 0
-    x_queue = []
-    x_run = []
-    x_req = []
+    # Downcast integer units would overflow when summed
+    cumu_sum_units = jobs['use_unit'].astype('float64').cumsum()
 
-    # TODO: Fix this below section into frame calls
-    y_cumu = []
-    for _, row in jobs.iterrows():
-        c_queue = [row['submit'], row['start'], row['start'],
-                   row['submit'], row['submit'], None]
-        x_queue = x_queue + c_queue
-
-        c_run = [row['start'], row['end'], row['end'], row['start'],
-                 row['start'], None]
-        x_run = x_run + c_run
+    fig = go.Figure()
+    if aggregate == 'density' or (aggregate == 'auto' and
+                                  len(jobs) > density_threshold):
+        x_mid, y_mid, layers = stack_density(jobs, density_bins,
+                                             d_from, d_to)
+        for name, rgb, alpha in _LAYERS:
+            fig.add_trace(go.Heatmap(
+                x=x_mid,
+                y=y_mid,
+                z=layers[name],
+                zmin=0,
+                zmax=1,
+                colorscale=[[0, 'rgba(' + rgb + ',0)'],
+                            [1, 'rgba(' + rgb + ',' + str(alpha) + ')']],
+                showscale=False,
+                showlegend=True,
+                name=name,
+                hovertemplate='%{x}<br>%{y}<br>' + name +
+                              ' cover: %{z:.2f}<extra></extra>'
+            ))
+        fig.update_layout(
+            title_text="Job stack: "+plot_title,
+            yaxis_title=('Cumulative resources requested (' +
+                         str(use_unit) + ')'),
+            xaxis_title='Date Time',
+            showlegend=True)
+        if fig_out != '':
+            write_fig(fig, fig_out, plotlyjs_root, binary)
+        return fig
 
-        c_req = [row['end'], row['start']+row['timelimit'],
-                 row['start']+row['timelimit'], row['end'], row['end'], None]
-        x_req = x_req + c_req
+    x_queue, x_run, x_req, y_cumu = stack_geometry(jobs)
+    scatter = scatter_type(len(y_cumu), render_mode, webgl_threshold)
 
-        c_cumres = [res_count, res_count, res_count+row['use_unit'],
-                    res_count+row['use_unit'], res_count, None]
-        y_cumu = y_cumu + c_cumres
-        res_count = res_count+row['use_unit']
+    # Scattergl cannot hover on fills
+    queue_hover = {}
+    if scatter is go.Scatter:
+        queue_hover['hoveron'] = 'points+fills'
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=x_queue,
         y=y_cumu,
         fill='toself',
         fillcolor='rgba(200,200,200,.5)',
         line_color='rgba(200,200,200,.3)',
         name='queued',
-        hoveron='points+fills',
-        text=jobs['jobid']
+        text=jobs['jobid'],
+        **queue_hover
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=x_run,
         y=y_cumu,
         fill='toself',
@@ -86,7 +180,7 @@ def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
         line_color='rgba(140,180,140,.1)',
         name='running'
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=x_req,
         y=y_cumu,
         fill='toself',
@@ -94,7 +188,7 @@ def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
         line_color='rgba(120,120,180,.1)',
         name='requested'
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=jobs['submit'],
         y=cumu_sum_units-jobs['use_unit'],
         mode='markers',
@@ -102,7 +196,7 @@ def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
         marker_color='rgba(100,100,100,.3)',
         hovertext=jobs['jobid']
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=jobs['start'],
         y=cumu_sum_units-jobs['use_unit'],
         mode='markers',
@@ -110,7 +204,7 @@ def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
         marker_color='rgba(20,120,20,.3)',
         hovertext=jobs['jobid']
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=jobs['end'],
         y=cumu_sum_units-jobs['use_unit'],
         mode='markers',
@@ -118,7 +212,7 @@ def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
         marker_color='rgba(120,20,20,.3)',
         hovertext=jobs['jobid']
     ))
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=jobs['start']+jobs['timelimit'],
         y=cumu_sum_units-jobs['use_unit'],
         mode='markers',
@@ -137,6 +231,166 @@ def job_stack(jobs, use_unit='cpu', fig_out='', plot_title='',
         showlegend=True)
 
     if fig_out != '':
-        fig.write_html(fig_out)
+        write_fig(fig, fig_out, plotlyjs_root, binary)
 
     return fig
+
+
+def stack_geometry(jobs):
+    """Builds the rectangle vertices of every job in a job stack at once.
+
+    Each job contributes five vertices followed by a separator so that
+    plotly draws one closed shape per job. The queued, running and
+    requested rectangles share the same y coordinates.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job DataFrame with submit, start, end, timelimit and use_unit columns.
+
+    Returns
+    -------
+    x_queue, x_run, x_req: ndarray of datetime64
+        Vertex times of the queued, running and requested rectangles.
+        Separators are NaT.
+    y_cumu: ndarray of float
+        Vertex heights shared by all three shapes. Separators are NaN.
+    """
+
+    submit = jobs['submit'].to_numpy(dtype='datetime64[ns]')
+    start = jobs['start'].to_numpy(dtype='datetime64[ns]')
+    end = jobs['end'].to_numpy(dtype='datetime64[ns]')
+    req_end = (jobs['start'] + jobs['timelimit']).to_numpy(
+        dtype='datetime64[ns]')
+
+    use = jobs['use_unit'].to_numpy(dtype='float64')
+    top = np.cumsum(use)
+    bottom = top - use
+
+    def _ring(t_a, t_b):
+        # Vertex order per job: a, b, b, a, a, separator
+        ring = np.empty((len(jobs), 6), dtype='datetime64[ns]')
+        ring[:, 0] = t_a
+        ring[:, 1] = t_b
+        ring[:, 2] = t_b
+        ring[:, 3] = t_a
+        ring[:, 4] = t_a
+        ring[:, 5] = np.datetime64('NaT')
+        return ring.ravel()
+
+    y_cumu = np.column_stack([bottom, bottom, top, top, bottom,
+                              np.full(len(jobs), np.nan)]).ravel()
+
+    return (_ring(submit, start), _ring(start, end), _ring(end, req_end),
+            y_cumu)
+
+
+def stack_density(jobs, bins=DENSITY_BINS, d_from='', d_to=''):
+    """Bins the rectangles of a job stack into a fixed size grid.
+
+    Each cell holds the fraction of its area covered by the queued,
+    running or requested rectangles of stack_geometry, computed exactly
+    in one pass over the jobs: every rectangle adds signed weights at its
+    four corners and two cumulative sums spread them over the cells.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job DataFrame with submit, start, end, timelimit and use_unit columns.
+    bins: tuple of int, optional
+        Number of (time, resource) cells. Defaults to DENSITY_BINS.
+    d_from: date str, optional
+        Start of the time axis. Defaults to the first submit time.
+    d_to: date str, optional
+        End of the time axis. Defaults to the last end or requested end.
+
+    Returns
+    -------
+    x_mid: ndarray of datetime64
+        Time of each column's centre.
+    y_mid: ndarray of float
+        Cumulative resources at each row's centre.
+    layers: dict of str to ndarray
+        Covered fraction of each cell, rows by columns, for 'queued',
+        'running' and 'requested'. Uncovered cells are NaN, which plotly
+        leaves transparent.
+    """
+
+    n_x, n_y = bins
+    submit = _nanoseconds(jobs['submit'])
+    start = _nanoseconds(jobs['start'])
+    end = _nanoseconds(jobs['end'])
+    req_end = _nanoseconds(jobs['start'] + jobs['timelimit'])
+
+    use = jobs['use_unit'].to_numpy(dtype='float64')
+    top = np.cumsum(use)
+    bottom = top - use
+
+    spans = {'queued': (submit, start), 'running': (start, end),
+             'requested': (end, req_end)}
+    if d_from != '':
+        t_from = pd.Timestamp(d_from).value
+    else:
+        t_from = _known_min(submit)
+    if d_to != '':
+        t_to = pd.Timestamp(d_to).value
+    else:
+        t_to = max(_known_max(end), _known_max(req_end))
+    t_to = max(t_to, t_from + 1)
+    y_to = top[-1] if len(top) > 0 and top[-1] > 0 else 1.0
+
+    # Rectangle bounds in cell units, clipped to the grid
+    y_lo = np.clip(bottom / y_to * n_y, 0, n_y)
+    y_hi = np.clip(top / y_to * n_y, 0, n_y)
+    layers = {}
+    for name, (t_a, t_b) in spans.items():
+        ok = (t_a != _NAT) & (t_b != _NAT)
+        # Overrun jobs end after their request, drawn from req_end to end
+        t_lo = np.minimum(t_a[ok], t_b[ok])
+        t_hi = np.maximum(t_a[ok], t_b[ok])
+        x_lo = np.clip((t_lo - t_from) / (t_to - t_from) * n_x, 0, n_x)
+        x_hi = np.clip((t_hi - t_from) / (t_to - t_from) * n_x, 0, n_x)
+
+        corners = np.zeros((n_y + 1) * (n_x + 1))
+        for x, y, sign in ((x_lo, y_lo[ok], 1), (x_hi, y_lo[ok], -1),
+                           (x_lo, y_hi[ok], -1), (x_hi, y_hi[ok], 1)):
+            _add_corner(corners, x, y, sign, n_x, n_y)
+        cover = corners.reshape(n_y + 1, n_x + 1)
+        cover = cover.cumsum(axis=0).cumsum(axis=1)[:n_y, :n_x]
+        # Cancelled corners leave rounding noise in empty cells
+        cover[cover < 1e-9] = np.nan
+        layers[name] = cover.astype('float32')
+
+    x_step = (t_to - t_from) / n_x
+    x_mid = (t_from + (np.arange(n_x) + .5) * x_step).astype(
+        'int64').astype('datetime64[ns]')
+    y_mid = (np.arange(n_y) + .5) * y_to / n_y
+    return x_mid, y_mid, layers
+
+
+def _add_corner(corners, x, y, sign, n_x, n_y):
+    """Adds the quarter plane above and right of each x, y to corners.
+
+    The covered part of the cell holding a bound is split between that
+    cell and the next one, so that the cumulative sums give each cell its
+    covered fraction.
+    """
+
+    i = np.minimum(np.floor(x), n_x - 1).astype('int64')
+    j = np.minimum(np.floor(y), n_y - 1).astype('int64')
+    f_x = x - i
+    f_y = y - j
+    for d_i, w_x in ((0, 1 - f_x), (1, f_x)):
+        for d_j, w_y in ((0, 1 - f_y), (1, f_y)):
+            corners += sign * np.bincount((j + d_j) * (n_x + 1) + i + d_i,
+                                          w_x * w_y, len(corners))
+
+
+def _known_min(times):
+    known = times[times != _NAT]
+    return known.min() if len(known) > 0 else 0
+
+
+def _known_max(times):
+    known = times[times != _NAT]
+    return known.max() if len(known) > 0 else 0
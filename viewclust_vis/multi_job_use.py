@@ -0,0 +1,339 @@
+import numpy as np
+import pandas as pd
+
+from viewclust.target_series import target_series
+
+from viewclust_vis.stage_log import log_stage
+
+_NS = 10**9
+_HOUR = 3600
+
+# Usage series built by multi_job_use: name -> (on event, off event, jobs)
+USAGE_SERIES = {
+    'queued': ('submit', 'start', 'all'),
+    'running': ('start', 'end', 'all'),
+    'run_running': ('start', 'req_end', 'is_running'),
+    'q_queued': ('submit', 'horizon_req', 'is_pending'),
+    'submit_run': ('submit', 'sub_run', 'all'),
+    'submit_req': ('submit', 'sub_req', 'all'),
+}
+
+
+def multi_job_use(jobs, d_from, target, d_to='', use_unit='cpu',
+                  users=True, stage_log=None, sparse_users=False):
+    """Computes every usage series used by show_job_use in one pass.
+
+    Equivalent to the following viewclust calls, but the job event times
+    and usage weights are converted once and shared by every series, and
+    the hourly means are integrated from the sorted event steps instead of
+    binning every second of the query:
+
+        vc.job_use(jobs, d_from, target, d_to=d_to, use_unit=use_unit)
+        vc.job_use(..., job_state='running')
+        vc.job_use(..., job_state='queued')
+        vc.job_use(..., time_ref='sub')
+        vc.job_use(..., time_ref='sub+req')
+        vc.get_users_run(jobs, d_from, target, d_to=d_to, use_unit=use_unit)
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job DataFrame typically generated by slurm/sacct_jobs.
+        Not modified.
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    target: int-like
+        Typically a cpu allocation or core eqv value for a particular acount.
+        A series is used as is, as in job_use.
+    d_to: date str, optional
+        End of the query period, e.g. '2020-01-01T00:00:00'.
+        Defaults to the latest submit, start, end or eligible time.
+    use_unit: str, optional
+        Usage unit to examine.
+        One of: {'cpu', 'cpu-eqv', 'gpu', 'gpu-eqv', 'gpu-eqv-cdr',
+        'billing'}. Defaults to 'cpu'.
+    users: bool, optional
+        If True also computes the per-user running frame. Defaults to True.
+    stage_log: StageLog, optional
+        If given, records the 'job_events', 'series_use', 'target_dist'
+        and 'users_use' stages.
+    sparse_users: bool, optional
+        If True, 'user_run' is a UserMatrix holding only the hours each
+        user is active, built for all users at once. d_from must then be
+        on the hour. Defaults to False, a dense frame.
+
+    Returns
+    -------
+    usage: dict
+        'clust', 'queued', 'running' and 'dist' as returned by job_use.
+        'run_running' and 'q_queued': running series of the 'running' and
+        'queued' job states.
+        'submit_run' and 'submit_req': running series of the 'sub' and
+        'sub+req' time references.
+        'user_run': frame of running resources per user, as returned by
+        get_users_run, or its UserMatrix. Users are matched exactly rather
+        than by regex prefix.
+    """
+
+    # d_to boilerplate, as in job_use
+    if d_to == '':
+        t_max = jobs[['submit', 'start', 'end', 'eligible']].max(axis=1)
+        d_to = str(t_max.max())
+
+    with log_stage(stage_log, 'job_events', rows=len(jobs)):
+        events = job_events(jobs, d_to, use_unit)
+    baseline = target_series([(d_from, d_to, 0)])
+
+    usage = {}
+    with log_stage(stage_log, 'series_use', rows=len(jobs)):
+        for name in USAGE_SERIES:
+            usage[name] = series_use(events, name).add(baseline,
+                                                       fill_value=0)
+
+    with log_stage(stage_log, 'target_dist'):
+        usage['clust'], usage['dist'] = target_dist(target, usage['running'],
+                                                    d_from, d_to)
+
+    if users:
+        with log_stage(stage_log, 'users_use', rows=len(jobs)) as record:
+            user_names = jobs['user'].to_numpy()
+            if sparse_users:
+                # user_matrix builds on job_events of this module
+                from viewclust_vis.user_matrix import events_matrix
+                usage['user_run'] = events_matrix(events, user_names, d_from,
+                                                  d_to)
+            else:
+                usage['user_run'] = users_use(events, user_names, d_from,
+                                              d_to)
+            record['users'] = usage['user_run'].shape[1]
+
+    return usage
+
+
+def job_events(jobs, d_to, use_unit='cpu'):
+    """Event times of every job as epoch seconds, shared by all series.
+
+    Missing times are the int64 minimum. Derived times follow job_use:
+    req_end for the 'running' job state, horizon_req for 'queued', and
+    sub_run and sub_req for the 'sub' and 'sub+req' time references.
+
+    Returns
+    -------
+    events: dict of ndarray
+        Keys are the names used in USAGE_SERIES plus 'use', the usage
+        weight of each job in use_unit.
+    """
+
+    nat = np.iinfo('int64').min
+    use = _use_unit(jobs, use_unit).to_numpy(dtype='float64')
+
+    submit = _seconds(jobs['submit'])
+    start = _seconds(jobs['start'])
+    end = _seconds(jobs['end'])
+    timelimit = jobs['timelimit'].to_numpy(dtype='timedelta64[ns]')
+    timelimit_ok = ~np.isnat(timelimit)
+    timelimit = np.where(timelimit_ok, timelimit.astype('int64') // _NS, 0)
+    horizon = pd.Timestamp(d_to).value // _NS
+
+    return {
+        'use': np.nan_to_num(use),
+        'submit': submit,
+        'start': start,
+        'end': end,
+        'req_end': np.where((start != nat) & timelimit_ok,
+                            start + timelimit, nat),
+        'horizon_req': np.where(timelimit_ok, horizon + timelimit, nat),
+        'sub_run': np.where((submit != nat) & (start != nat) & (end != nat),
+                            submit + (end - start), nat),
+        'sub_req': np.where((submit != nat) & timelimit_ok,
+                            submit + timelimit, nat),
+        'all': np.ones(len(jobs), dtype=bool),
+        'is_running': (jobs['state'] == 'RUNNING').to_numpy(),
+        'is_pending': (jobs['state'] == 'PENDING').to_numpy(),
+    }
+
+
+def series_use(events, name, mask=None, since=None):
+    """Hourly usage of one USAGE_SERIES entry, before the baseline is added.
+
+    Parameters
+    -------
+    events: dict
+        Output of job_events.
+    name: str
+        Key of USAGE_SERIES.
+    mask: ndarray of bool, optional
+        Further restricts the jobs, e.g. to one user.
+    since: int, optional
+        Epoch second. If given, only hours from this one on are returned.
+    """
+
+    on, off, jobs = USAGE_SERIES[name]
+    keep = events[jobs]
+    if mask is not None:
+        keep = keep & mask
+    return _hourly_mean(events[on][keep], events[off][keep],
+                        events['use'][keep], since=since)
+
+
+def users_use(events, user_names, d_from, d_to):
+    """Running usage per user, as returned by get_users_run.
+
+    Parameters
+    -------
+    events: dict
+        Output of job_events.
+    user_names: ndarray
+        User of each job, aligned with events.
+    """
+
+    baseline = target_series([(d_from, d_to, 0)])
+    user_series = []
+    for user in pd.unique(user_names):
+        user_running = series_use(events, 'running',
+                                  mask=user_names == user)
+        user_running = user_running.add(baseline, fill_value=0)
+        user_series.append(pd.Series(user_running.loc[d_from:d_to],
+                                     name=user))
+    return pd.concat(user_series, axis=1)
+
+
+def target_dist(target, running, d_from, d_to):
+    """Target series and cumulative distance from it, as in job_use."""
+
+    if isinstance(target, int):
+        clust = target_series([(d_from, d_to, target)])
+    else:
+        clust = target
+
+    sum_target = np.cumsum(clust).loc[d_from:d_to]
+    sum_running = np.cumsum(running)
+    sum_running.index.name = 'datetime'
+    sum_running = sum_running.loc[d_from:d_to]
+
+    return clust, sum_running - sum_target
+
+
+def _use_unit(jobs, use_unit):
+    """Per job usage weight, following the billing rules of job_use."""
+
+    if use_unit == 'cpu':
+        return jobs['reqcpus']
+    elif use_unit == 'cpu-eqv':  # TRESBillingWeights=CPU=1.0,Mem=0.25G
+        mem_scale = (jobs['mem'] / 1024) * .25
+        return pd.concat([mem_scale, jobs['reqcpus']], axis=1).max(axis=1)
+    elif 'gpu' in use_unit:
+        ngpus = jobs['reqtres'].str.extract(
+            r'gpu=(\d+)')[0].fillna(0).astype('int64')
+        if use_unit == 'gpu':
+            return ngpus
+        elif use_unit == 'gpu-eqv':
+            cpu_scale = jobs['reqcpus'] * 0.0625
+            mem_scale = (jobs['mem'] / 1024) * 0.015625
+        elif use_unit == 'gpu-eqv-cdr':
+            cpu_scale = jobs['reqcpus'] * 0.1667
+            mem_scale = (jobs['mem'] / 1024) * 0.03125
+        else:
+            raise AttributeError('invalid GPU use_unit')
+        return pd.concat([cpu_scale, mem_scale, ngpus], axis=1).max(axis=1)
+    elif use_unit == 'billing':
+        return jobs['reqtres'].str.extract(
+            r'billing=(\d+)')[0].fillna(0).astype('int64')
+    else:
+        raise AttributeError('invalid use_unit')
+
+
+def _seconds(times):
+    """Epoch seconds of a datetime column, NaT as the int64 minimum."""
+
+    values = times.to_numpy(dtype='datetime64[ns]')
+    seconds = values.astype('int64') // _NS
+    seconds[np.isnat(values)] = np.iinfo('int64').min
+    return seconds
+
+
+def _hourly_mean(on, off, weight, since=None):
+    """Hourly mean of the resources held between on and off events.
+
+    Reproduces job_use: event weights are summed per second over the
+    span of each event type, cumulated, and averaged per hour over the
+    seconds that span covers. Empty hours are forward filled.
+    If since is given, hours before it are not evaluated.
+    """
+
+    nat = np.iinfo('int64').min
+    on_ok = on != nat
+    off_ok = off != nat
+    on_t, on_w = on[on_ok], weight[on_ok]
+    off_t, off_w = off[off_ok], weight[off_ok]
+
+    # Seconds covered by the per-second groupings in job_use
+    spans = [(t.min(), t.max()) for t in (on_t, off_t) if len(t) > 0]
+    if not spans:
+        return pd.Series(dtype='float64',
+                         index=pd.DatetimeIndex([], dtype='datetime64[ns]'))
+    spans.sort()
+    if len(spans) == 2 and spans[1][0] <= spans[0][1] + 1:
+        spans = [(spans[0][0], max(spans[0][1], spans[1][1]))]
+
+    # Weight and moment sums of the events of each hour, by event type
+    first_hour = spans[0][0] // _HOUR * _HOUR
+    n_hours = (spans[-1][1] - first_hour) // _HOUR + 1
+    sums = []
+    for times, weights in ((on_t, on_w), (off_t, off_w)):
+        hours = (times - first_hour) // _HOUR
+        into = times - (first_hour + hours * _HOUR)
+        sums.append((np.bincount(hours, weights, n_hours),
+                     np.bincount(hours, weights * into, n_hours),
+                     times.max() if len(times) > 0 else 0))
+    level = np.r_[0.0, np.cumsum(sums[0][0] - sums[1][0])[:-1]]
+    hour_lo = first_hour + np.arange(n_hours, dtype='int64') * _HOUR
+
+    if since is not None:
+        skip = min(max(0, (since // _HOUR * _HOUR - first_hour) // _HOUR),
+                   n_hours)
+        hour_lo, level = hour_lo[skip:], level[skip:]
+        sums = [(w_sum[skip:], m_sum[skip:], last)
+                for w_sum, m_sum, last in sums]
+
+    mean = _hour_means(hour_lo, level, sums[0], sums[1],
+                       [(lo, hi + 1, True) for lo, hi in spans])
+
+    index = pd.to_datetime(hour_lo, unit='s')
+    return pd.Series(mean, index=index).ffill()
+
+
+def _hour_means(hour_lo, level, on_sums, off_sums, spans):
+    """Mean resources held over the seconds of each hour that spans cover.
+
+    The hourly integral shared by _hourly_mean, stream_job_use and
+    user_matrix. Each hour starts at hour_lo holding level, on_sums and
+    off_sums are (weight, moment, last) of its on and off events: the
+    sums of their weights and of weights times seconds since hour_lo,
+    and the last event second of that type. spans are (lo, end,
+    present) of the covered seconds, end excluded, scalars or one per
+    hour. Hours covering no second are NaN.
+    """
+
+    def _area(s):
+        # Integral from the hour start to s. Span bounds lie before or
+        # after every event of each type, except those at s, which add
+        # nothing, so the events up to s are none or all of the hour's
+        into = s - hour_lo
+        full = into == _HOUR
+        area = level * into
+        for (w_sum, m_sum, last), sign in ((on_sums, 1), (off_sums, -1)):
+            done = full | (last <= s)
+            area = area + sign * np.where(done, w_sum * into - m_sum, 0.0)
+        return area
+
+    total = np.zeros(len(hour_lo))
+    count = np.zeros(len(hour_lo))
+    for lo, end, present in spans:
+        a = np.clip(hour_lo, lo, end)
+        b = np.clip(hour_lo + _HOUR, lo, end)
+        total += np.where(present, _area(b) - _area(a), 0.0)
+        count += np.where(present, b - a, 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
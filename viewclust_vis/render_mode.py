@@ -0,0 +1,86 @@
+import plotly.graph_objects as go
+
+# Trace length past which 'auto' switches from SVG to WebGL traces.
+WEBGL_THRESHOLD = 20000
+
+
+def resolve_render_mode(n_points, render_mode='auto',
+                        webgl_threshold=WEBGL_THRESHOLD):
+    """Decides whether a figure should be drawn with SVG or WebGL traces.
+
+    Parameters
+    -------
+    n_points: int
+        Number of points in the largest trace of the figure.
+    render_mode: str, optional
+        One of: {'auto', 'svg', 'webgl'}. 'auto' picks 'webgl' when
+        n_points is above webgl_threshold. Defaults to 'auto'.
+    webgl_threshold: int, optional
+        Point count above which 'auto' switches to WebGL.
+
+    Returns
+    -------
+    mode: str
+        Either 'svg' or 'webgl'.
+    """
+
+    if render_mode == 'auto':
+        return 'webgl' if n_points > webgl_threshold else 'svg'
+    elif render_mode in ('svg', 'webgl'):
+        return render_mode
+    else:
+        raise AttributeError('invalid render_mode')
+
+
+def scatter_type(n_points, render_mode='auto',
+                 webgl_threshold=WEBGL_THRESHOLD):
+    """Returns go.Scatter or go.Scattergl according to resolve_render_mode.
+
+    See Also
+    -------
+    resolve_render_mode: Parameter descriptions.
+    """
+
+    if resolve_render_mode(n_points, render_mode,
+                           webgl_threshold) == 'webgl':
+        return go.Scattergl
+    return go.Scatter
+
+
+def stacked_traces(frame, scatter, **trace_args):
+    """Builds one stacked area trace per column of frame.
+
+    Scattergl does not support stackgroup, so in that case the stack is
+    accumulated here and each area is filled down to the previous one.
+    Hovering still reports the value of the individual column.
+
+    Parameters
+    -------
+    frame: DataFrame
+        One column per stacked area, e.g. the output of get_users_run.
+    scatter: go.Scatter or go.Scattergl
+        Trace type as returned by scatter_type.
+    trace_args: optional
+        Passed through to every trace.
+
+    Returns
+    -------
+    traces: list
+        Traces in column order.
+    """
+
+    traces = []
+    if scatter is go.Scatter:
+        for col in frame:
+            traces.append(go.Scatter(x=frame.index, y=frame[col], name=col,
+                                     stackgroup='use', **trace_args))
+        return traces
+
+    trace_args.pop('hoverinfo', None)
+    stack_tops = frame.fillna(0).cumsum(axis=1)
+    for i, col in enumerate(frame):
+        traces.append(scatter(x=frame.index, y=stack_tops[col], name=col,
+                              fill='tozeroy' if i == 0 else 'tonexty',
+                              text=frame[col], hoverinfo='x+text',
+                              **trace_args))
+    return traces
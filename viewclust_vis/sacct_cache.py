@@ -0,0 +1,139 @@
+from datetime import datetime
+import os
+import uuid
+
+import pandas as pd
+from viewclust import slurm
+
+
+def cached_sacct_jobs(account, d_from, d_to='', cache_dir='',
+                      max_bytes=4 * 1024**3, settle='7D'):
+    """slurm.sacct_jobs backed by a per account, per month disk cache.
+
+    The query window is split into calendar months. A month is final once
+    it ended more than settle ago, at which point its jobs can no longer
+    change state; final months are read from cache_dir, or queried once
+    and stored. Everything after the last final month is always queried
+    from slurm in a single call.
+
+    Partitions are written as Parquet when pyarrow or fastparquet is
+    installed and as pickles otherwise. When the cache grows past
+    max_bytes, the least recently used partitions are removed.
+
+    Parameters
+    -------
+    account: string
+        Name of account for which to query job records.
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    d_to: date str, optional
+        End of the query period, e.g. '2020-01-01T00:00:00'.
+        Defaults to now if empty.
+    cache_dir: str
+        Folder holding the cache. One sub folder is created per account.
+    max_bytes: int, optional
+        Size cap of the whole cache folder. Defaults to 4 GiB.
+    settle: pandas timedelta str, optional
+        How long after its end a month is still re-queried, typically the
+        longest allowed job run time. Defaults to '7D'.
+
+    Returns
+    -------
+    DataFrame
+        Jobs active in the query period, one row per jobid.
+    """
+
+    if d_to == '':
+        d_to = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+    t_from = pd.Timestamp(d_from)
+    t_to = pd.Timestamp(d_to)
+    final_before = pd.Timestamp.now() - pd.Timedelta(settle)
+
+    account_dir = os.path.join(cache_dir, account)
+    os.makedirs(account_dir, exist_ok=True)
+    suffix = _cache_suffix()
+
+    frames = []
+    month = t_from.to_period('M')
+    open_from = t_from
+    while month.start_time <= t_to:
+        m_from = month.start_time
+        m_to = (month + 1).start_time
+        if m_to > final_before:
+            break
+        part = os.path.join(account_dir, str(month) + suffix)
+        if os.path.exists(part):
+            frames.append(_read_part(part))
+            os.utime(part)
+        else:
+            part_frame = slurm.sacct_jobs(account, m_from.isoformat(),
+                                          d_to=m_to.isoformat())
+            _write_part(part_frame, part)
+            frames.append(part_frame)
+        open_from = m_to
+        month += 1
+
+    if open_from <= t_to:
+        frames.append(slurm.sacct_jobs(account, open_from.isoformat(),
+                                       d_to=d_to))
+
+    _evict(cache_dir, max_bytes)
+
+    frames = [frame for frame in frames if len(frame) > 0]
+    if len(frames) == 0:
+        return pd.DataFrame()
+    job_frame = pd.concat(frames, ignore_index=True)
+
+    # Jobs spanning a month boundary show up in both months,
+    # the later partition holds the more recent state
+    job_frame = job_frame.drop_duplicates(subset='jobid', keep='last')
+    active = ((job_frame['submit'] <= t_to) &
+              (job_frame['end'].isnull() | (job_frame['end'] >= t_from)))
+    return job_frame[active].reset_index(drop=True)
+
+
+def _cache_suffix():
+    """Parquet if an engine is installed, pickle otherwise."""
+
+    for engine in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(engine)
+            return '.parquet'
+        except ImportError:
+            pass
+    return '.pkl'
+
+
+def _read_part(part):
+    if part.endswith('.parquet'):
+        return pd.read_parquet(part)
+    return pd.read_pickle(part)
+
+
+def _write_part(frame, part):
+    # Written aside and moved so readers never see a partial partition
+    tmp_part = part + '.' + uuid.uuid4().hex + '.tmp'
+    if part.endswith('.parquet'):
+        frame.to_parquet(tmp_part)
+    else:
+        frame.to_pickle(tmp_part, protocol=4)
+    os.replace(tmp_part, part)
+
+
+def _evict(cache_dir, max_bytes):
+    """Removes least recently used partitions until under max_bytes."""
+
+    parts = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(('.parquet', '.pkl')):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                parts.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in parts)
+    for _, size, path in sorted(parts):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
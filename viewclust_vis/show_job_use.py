@@ -2,25 +2,40 @@ import pandas as pd
 import datetime as dt
 from datetime import datetime
 from pathlib import Path
-import plotly.express as px
 import plotly.graph_objects as go
 
 import os
 
-import viewclust as vc
 from viewclust import slurm
-from viewclust.target_series import target_series
 
 from viewclust_vis.job_stack import job_stack
+from viewclust_vis.render_mode import WEBGL_THRESHOLD, resolve_render_mode
 from viewclust_vis.insta_plot import insta_plot
+from viewclust_vis.compact_jobs import USAGE_COLUMNS, compact_jobs
+from viewclust_vis.dashboard import dashboard as write_dashboard
 from viewclust_vis.cumu_plot import cumu_plot
+from viewclust_vis.incremental_use import (incremental_job_use,
+                                           load_use_state, save_use_state,
+                                           state_matches)
+from viewclust_vis.multi_job_use import multi_job_use
+from viewclust_vis.sacct_cache import cached_sacct_jobs
+from viewclust_vis.stage_log import log_stage
+from viewclust_vis.stream_job_use import read_job_chunks, stream_job_use
+from viewclust_vis.top_users import rank_users
+from viewclust_vis.write_fig import FigWriter
 
 
 def show_job_use(account, target, d_from, d_to='', d_from_drop='', out_path='',
                  use_unit='', plot_jobstack=True, plot_insta=True,
                  plot_cumu=True, plot_mem_delta=False, plot_start_wait=False,
                  plot_wait_viol=False, plot_start_runtime=False,
-                 plot_runtime_viol=False, override_frame=[]):
+                 plot_runtime_viol=False, override_frame=[],
+                 render_mode='auto', webgl_threshold=WEBGL_THRESHOLD,
+                 max_points=0, plotlyjs_root='', cache_dir='',
+                 state_path='', max_users=0, compact=True, workers=0,
+                 pool='thread', binary=False, dashboard=False,
+                 stage_log=None, job_chunks='', sparse_users=False,
+                 prune_columns=False):
 
     """Accepts an account name and query period to generate
     job usage summary figures.
@@ -74,12 +89,88 @@ def show_job_use(account, target, d_from, d_to='', d_from_drop='', out_path='',
     override_frame: Dataframe
         Defaults to empty.
         If non empty, overrides the sacct call with the supplied Dataframe
+    render_mode: str, optional
+        One of: {'auto', 'svg', 'webgl'}. Passed on to every figure
+        drawn with scatter traces.
+        'auto' draws WebGL traces above webgl_threshold points.
+        Defaults to 'auto'.
+    webgl_threshold: int, optional
+        Point count above which 'auto' switches to WebGL.
+    max_points: int, optional
+        Downsamples the insta_plot and cumu_plot series to at most this
+        many points. Defaults to 0, meaning no downsampling.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs.
+        If given, every written html file references it by relative path
+        instead of embedding it. Defaults to empty, embedding plotly.js.
+    cache_dir: str, optional
+        If given, job records are read through cached_sacct_jobs, which
+        keeps finished months on disk in this folder and only queries
+        slurm for the open tail of the window. Defaults to empty, no cache.
+    state_path: str, optional
+        File keeping the jobs and usage series between runs. If it holds a
+        run with the same account query, only jobs active since that run
+        are queried, through the cache if cache_dir is given (or taken
+        from override_frame), and the usage series are
+        refreshed with incremental_job_use. The file is then updated.
+        Defaults to empty, always recomputing everything.
+    max_users: int, optional
+        Stacks only the max_users heaviest users individually in insta_plot
+        and cumu_plot, and the rest as one 'other' trace. Users are ranked
+        once for both. Defaults to 0, stacking every user.
+    compact: boolean, optional
+        If True, the job records go through compact_jobs first: strings
+        become categoricals and integers are downcast. The returned
+        job_frame is this compact copy, with every column. Defaults to True.
+    workers: int, optional
+        Number of workers building and writing the figures, see FigWriter.
+        Figures of the job records are started before the usage series
+        are computed, the usage figures as soon as the series are ready.
+        1 writes every figure in turn. Defaults to 0, one per cpu up to
+        MAX_WORKERS of write_fig.
+    pool: str, optional
+        One of: {'thread', 'process'}. With 'process', figures are built
+        here and serialized and written by worker processes.
+        Defaults to 'thread'.
+    binary: boolean, optional
+        If True, every figure is written with base64 typed arrays and
+        epoch offset dates, see encode_fig. Defaults to False.
+    dashboard: boolean, optional
+        If True, every figure is also written to one page with a tab per
+        figure, <account>_dashboard.html. See dashboard.
+        Defaults to False.
+    stage_log: StageLog, optional
+        If given, records the wall time, CPU time, memory, rows and
+        output bytes of every stage: 'query', 'compact', 'usage' and its
+        sub-stages (see multi_job_use), then 'build', 'serialize' and
+        'write' per figure. Read its records, or export them with
+        to_jsonl, once the call returns. Defaults to None.
+    job_chunks: str or iterable of DataFrame, optional
+        Job records too large for memory: a csv or parquet file, or an
+        iterable of frames, see read_job_chunks. Replaces the query and is
+        folded into the usage series chunk by chunk with stream_job_use.
+        Only the usage figures (insta, cumu, mem_delta) are drawn, and the
+        per partition wait and run time statistics are returned in place
+        of job_frame. Defaults to empty, querying the job records.
+    sparse_users: boolean, optional
+        If True, the per-user usage is built as a sparse UserMatrix and
+        only the users drawn by insta_plot and cumu_plot are made dense,
+        see multi_job_use. Streamed and incremental runs keep the dense
+        frame. Defaults to False.
+    prune_columns: boolean, optional
+        If True along with compact, the columns that no requested figure
+        reads, e.g. priority, are dropped as well, which saves memory on
+        large accounts. The returned job_frame then lacks them, as does the
+        frame kept in state_path. Defaults to False, keeping every column.
 
     Output
     -------
     Requested job usage figures located in the out_path directory
     """
 
+    # plotly.express takes long to import, load it only once needed
+    import plotly.express as px
+
     # d_to boilerplate
     if d_to == '':
         d_to = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
@@ -111,205 +202,332 @@ def show_job_use(account, target, d_from, d_to='', d_from_drop='', out_path='',
                   'suffix..setting use_unit to "cpu".')
             use_unit = 'cpu'
 
-    # Perform ES job record query
-    if len(override_frame) == 0:
-        job_frame = slurm.sacct_jobs(account, d_from, d_to=d_to)
-    else:
-        job_frame = override_frame
+    # Job records streamed from a file never exist as one frame, so only
+    # the figures drawn from the usage series are possible
+    streamed = not (isinstance(job_chunks, str) and job_chunks == '')
+    if streamed:
+        plot_jobstack = plot_start_wait = plot_wait_viol = False
+        plot_start_runtime = plot_runtime_viol = False
 
-    # Holds figure handles such that they can be returned easily.
-    fig_dict = {}
+    # Previous run to refresh, if it covered the same query
+    state = None
+    if state_path != '' and not streamed:
+        state = load_use_state(state_path)
+        if not state_matches(state, d_from, target, use_unit):
+            state = None
 
-    print('Number of jobs in query: '+str(len(job_frame)))
-    job_frame['waittime'] = job_frame['start'] - job_frame['submit']
-    job_frame['runtime'] = job_frame['end'] - job_frame['start']
-
-    # Compute usage in terms of core equiv
-    clust_target, queued, running, delta = vc.job_use(job_frame, d_from,
-                                                      target, d_to=d_to,
-                                                      use_unit=use_unit)
-    _, _, run_running, _ = vc.job_use(job_frame, d_from, target, d_to=d_to,
-                                      use_unit=use_unit, job_state='running')
-    _, _, q_queued, _ = vc.job_use(job_frame, d_from, target, d_to=d_to,
-                                   use_unit=use_unit, job_state='queued')
-
-    user_running_cat = vc.get_users_run(job_frame, d_from, target, d_to=d_to,
-                                        use_unit=use_unit)
-
-    _, _, submit_run, _ = vc.job_use(job_frame, d_from, target, d_to=d_to,
-                                     use_unit=use_unit, time_ref='sub')
-
-    _, _, submit_req, _ = vc.job_use(job_frame, d_from, target, d_to=d_to,
-                                     use_unit=use_unit, time_ref='sub+req')
-
-    job_frame['waittime_hours'] = job_frame['waittime'].dt.total_seconds()/3600
-    job_frame['runtime_hours'] = job_frame['runtime'].dt.total_seconds()/3600
-
-    job_frame['timelimit_hours'] = job_frame[
-        'timelimit'].dt.total_seconds()/3600
-
-    if plot_jobstack:
-        stack_handle = job_stack(job_frame, use_unit='cpu-eqv',
-                  fig_out=safe_folder + account + '_jobstack.html')
-        fig_dict['fig_job_stack'] = stack_handle
-
-    # Add more to the suite as you like
-    if plot_insta:
-        insta_handle = insta_plot(clust_target, queued, running,
-                   fig_out=safe_folder+account+'_'+'insta_plot.html',
-                   user_run=user_running_cat,
-                   submit_run=submit_run,
-                   submit_req=submit_req,
-                   running=run_running,
-                   queued=q_queued,
-                   query_bounds=True)
-        fig_dict['fig_insta_plot'] = insta_handle
-
-    if plot_cumu:
-        cumu_handle = cumu_plot(clust_target, queued, running,
-                  fig_out=safe_folder+account+'_'+'cumu_plot.html',
-                  user_run=user_running_cat,
-                  submit_run=submit_run,
-                  query_bounds=False)
-        fig_dict['fig_cumu_plot'] = cumu_handle
-
-    if plot_mem_delta:
-        mem_handle = slurm.mem_info(d_from, account,
-                       fig_out=safe_folder + account + '_mem_delta.html')
-        fig_dict['fig_mem_delta'] = mem_handle
-
-    if plot_start_wait:
-        fig_scat = px.scatter(job_frame,
-                              x='start',
-                              y='waittime_hours',
-                              color="partition",
-                              opacity=.3)
-        fig_scat.update_layout(
-            title=go.layout.Title(
-                text="Job scatter: "
-            ),
-            xaxis=go.layout.XAxis(
-                title=go.layout.xaxis.Title(
-                    text="Start date Time",
-                    font=dict(
-                        family="Courier New, monospace",
-                        size=18,
-                        color="#7f7f7f"
+    # Perform ES job record query
+    if not streamed:
+        with log_stage(stage_log, 'query') as record:
+            # A refresh only needs the jobs changed since the last run
+            query_from = d_from if state is None else state['watermark']
+            if len(override_frame) != 0:
+                job_frame = override_frame
+            elif cache_dir != '':
+                job_frame = cached_sacct_jobs(account, query_from, d_to=d_to,
+                                              cache_dir=cache_dir)
+            else:
+                job_frame = slurm.sacct_jobs(account, query_from, d_to=d_to)
+            record['rows'] = len(job_frame)
+
+    # Compact dtypes, and on request drop the columns no figure reads
+    if compact and not streamed:
+        with log_stage(stage_log, 'compact', rows=len(job_frame)) as record:
+            keep = []
+            if prune_columns and not (plot_wait_viol or plot_runtime_viol):
+                # The violins hover every column, otherwise these are enough
+                keep = USAGE_COLUMNS + ['partition']
+            job_frame = compact_jobs(job_frame, columns=keep)
+            record['bytes'] = int(job_frame.memory_usage(deep=True).sum())
+
+    # Streamed runs fold the chunks straight into the usage series,
+    # incremental runs merge the stored jobs before any figure reads them
+    usage = None
+    if streamed:
+        with log_stage(stage_log, 'usage', streamed=True) as record:
+            usage, job_frame = stream_job_use(read_job_chunks(job_chunks),
+                                              d_from, target, d_to,
+                                              use_unit=use_unit,
+                                              stage_log=stage_log)
+            record['rows'] = int(job_frame['n_jobs'].sum())
+    elif state_path != '':
+        with log_stage(stage_log, 'usage', incremental=True) as record:
+            usage, job_frame, state = incremental_job_use(
+                job_frame, d_from, target, d_to, use_unit=use_unit,
+                state=state)
+            save_use_state(state_path, state)
+            if compact:
+                # Stored and new records do not share their categories
+                job_frame = compact_jobs(job_frame)
+            record['rows'] = len(job_frame)
+
+    if streamed:
+        # job_frame holds the per partition job_stats
+        print('Number of jobs in query: ' +
+              str(int(job_frame['n_jobs'].sum())))
+    else:
+        print('Number of jobs in query: '+str(len(job_frame)))
+        job_frame['waittime'] = job_frame['start'] - job_frame['submit']
+        job_frame['runtime'] = job_frame['end'] - job_frame['start']
+
+        job_frame['waittime_hours'] = (
+            job_frame['waittime'].dt.total_seconds() / 3600).astype('float32')
+        job_frame['runtime_hours'] = (
+            job_frame['runtime'].dt.total_seconds() / 3600).astype('float32')
+
+        job_frame['timelimit_hours'] = (job_frame[
+            'timelimit'].dt.total_seconds()/3600).astype('float32')
+
+    scatter_mode = resolve_render_mode(len(job_frame), render_mode,
+                                       webgl_threshold)
+
+    # Output file of each requested figure, by fig_dict key
+    figures = {}
+    # Queued figures are dropped and the pool shut down if any step raises
+    with FigWriter(plotlyjs_root, workers, pool, binary,
+                   stage_log) as writer:
+        # Figures of the job records are started before the usage is computed.
+        # job_stack adds its columns to a shallow copy, so that the frame
+        # other workers read is never modified under them.
+        if plot_jobstack:
+            fig_out = safe_folder + account + '_jobstack.html'
+            figures['fig_job_stack'] = fig_out
+            stack_frame = job_frame.copy(deep=False)
+            writer.submit(fig_out,
+                          lambda: job_stack(stack_frame, use_unit='cpu-eqv',
+                                            render_mode=render_mode,
+                                            webgl_threshold=webgl_threshold))
+
+        def start_wait():
+            fig_scat = px.scatter(job_frame,
+                                  x='start',
+                                  y='waittime_hours',
+                                  color="partition",
+                                  opacity=.3,
+                                  render_mode=scatter_mode)
+            fig_scat.update_layout(
+                title=go.layout.Title(
+                    text="Job scatter: "
+                ),
+                xaxis=go.layout.XAxis(
+                    title=go.layout.xaxis.Title(
+                        text="Start date Time",
+                        font=dict(
+                            family="Courier New, monospace",
+                            size=18,
+                            color="#7f7f7f"
+                        )
                     )
-                )
-            ),
-            yaxis=go.layout.YAxis(
-                title=go.layout.yaxis.Title(
-                    text='Wait time in hours',
-                    font=dict(
-                        family="Courier New, monospace",
-                        size=18,
-                        color="#7f7f7f"
+                ),
+                yaxis=go.layout.YAxis(
+                    title=go.layout.yaxis.Title(
+                        text='Wait time in hours',
+                        font=dict(
+                            family="Courier New, monospace",
+                            size=18,
+                            color="#7f7f7f"
+                        )
                     )
                 )
             )
-        )
-        fig_scat.write_html(safe_folder + account + '_start_wait.html')
-        fig_dict['fig_start_wait'] = fig_scat
-
-    if plot_wait_viol:
-        fig_viol = px.violin(job_frame, y="waittime_hours", color="partition",
-                             box=True, points="all",
-                             hover_data=job_frame.columns)
-
-        fig_viol.update_layout(
-            title=go.layout.Title(
-                text="wait time distributions: "
-            ),
-            xaxis=go.layout.XAxis(
-                title=go.layout.xaxis.Title(
-                    text="Partition",
-                    font=dict(
-                        family="Courier New, monospace",
-                        size=18,
-                        color="#7f7f7f"
+            return fig_scat
+
+        if plot_start_wait:
+            fig_out = safe_folder + account + '_start_wait.html'
+            figures['fig_start_wait'] = fig_out
+            writer.submit(fig_out, start_wait)
+
+        def wait_viol():
+            fig_viol = px.violin(job_frame, y="waittime_hours",
+                                 color="partition", box=True,
+                                 points="all",
+                                 hover_data=job_frame.columns)
+
+            fig_viol.update_layout(
+                title=go.layout.Title(
+                    text="wait time distributions: "
+                ),
+                xaxis=go.layout.XAxis(
+                    title=go.layout.xaxis.Title(
+                        text="Partition",
+                        font=dict(
+                            family="Courier New, monospace",
+                            size=18,
+                            color="#7f7f7f"
+                        )
                     )
-                )
-            ),
-            yaxis=go.layout.YAxis(
-                title=go.layout.yaxis.Title(
-                    text='Wait time in hours',
-                    font=dict(
-                        family="Courier New, monospace",
-                        size=18,
-                        color="#7f7f7f"
+                ),
+                yaxis=go.layout.YAxis(
+                    title=go.layout.yaxis.Title(
+                        text='Wait time in hours',
+                        font=dict(
+                            family="Courier New, monospace",
+                            size=18,
+                            color="#7f7f7f"
+                        )
                     )
                 )
             )
-        )
-        fig_viol.write_html(safe_folder + account + '_wait_viol.html')
-        fig_dict['fig_wait_viol'] = fig_viol
-
-    if plot_start_runtime:
-        fig_scat = px.scatter(job_frame,
-                              x='start',
-                              y='runtime_hours',
-                              color="partition",
-                              opacity=.3)
-        fig_scat.update_layout(
-            title=go.layout.Title(
-                text="Job scatter: "
-            ),
-            xaxis=go.layout.XAxis(
-                title=go.layout.xaxis.Title(
-                    text="Start date Time",
-                    font=dict(
-                        family="Courier New, monospace",
-                        size=18,
-                        color="#7f7f7f"
+            return fig_viol
+
+        if plot_wait_viol:
+            fig_out = safe_folder + account + '_wait_viol.html'
+            figures['fig_wait_viol'] = fig_out
+            writer.submit(fig_out, wait_viol)
+
+        def start_runtime():
+            fig_scat = px.scatter(job_frame,
+                                  x='start',
+                                  y='runtime_hours',
+                                  color="partition",
+                                  opacity=.3,
+                                  render_mode=scatter_mode)
+            fig_scat.update_layout(
+                title=go.layout.Title(
+                    text="Job scatter: "
+                ),
+                xaxis=go.layout.XAxis(
+                    title=go.layout.xaxis.Title(
+                        text="Start date Time",
+                        font=dict(
+                            family="Courier New, monospace",
+                            size=18,
+                            color="#7f7f7f"
+                        )
                     )
-                )
-            ),
-            yaxis=go.layout.YAxis(
-                title=go.layout.yaxis.Title(
-                    text='Elapsed time in hours',
-                    font=dict(
-                        family="Courier New, monospace",
-                        size=18,
-                        color="#7f7f7f"
+                ),
+                yaxis=go.layout.YAxis(
+                    title=go.layout.yaxis.Title(
+                        text='Elapsed time in hours',
+                        font=dict(
+                            family="Courier New, monospace",
+                            size=18,
+                            color="#7f7f7f"
+                        )
                     )
                 )
             )
-        )
-        fig_scat.write_html(safe_folder + account + '_start_runtime.html')
-        fig_dict['fig_start_runtime'] = fig_scat
-
-    if plot_runtime_viol:
-        fig_viol = px.violin(job_frame, y="runtime_hours", color="partition",
-                             box=True, points="all",
-                             hover_data=job_frame.columns)
-
-        fig_viol.update_layout(
-            title=go.layout.Title(
-                text="run time distributions: "
-            ),
-            xaxis=go.layout.XAxis(
-                title=go.layout.xaxis.Title(
-                    text="Partition",
-                    font=dict(
-                        family="Courier New, monospace",
-                        size=18,
-                        color="#7f7f7f"
+            return fig_scat
+
+        if plot_start_runtime:
+            fig_out = safe_folder + account + '_start_runtime.html'
+            figures['fig_start_runtime'] = fig_out
+            writer.submit(fig_out, start_runtime)
+
+        def runtime_viol():
+            fig_viol = px.violin(job_frame, y="runtime_hours",
+                                 color="partition", box=True,
+                                 points="all",
+                                 hover_data=job_frame.columns)
+
+            fig_viol.update_layout(
+                title=go.layout.Title(
+                    text="run time distributions: "
+                ),
+                xaxis=go.layout.XAxis(
+                    title=go.layout.xaxis.Title(
+                        text="Partition",
+                        font=dict(
+                            family="Courier New, monospace",
+                            size=18,
+                            color="#7f7f7f"
+                        )
                     )
-                )
-            ),
-            yaxis=go.layout.YAxis(
-                title=go.layout.yaxis.Title(
-                    text='Wait time in hours',
-                    font=dict(
-                        family="Courier New, monospace",
-                        size=18,
-                        color="#7f7f7f"
+                ),
+                yaxis=go.layout.YAxis(
+                    title=go.layout.yaxis.Title(
+                        text='Wait time in hours',
+                        font=dict(
+                            family="Courier New, monospace",
+                            size=18,
+                            color="#7f7f7f"
+                        )
                     )
                 )
             )
-        )
-        fig_viol.write_html(safe_folder + account + '_runtime_viol.html')
-        fig_dict['fig_runtime_viol'] = fig_viol
+            return fig_viol
+
+        if plot_runtime_viol:
+            fig_out = safe_folder + account + '_runtime_viol.html'
+            figures['fig_runtime_viol'] = fig_out
+            writer.submit(fig_out, runtime_viol)
+
+        # Compute usage in terms of core equiv, all variants in one pass
+        if usage is None:
+            with log_stage(stage_log, 'usage', rows=len(job_frame)):
+                usage = multi_job_use(job_frame, d_from, target, d_to=d_to,
+                                      use_unit=use_unit, stage_log=stage_log,
+                                      sparse_users=sparse_users)
+
+        clust_target = usage['clust']
+        queued = usage['queued']
+        running = usage['running']
+        run_running = usage['run_running']
+        q_queued = usage['q_queued']
+        user_running_cat = usage['user_run']
+        submit_run = usage['submit_run']
+        submit_req = usage['submit_req']
+
+        # Shared by the insta and cumu user stacks
+        user_rank = []
+        if max_users > 0:
+            user_rank = rank_users(user_running_cat)
+
+        # Add more to the suite as you like
+        if plot_insta:
+            fig_out = safe_folder+account+'_'+'insta_plot.html'
+            figures['fig_insta_plot'] = fig_out
+            writer.submit(fig_out,
+                          lambda: insta_plot(clust_target, queued, running,
+                                             user_run=user_running_cat,
+                                             submit_run=submit_run,
+                                             submit_req=submit_req,
+                                             running=run_running,
+                                             queued=q_queued,
+                                             query_bounds=True,
+                                             render_mode=render_mode,
+                                             webgl_threshold=webgl_threshold,
+                                             max_points=max_points,
+                                             max_users=max_users,
+                                             user_rank=user_rank))
+
+        if plot_cumu:
+            fig_out = safe_folder+account+'_'+'cumu_plot.html'
+            figures['fig_cumu_plot'] = fig_out
+            writer.submit(fig_out,
+                          lambda: cumu_plot(clust_target, queued, running,
+                                            user_run=user_running_cat,
+                                            submit_run=submit_run,
+                                            query_bounds=False,
+                                            render_mode=render_mode,
+                                            webgl_threshold=webgl_threshold,
+                                            max_points=max_points,
+                                            max_users=max_users,
+                                            user_rank=user_rank))
+
+        if plot_mem_delta:
+            with log_stage(stage_log, 'mem_delta'):
+                mem_handle = slurm.mem_info(
+                    d_from, account,
+                    fig_out=safe_folder + account + '_mem_delta.html')
+
+        written = writer.results()
+
+    # Holds figure handles such that they can be returned easily.
+    fig_dict = {}
+    for key in ('fig_job_stack', 'fig_insta_plot', 'fig_cumu_plot',
+                'fig_mem_delta', 'fig_start_wait', 'fig_wait_viol',
+                'fig_start_runtime', 'fig_runtime_viol'):
+        if key == 'fig_mem_delta' and plot_mem_delta:
+            fig_dict[key] = mem_handle
+        elif key in figures:
+            fig_dict[key] = written[figures[key]]
+
+    if dashboard:
+        page_name = safe_folder + account + '_dashboard.html'
+        with log_stage(stage_log, 'dashboard') as record:
+            write_dashboard(fig_dict, page_name, title=account + ' job use',
+                            plotlyjs_root=plotlyjs_root, binary=binary)
+            record['bytes'] = os.path.getsize(page_name)
 
     return fig_dict, job_frame
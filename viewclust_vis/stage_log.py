@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, max_rss_mb is then left out
+    resource = None
+
+
+class StageLog:
+    """Records the cost of each stage of a run, e.g. of show_job_use.
+
+    Each stage gives one record holding its 'stage' name, 'start' time
+    (seconds since the epoch), 'wall_s' and 'cpu_s' (CPU time of the
+    thread running the stage), 'max_rss_mb' (process high-water mark so
+    far) and, if given by the stage, 'rows' and 'bytes'. Stages running
+    on worker threads or processes are recorded as well, with their
+    'pid' and 'thread' name.
+
+    Parameters
+    -------
+    callback: callable, optional
+        Called with every record as soon as its stage ends, e.g. to feed
+        a monitoring system. Defaults to None.
+    trace_memory: boolean, optional
+        If True, tracemalloc is started and each record also gets
+        'peak_mb', the peak of traced memory during the stage. Tracing
+        slows the run down, and concurrent stages share one peak. Python
+        3.7 and 3.8 cannot reset the peak, records get 'delta_mb', the
+        change of traced memory over the stage, instead. Tracing goes on
+        until tracemalloc.stop() is called. Defaults to False.
+    context: dict, optional
+        Fields added to every record, e.g. {'account': account}.
+    """
+
+    def __init__(self, callback=None, trace_memory=False, context={}):
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.context = dict(context)
+        self.records = []
+        self._lock = threading.Lock()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """Times the enclosed block as stage name.
+
+        Yields the record, in which the block may set 'rows', 'bytes' or
+        any other field. info gives initial fields.
+        """
+
+        record = dict(self.context, stage=name, **info)
+        # reset_peak is new in Python 3.9
+        peak = self.trace_memory and hasattr(tracemalloc, 'reset_peak')
+        if peak:
+            tracemalloc.reset_peak()
+        elif self.trace_memory:
+            traced = tracemalloc.get_traced_memory()[0]
+        record['start'] = time.time()
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall
+            record['cpu_s'] = time.thread_time() - cpu
+            if peak:
+                record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+            elif self.trace_memory:
+                record['delta_mb'] = (tracemalloc.get_traced_memory()[0] -
+                                      traced) / 2**20
+            if resource is not None:
+                record['max_rss_mb'] = _max_rss_mb()
+            record['pid'] = os.getpid()
+            record['thread'] = threading.current_thread().name
+            self.add(record)
+
+    def add(self, record):
+        """Adds a finished record, e.g. one timed by another process."""
+
+        with self._lock:
+            self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def to_jsonl(self, path):
+        """Appends every record to path, one JSON object per line."""
+
+        with open(path, 'a', encoding='utf-8') as f_out:
+            for record in self.records:
+                f_out.write(json.dumps(record, default=str) + '\n')
+
+
+def log_stage(stage_log, name, **info):
+    """StageLog.stage of stage_log, or a no-op block if stage_log is None.
+
+    Lets instrumented functions time their stages unconditionally.
+    """
+
+    if stage_log is None:
+        return _no_stage(dict(stage=name, **info))
+    return stage_log.stage(name, **info)
+
+
+def _max_rss_mb():
+    """High-water mark of the process, ru_maxrss being in kB on Linux
+    and in bytes on macOS."""
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return max_rss / 2**20
+    return max_rss / 1024
+
+
+@contextmanager
+def _no_stage(record):
+    yield record
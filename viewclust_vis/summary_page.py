@@ -1,43 +1,232 @@
+from contextlib import contextmanager
 from datetime import datetime
-import glob
+import html
+import json
+import os
+import uuid
 
+# Bumped whenever the manifest layout changes, older files are ignored
+_MANIFEST_VERSION = 1
 
-def summary_page(folder_list, page_name):
+# Client side search over the index script written next to the pages
+_SEARCH = """
+    <input id="search" type="search" placeholder="Search reports"
+           oninput="searchReports(this.value)">
+    <div id="results"></div>
+    <script src="{index}"></script>
+    <script>
+    function searchReports(query) {{
+        var terms = query.toLowerCase().split(/\\s+/).filter(Boolean);
+        var out = [];
+        if (terms.length > 0) {{
+            for (var i = 0; i < VIEWCLUST_INDEX.length; i++) {{
+                var entry = VIEWCLUST_INDEX[i];
+                for (var j = 0; j < entry[2].length; j++) {{
+                    var label = entry[1] + '/' + entry[2][j];
+                    var lower = label.toLowerCase();
+                    if (terms.every(function (t) {{
+                            return lower.indexOf(t) >= 0; }})) {{
+                        var link = document.createElement('a');
+                        link.href = entry[0] + '/' + entry[2][j];
+                        link.textContent = label;
+                        out.push(link);
+                    }}
+                }}
+                if (out.length >= {max_results}) break;
+            }}
+        }}
+        var results = document.getElementById('results');
+        results.replaceChildren();
+        out.slice(0, {max_results}).forEach(function (link) {{
+            results.appendChild(link);
+            results.appendChild(document.createElement('br'));
+        }});
+    }}
+    </script>
+"""
+
+
+def summary_page(folder_list, page_name, manifest_path='', page_size=0,
+                 search=False, max_results=200):
     """Builds an html page containing links to all html files
     in a list of folders.
 
-    There's probably a library to do this properly but I just wanted
-    something low level for now.
+    Folders are scanned once each with os.scandir and the page is written
+    folder by folder, so that thousands of report folders never have to be
+    held in memory as one string.
 
     Parameters
     -------
-    folder_list:Generates the input frames for this function.
+    folder_list: list of str
         List of folders to check for html files.
     page_name: str
-        Output html page name
+        Output html page name. Links are written relative to the folder
+        of this page, so the page and the report folders (and any shared
+        plotly.js, see write_fig) can be moved or served together.
+    manifest_path: str, optional
+        JSON file remembering the html files of each folder along with
+        the folder modification time. Folders that did not change since
+        the previous call are not scanned again. The file is updated.
+        Defaults to empty, scanning every folder.
+    page_size: int, optional
+        Number of folders per page. Further pages are named after
+        page_name with a _2, _3, ... suffix and every page links to the
+        others. Defaults to 0, a single page.
+    search: boolean, optional
+        If True, a compact index of every link is written next to the
+        pages as <page_name stem>_index.js and each page gets a search box
+        filtering it in the browser. Defaults to False.
+    max_results: int, optional
+        Number of search results shown at most. Defaults to 200.
+
+    Returns
+    -------
+    pages: list of str
+        Names of the written pages, page_name first.
 
     See Also
     -------
     useSuite: Generates multiple figures per account
     """
 
-    out_page = """
+    page_dir = os.path.dirname(os.path.abspath(page_name))
+    stem, ext = os.path.splitext(page_name)
+
+    n_pages = 1
+    if page_size > 0 and len(folder_list) > page_size:
+        n_pages = -(-len(folder_list) // page_size)
+    else:
+        page_size = max(len(folder_list), 1)
+    pages = [page_name] + [stem + '_' + str(i + 1) + ext
+                           for i in range(1, n_pages)]
+
+    index_name = stem + '_index.js'
+    search_html = ''
+    if search:
+        search_html = _SEARCH.format(
+            index=html.escape(os.path.basename(index_name)),
+            max_results=max_results)
+
+    known = _load_manifest(manifest_path)
+    scanned = {}
+    index = []
+    stamp = str(datetime.now())
+
+    for i, page in enumerate(pages):
+        with _replace_file(page) as f_out:
+            f_out.write("""
     <!DOCTYPE html>
     <html>
     <body>
 
-    <h1>ViewClust Summary Page: """ + str(datetime.now()) + """</h1> """
+    <h1>ViewClust Summary Page: """ + stamp + """</h1> """)
+            f_out.write(search_html)
+            f_out.write(_page_links(pages, i))
+
+            for folder in folder_list[i * page_size:(i + 1) * page_size]:
+                if folder not in scanned:
+                    scanned[folder] = _scan_folder(folder, known.get(folder))
+                plots = scanned[folder][1]
+                folder_rel = os.path.relpath(os.path.abspath(folder),
+                                             page_dir).replace(os.sep, '/')
+                if search:
+                    index.append([folder_rel, folder, plots])
 
-    for folder in folder_list:
-        out_page += '<h2>' + folder + '</h2>'
-        for plot in glob.glob(folder+'/*.html'):
-            out_page += '<a href="'+plot+'">'+plot+'</a><br>'
+                label = html.escape(folder)
+                links = ['<h2>' + label + '</h2>']
+                for plot in plots:
+                    links.append('<a href="' +
+                                 html.escape(folder_rel + '/' + plot) + '">' +
+                                 label + '/' + html.escape(plot) +
+                                 '</a><br>')
+                f_out.write(''.join(links))
 
-    out_page += """
+            f_out.write(_page_links(pages, i))
+            f_out.write("""
     </body>
     </html>
+    """)
+
+    if search:
+        with _replace_file(index_name) as f_out:
+            f_out.write('var VIEWCLUST_INDEX = ')
+            json.dump(index, f_out, separators=(',', ':'))
+            f_out.write(';\n')
+
+    if manifest_path != '':
+        with _replace_file(manifest_path) as f_out:
+            json.dump({'version': _MANIFEST_VERSION,
+                       'folders': {folder: entry
+                                   for folder, entry in scanned.items()
+                                   if entry[0] is not None}},
+                      f_out, separators=(',', ':'))
+
+    return pages
+
+
+def _scan_folder(folder, known):
+    """Sorted html file names of folder, with the folder modification time.
+
+    known is the manifest entry of folder, reused if the folder did not
+    change since. A missing folder has no files and no time.
     """
 
-    # Dump string as html page
-    with open(page_name, 'w') as f_out:
-        f_out.write(out_page)
+    try:
+        mtime = os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        return [None, []]
+    if known is not None and known[0] == mtime:
+        return known
+
+    # Hidden files are skipped, as glob does
+    with os.scandir(folder) as entries:
+        plots = sorted(entry.name for entry in entries
+                       if entry.name.endswith('.html') and
+                       not entry.name.startswith('.') and entry.is_file())
+    return [mtime, plots]
+
+
+def _load_manifest(manifest_path):
+    """Folder entries of a manifest, empty if missing or outdated."""
+
+    if manifest_path == '' or not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, encoding='utf-8') as f_in:
+            manifest = json.load(f_in)
+    except ValueError:
+        return {}
+    if manifest.get('version') != _MANIFEST_VERSION:
+        return {}
+    return manifest['folders']
+
+
+def _page_links(pages, current):
+    """Links to every page of a paginated summary."""
+
+    if len(pages) == 1:
+        return ''
+    links = []
+    for i, page in enumerate(pages):
+        if i == current:
+            links.append('<b>' + str(i + 1) + '</b>')
+        else:
+            links.append('<a href="' +
+                         html.escape(os.path.basename(page)) + '">' +
+                         str(i + 1) + '</a>')
+    return '<p>Pages: ' + ' '.join(links) + '</p>'
+
+
+@contextmanager
+def _replace_file(path):
+    """Text file written under a temporary name and moved into place,
+    so that readers, e.g. a web server, never see a partial page."""
+
+    tmp_path = path + '.' + uuid.uuid4().hex + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f_out:
+            yield f_out
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
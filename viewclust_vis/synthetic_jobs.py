@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Common time limits and the partition slurm routes each of them to
+_TIMELIMITS = np.array([1, 3, 12, 24, 72, 168]) * 3600
+_TIMELIMIT_P = [.30, .25, .20, .15, .07, .03]
+_PARTITIONS = np.array(['cpubase_bycore_b1', 'cpubase_bycore_b2',
+                        'cpubase_bycore_b3', 'cpubase_bycore_b4',
+                        'cpubase_bycore_b5', 'cpubase_bycore_b6'])
+_REQCPUS = np.array([1, 2, 4, 8, 16, 32, 48])
+_REQCPUS_P = [.40, .15, .15, .12, .08, .06, .04]
+_MEM_PER_CPU = np.array([256, 1024, 2048, 4000, 8000, 16000])
+_MEM_PER_CPU_P = [.10, .25, .25, .25, .10, .05]
+_FINAL_STATES = np.array(['COMPLETED', 'FAILED', 'TIMEOUT', 'CANCELLED'])
+_FINAL_STATES_P = [.80, .10, .05, .05]
+
+
+def synthetic_jobs(n_jobs, d_from, d_to, n_users=20,
+                   account='def-synth_cpu', gpu_share=0.1, seed=0):
+    """Generates a random job frame shaped like slurm.sacct_jobs output.
+
+    Submissions are spread uniformly over the query period. Wait times are
+    log-normal, run times a random fraction of common time limits, and
+    states follow from the times as seen at d_to: jobs not started yet are
+    PENDING, jobs not ended yet RUNNING, with end set to d_to as sacct_jobs
+    does. Useful for benchmarks and tests without a slurm database.
+
+    Parameters
+    -------
+    n_jobs: int
+        Number of job records.
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    d_to: date str
+        End of the query period, e.g. '2020-01-01T00:00:00'.
+    n_users: int, optional
+        Number of distinct users. Defaults to 20.
+    account: str, optional
+        Account of every job. Defaults to 'def-synth_cpu'.
+    gpu_share: float, optional
+        Fraction of jobs requesting GPUs. Defaults to 0.1.
+    seed: int, optional
+        Seed of the random generator. Defaults to 0.
+
+    Returns
+    -------
+    DataFrame
+        One row per job, sorted by submit time.
+    """
+
+    rng = np.random.default_rng(seed)
+    t_from = pd.Timestamp(d_from)
+    t_to = pd.Timestamp(d_to)
+    period = int((t_to - t_from).total_seconds())
+
+    submit = np.sort(rng.integers(0, period, n_jobs))
+    wait = np.minimum(rng.lognormal(7, 1.5, n_jobs), 14 * 86400)
+    start = submit + wait.astype('int64')
+    limit_idx = rng.choice(len(_TIMELIMITS), n_jobs, p=_TIMELIMIT_P)
+    timelimit = _TIMELIMITS[limit_idx]
+    run = (timelimit * rng.beta(1.2, 2.5, n_jobs)).astype('int64') + 1
+    end = start + run
+
+    pending = start > period
+    running = ~pending & (end > period)
+    state = rng.choice(_FINAL_STATES, n_jobs, p=_FINAL_STATES_P)
+    state = state.astype(object)
+    state[running] = 'RUNNING'
+    state[pending] = 'PENDING'
+
+    reqcpus = rng.choice(_REQCPUS, n_jobs, p=_REQCPUS_P)
+    mem = reqcpus * rng.choice(_MEM_PER_CPU, n_jobs, p=_MEM_PER_CPU_P)
+    ngpus = np.where(rng.random(n_jobs) < gpu_share,
+                     rng.choice([1, 2, 4], n_jobs), 0)
+    billing = np.maximum(reqcpus, mem // 4096)
+
+    reqtres = pd.Series(['billing=' + b + ',cpu=' + c + ',mem=' + m + 'M,'
+                         'node=1' for b, c, m in zip(billing.astype(str),
+                                                     reqcpus.astype(str),
+                                                     mem.astype(str))])
+    has_gpu = ngpus > 0
+    reqtres[has_gpu] = reqtres[has_gpu] + ',gres/gpu=' + \
+        ngpus[has_gpu].astype(str)
+
+    submit_times = t_from + pd.to_timedelta(submit, unit='s')
+    start_times = t_from + pd.to_timedelta(start, unit='s')
+    end_times = t_from + pd.to_timedelta(end, unit='s')
+    return pd.DataFrame({
+        'jobid': (np.arange(n_jobs) + 1000000).astype(str),
+        'user': rng.choice(['user%02d' % i for i in range(n_users)],
+                           n_jobs),
+        'account': account,
+        'submit': submit_times,
+        'eligible': submit_times,
+        'start': start_times.where(~pending, pd.NaT),
+        'end': end_times.where(~(pending | running), t_to),
+        'timelimit': pd.to_timedelta(timelimit, unit='s'),
+        'state': state,
+        'reqcpus': reqcpus,
+        'ncpus': np.where(pending, 0, reqcpus),
+        'nnodes': 1,
+        'mem': mem,
+        'ngpus': ngpus,
+        'reqtres': reqtres,
+        'partition': _PARTITIONS[limit_idx],
+        'priority': rng.integers(1000, 2000000, n_jobs),
+    })
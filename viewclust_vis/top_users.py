@@ -0,0 +1,74 @@
+import pandas as pd
+
+from viewclust_vis.user_matrix import UserMatrix
+
+# Name of the trace holding every user outside the top N
+OTHER_USERS = 'other'
+
+
+def rank_users(user_run):
+    """Ranks users by their total usage over the whole query.
+
+    Parameters
+    -------
+    user_run: DataFrame or UserMatrix
+        Running usage per user, one column per user.
+        See get_users_run from viewclust.
+
+    Returns
+    -------
+    ranking: Series
+        Total usage per user, largest first. Ties keep the column order.
+    """
+
+    return user_run.sum(axis=0).sort_values(ascending=False, kind='stable')
+
+
+def top_users(user_run, max_users, ranking=[]):
+    """Keeps the max_users heaviest users and folds the rest together.
+
+    Parameters
+    -------
+    user_run: DataFrame or UserMatrix
+        Running usage per user, one column per user. A UserMatrix only
+        becomes dense for the returned columns.
+    max_users: int
+        Number of users kept as their own column. If 0 or if there are no
+        more users than that, user_run is returned unchanged, or dense.
+    ranking: Series, optional
+        Output of rank_users for user_run, to avoid ranking again when
+        the same users are plotted more than once.
+
+    Returns
+    -------
+    DataFrame
+        The top users by decreasing total usage, followed by an OTHER_USERS
+        column summing all remaining users. If a user is already named
+        OTHER_USERS, that column gets a numbered suffix, e.g. 'other (2)'.
+    """
+
+    sparse = isinstance(user_run, UserMatrix)
+    if max_users <= 0 or user_run.shape[1] <= max_users:
+        return user_run.dense() if sparse else user_run
+    if len(ranking) == 0:
+        ranking = rank_users(user_run)
+
+    top = list(ranking.index[:max_users])
+    label = _other_label(user_run.columns)
+    if sparse:
+        other = user_run.rest_sum(top).rename(label)
+        return pd.concat([user_run.dense(top), other], axis=1)
+    rest = user_run.columns.difference(top, sort=False)
+    other = user_run[rest].sum(axis=1).rename(label)
+    return pd.concat([user_run[top], other], axis=1)
+
+
+def _other_label(users):
+    """OTHER_USERS, numbered if it is already the name of a user."""
+
+    label = OTHER_USERS
+    suffix = 2
+    while label in users:
+        label = OTHER_USERS + ' (' + str(suffix) + ')'
+        suffix += 1
+    return label
@@ -0,0 +1,271 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+_VERSION = 2
+_HEADER = 'header.json'
+
+# Usage keys of the stored series, see multi_job_use, 'user_run' aside
+STORE_SERIES = ['clust', 'queued', 'running', 'run_running', 'q_queued',
+                'submit_run', 'submit_req']
+
+
+class UseStore:
+    """Usage series of one account kept on disk as memory mapped arrays.
+
+    Every series is one .npy file of fixed step samples, and header.json
+    holds its file name, first time and length, the step and the user
+    names of the 'user_run' frame. Reading a window maps the files and
+    slices them, so only the pages of the requested period are read from
+    disk, however long the stored history. insta_plot, cumu_plot,
+    viol_plot and use_suite take a store in place of their series.
+
+    Parameters
+    -------
+    store_path: str
+        Folder of the store, typically one per account. Created by the
+        first write.
+
+    Examples
+    -------
+    Keep each run's usage and plot a window of it later::
+
+        store = UseStore('stores/def-tk11br_cpu')
+        store.write(multi_job_use(jobs, d_from, target, d_to=d_to))
+        insta_plot(store=store, d_from='2021-01-01', fig_out='insta.html')
+    """
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+
+    def header(self):
+        """Contents of header.json, None if nothing was written yet."""
+
+        path = os.path.join(self.store_path, _HEADER)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f_in:
+            return json.load(f_in)
+
+    def write(self, usage, merge=True):
+        """Stores the series of a usage dict, as returned by multi_job_use.
+
+        Every series must have a fixed step index, the same for all of
+        them, as the hourly job_use series do. 'dist' is not stored, see
+        usage.
+
+        Parameters
+        -------
+        usage: dict
+            Series by usage key, see STORE_SERIES, and the 'user_run'
+            frame. Other keys are ignored.
+        merge: boolean, optional
+            If True, stored samples outside the new series are kept, so
+            that runs over consecutive periods build up one long history.
+            New samples replace stored ones. Defaults to True.
+        """
+
+        stored = self.header()
+        header = stored if merge else None
+        if header is None:
+            header = {'version': _VERSION, 'step': None, 'series': {},
+                      'users': []}
+        header['version'] = _VERSION
+
+        os.makedirs(self.store_path, exist_ok=True)
+        # Files of the stored header, removed once no longer referenced
+        replaced = []
+        if stored is not None and not merge:
+            replaced = [_series_file(name, info)
+                        for name, info in stored['series'].items()]
+        for name in STORE_SERIES + ['user_run']:
+            if name not in usage or len(usage[name]) == 0:
+                continue
+            values = usage[name]
+            start, step = _fixed_step(values.index)
+            if header['step'] is None:
+                header['step'] = step
+            elif step != header['step']:
+                raise AttributeError('invalid step, the store holds ' +
+                                     str(header['step']) + 's samples')
+
+            data = values.to_numpy(dtype='float64')
+            if name == 'user_run':
+                users = [str(user) for user in values.columns]
+                data, users = self._merge_users(header, data, users)
+                header['users'] = users
+            if name in header['series']:
+                start, data = self._merge(name, header, start, data)
+
+            # Each write gets new files, those of the current header stay
+            # as they are for the readers that loaded it
+            file_name = name + '.' + uuid.uuid4().hex + '.npy'
+            _save_array(os.path.join(self.store_path, file_name), data)
+            if merge and name in header['series']:
+                replaced.append(_series_file(name, header['series'][name]))
+            header['series'][name] = {'file': file_name, 'start': start,
+                                      'length': len(data)}
+
+        # Readers switch to the new files with the header
+        _save_header(os.path.join(self.store_path, _HEADER), header)
+        for file_name in replaced:
+            try:
+                os.remove(os.path.join(self.store_path, file_name))
+            except FileNotFoundError:
+                pass
+
+    def series(self, name, d_from='', d_to=''):
+        """Samples of one stored series between d_from and d_to.
+
+        Returns a Series, or for 'user_run' a DataFrame, whose values are
+        a read-only view of the mapped file.
+        """
+
+        header = self.header()
+        if header is None or name not in header['series']:
+            if name == 'user_run':
+                return pd.DataFrame()
+            return pd.Series(dtype='float64', index=pd.DatetimeIndex(
+                [], dtype='datetime64[ns]'))
+
+        try:
+            return self._window(header, name, d_from, d_to)
+        except FileNotFoundError:
+            missing = _series_file(name, header['series'][name])
+
+        # A write replaced the file since the header was read: read the
+        # new one once, a file gone for good is an error
+        header = self.header()
+        if (header is not None and name in header['series'] and
+                _series_file(name, header['series'][name]) != missing):
+            return self._window(header, name, d_from, d_to)
+        raise FileNotFoundError('store header references missing ' + missing)
+
+    def usage(self, d_from='', d_to=''):
+        """Every stored series between d_from and d_to, as a usage dict.
+
+        'dist' is recomputed over the window: the cumulative running
+        usage minus the cumulative target, both from the window start.
+        """
+
+        header = self.header()
+        names = header['series'] if header is not None else []
+        usage = {name: self.series(name, d_from, d_to) for name in names}
+        if 'clust' in usage and 'running' in usage:
+            sum_running = np.cumsum(usage['running'])
+            usage['dist'] = sum_running - np.cumsum(usage['clust'])
+        return usage
+
+    def _window(self, header, name, d_from, d_to):
+        """Maps the file of one series of header and slices the window."""
+
+        info = header['series'][name]
+        step = header['step']
+        # The index is generated, not read, and sliced as .loc would
+        index = pd.date_range(pd.Timestamp(info['start'], unit='s'),
+                              periods=info['length'],
+                              freq=pd.Timedelta(seconds=step))
+        window = index.slice_indexer(d_from if d_from != '' else None,
+                                     d_to if d_to != '' else None)
+        data = np.load(os.path.join(self.store_path,
+                                    _series_file(name, info)),
+                       mmap_mode='r')[window]
+        index = index[window]
+        if name == 'user_run':
+            return pd.DataFrame(data, index=index, columns=header['users'],
+                                copy=False)
+        return pd.Series(data, index=index, copy=False)
+
+    def _merge(self, name, header, start, data):
+        """New samples laid over the stored ones, gaps being NaN."""
+
+        info = header['series'][name]
+        step = header['step']
+        if (start - info['start']) % step != 0:
+            raise AttributeError('invalid index, not aligned with the '
+                                 'stored samples')
+        old = np.load(os.path.join(self.store_path,
+                                   _series_file(name, info)), mmap_mode='r')
+        first = min(start, info['start'])
+        last = max(start + len(data) * step, info['start'] + len(old) * step)
+        merged = np.full(((last - first) // step,) + data.shape[1:], np.nan)
+        pos = (info['start'] - first) // step
+        if old.ndim > 1:
+            # Stored users are the first columns of data, see _merge_users
+            merged[pos:pos + len(old), :old.shape[1]] = old
+        else:
+            merged[pos:pos + len(old)] = old
+        pos = (start - first) // step
+        merged[pos:pos + len(data)] = data
+        return first, merged
+
+    def _merge_users(self, header, data, users):
+        """Puts new user columns in the stored user order, new users last.
+
+        Stored users missing from the new frame are NaN over its period.
+        """
+
+        stored = header['users']
+        if 'user_run' not in header['series'] or stored == users:
+            return data, users
+        order = stored + [user for user in users if user not in stored]
+        columns = {user: col for col, user in enumerate(users)}
+        ordered = np.full((len(data), len(order)), np.nan)
+        for col, user in enumerate(order):
+            if user in columns:
+                ordered[:, col] = data[:, columns[user]]
+        return ordered, order
+
+
+def store_series(store, d_from='', d_to='', **given):
+    """Fills the series arguments of a plotting function from a store.
+
+    given maps usage keys (see STORE_SERIES, and 'user_run') to the value
+    passed for them. Empty ones are read from the d_from..d_to window of
+    store, the others are returned as passed. Values are returned in the
+    order of given.
+    """
+
+    filled = []
+    for name, values in given.items():
+        if len(values) == 0:
+            values = store.series(name, d_from, d_to)
+            if len(values) == 0:
+                values = []
+        filled.append(values)
+    return filled
+
+
+def _fixed_step(index):
+    """First time and step, in epoch seconds, of a fixed step index."""
+
+    seconds = index.to_numpy(dtype='datetime64[ns]').astype('int64') // 10**9
+    steps = np.diff(seconds)
+    if len(steps) == 0 or (steps != steps[0]).any() or steps[0] <= 0:
+        raise AttributeError('invalid index, a fixed step is needed')
+    return int(seconds[0]), int(steps[0])
+
+
+def _series_file(name, info):
+    """File name of a stored series, name.npy in version 1 stores."""
+
+    return info.get('file', name + '.npy')
+
+
+def _save_array(path, data):
+    """Writes an .npy file atomically."""
+
+    tmp_path = path + '.' + uuid.uuid4().hex + '.tmp'
+    with open(tmp_path, 'wb') as f_out:
+        np.save(f_out, np.ascontiguousarray(data, dtype='float64'))
+    os.replace(tmp_path, path)
+
+
+def _save_header(path, header):
+    tmp_path = path + '.' + uuid.uuid4().hex + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f_out:
+        json.dump(header, f_out)
+    os.replace(tmp_path, path)
@@ -1,8 +1,12 @@
 from pathlib import Path
-import viewclust as vc
 
+from viewclust_vis.cumu_plot import cumu_plot
+from viewclust_vis.insta_plot import insta_plot
 
-def use_suite(clust_info, cores_queued, cores_running, folder, submit_run=[]):
+
+def use_suite(clust_info, cores_queued, cores_running, folder, submit_run=[],
+              plotlyjs_root='', binary=False, store=None, d_from='',
+              d_to=''):
     """Creates a folder of a given name and creates figures inside of it.
 
     Function is intended to be called in a loop over a list of accounts.
@@ -26,6 +30,25 @@ def use_suite(clust_info, cores_queued, cores_running, folder, submit_run=[]):
         Draws a red line representing what would usage have looked like
         if jobs had started instantly. Allows for easier interpretation of
         the queued series. Defaults to not plotting.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs,
+        typically the parent of every account folder. Defaults to empty,
+        embedding plotly.js in each figure.
+    binary: boolean, optional
+        If True, figures are written with base64 typed arrays and epoch
+        offset dates, see encode_fig. Defaults to False.
+    store: UseStore, optional
+        If given, the series left empty are read from the store, over the
+        d_from to d_to window only. Defaults to None.
+    d_from: date str, optional
+        Beginning of the window read from store. Defaults to its start.
+    d_to: date str, optional
+        End of the window read from store. Defaults to its end.
+
+    Returns
+    -------
+    fig_dict: dict
+        The cumu_plot and insta_plot figures, e.g. for dashboard.
 
     See Also
     -------
@@ -40,8 +63,15 @@ def use_suite(clust_info, cores_queued, cores_running, folder, submit_run=[]):
     Path(safe_folder).mkdir(parents=True, exist_ok=True)
 
     # Add more to the suite as you like
-    vc.cumu_plot(clust_info, cores_queued, cores_running,
-                 fig_out=safe_folder + 'cumu_plot.html', submit_run=submit_run)
-    vc.insta_plot(clust_info, cores_queued, cores_running,
-                  fig_out=safe_folder + 'insta_plot.html',
-                  submit_run=submit_run)
+    cumu_handle = cumu_plot(clust_info, cores_queued, cores_running,
+                            fig_out=safe_folder + 'cumu_plot.html',
+                            submit_run=submit_run,
+                            plotlyjs_root=plotlyjs_root, binary=binary,
+                            store=store, d_from=d_from, d_to=d_to)
+    insta_handle = insta_plot(clust_info, cores_queued, cores_running,
+                              fig_out=safe_folder + 'insta_plot.html',
+                              submit_run=submit_run,
+                              plotlyjs_root=plotlyjs_root, binary=binary,
+                              store=store, d_from=d_from, d_to=d_to)
+
+    return {'fig_cumu_plot': cumu_handle, 'fig_insta_plot': insta_handle}
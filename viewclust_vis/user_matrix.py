@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+
+from viewclust.target_series import target_series
+
+from viewclust_vis.multi_job_use import _hour_means, job_events
+
+_HOUR = 3600
+_NAT = np.iinfo('int64').min
+
+
+class UserMatrix:
+    """Sparse running usage per user, one row of hourly samples per user.
+
+    Holds the same values as the user_run frame of get_users_run or
+    multi_job_use, in compressed sparse row form: only the hours in which
+    a user holds resources are stored. insta_plot, cumu_plot, rank_users
+    and top_users take it as user_run, and only the users actually drawn
+    become dense columns.
+
+    Parameters
+    -------
+    index: DatetimeIndex
+        Hourly sample times, shared by all users.
+    users: Index
+        User names, in row order.
+    indptr: ndarray of int
+        Entries of user i are indptr[i] to indptr[i + 1].
+    indices: ndarray of int
+        Position in index of each entry.
+    data: ndarray of float
+        Value of each entry.
+    """
+
+    def __init__(self, index, users, indptr, indices, data):
+        self.index = index
+        self.columns = pd.Index(users)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def shape(self):
+        """(samples, users), as for the equivalent frame."""
+
+        return len(self.index), len(self.columns)
+
+    @property
+    def nnz(self):
+        """Number of stored entries."""
+
+        return len(self.data)
+
+    def sum(self, axis=0):
+        """Total per user (axis 0) or per sample (axis 1), as a Series."""
+
+        if axis == 0:
+            rows = np.repeat(np.arange(len(self.columns)),
+                             np.diff(self.indptr))
+            totals = np.bincount(rows, self.data, len(self.columns))
+            return pd.Series(totals, index=self.columns)
+        totals = np.bincount(self.indices, self.data, len(self.index))
+        return pd.Series(totals, index=self.index)
+
+    def dense(self, users=None):
+        """Frame of the given users, all of them by default."""
+
+        if users is None:
+            rows = np.arange(len(self.columns))
+        else:
+            rows = self.columns.get_indexer(users)
+            if (rows < 0).any():
+                raise KeyError('unknown users')
+        frame = np.zeros((len(self.index), len(rows)))
+        for col, row in enumerate(rows):
+            lo, hi = self.indptr[row], self.indptr[row + 1]
+            frame[self.indices[lo:hi], col] = self.data[lo:hi]
+        return pd.DataFrame(frame, index=self.index,
+                            columns=self.columns[rows])
+
+    def rest_sum(self, users):
+        """Per sample total of every user not in users, as a Series."""
+
+        keep = np.ones(len(self.columns), dtype=bool)
+        keep[self.columns.get_indexer(users)] = False
+        rows = np.repeat(keep, np.diff(self.indptr))
+        totals = np.bincount(self.indices[rows], self.data[rows],
+                             len(self.index))
+        return pd.Series(totals, index=self.index)
+
+
+def user_matrix(jobs, d_from, d_to, use_unit='cpu'):
+    """Running usage per user as a UserMatrix, built from job records.
+
+    The sparse counterpart of get_users_run. Every job adds its usage to
+    the hours between its start and end events with one scatter-add over
+    all users at once, instead of one full length series per user.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job DataFrame typically generated by slurm/sacct_jobs.
+    d_from: date str
+        Beginning of the query period, on the hour,
+        e.g. '2019-04-01T00:00:00'.
+    d_to: date str
+        End of the query period, e.g. '2020-01-01T00:00:00'.
+    use_unit: str, optional
+        Usage unit to examine, see multi_job_use. Defaults to 'cpu'.
+
+    Returns
+    -------
+    UserMatrix
+        Running usage of every user of jobs, in order of appearance.
+        Jobs without a user are left out.
+    """
+
+    events = job_events(jobs, d_to, use_unit)
+    return events_matrix(events, jobs['user'].to_numpy(), d_from, d_to)
+
+
+def events_matrix(events, user_names, d_from, d_to):
+    """UserMatrix of the running series, see users_use of multi_job_use.
+
+    Hourly means follow job_use exactly: each user's events are averaged
+    over the seconds their spans cover, and uncovered hours are forward
+    filled.
+    """
+
+    index = target_series([(d_from, d_to, 0)]).index
+    first = index[0].value // 10**9
+    if first % _HOUR != 0:
+        raise AttributeError('invalid d_from, not on the hour')
+
+    codes, users = pd.factorize(user_names)
+    n_users = len(users)
+
+    # Start events add the job's use, end events remove it
+    times = np.concatenate((events['start'], events['end']))
+    weight = np.concatenate((events['use'], events['use']))
+    is_end = np.repeat([False, True], len(codes))
+    code = np.concatenate((codes, codes))
+    ok = (times != _NAT) & (code >= 0)
+    times, weight, is_end, code = times[ok], weight[ok], is_end[ok], code[ok]
+
+    if len(times) == 0:
+        return UserMatrix(index, users, np.zeros(n_users + 1, dtype='int64'),
+                          np.zeros(0, dtype='int64'), np.zeros(0))
+
+    spans = _user_spans(times, is_end, code, n_users)
+    # Both covered spans of each user, the second one only if separate
+    span_bounds = ((spans['lo0'], spans['end0'], spans['any']),
+                   (spans['lo1'], spans['end1'], spans['two']))
+
+    # Hours holding events or span bounds, as sorted user-major keys
+    hour_min = times.min() // _HOUR
+    n_cols = (times.max() + 1) // _HOUR - hour_min + 1
+    event_keys = code * n_cols + (times // _HOUR - hour_min)
+    bound_keys = []
+    for lo, end, present in span_bounds:
+        for bound in (lo, end):
+            keep = present & (bound // _HOUR <= spans['last_hour'])
+            rows = np.flatnonzero(keep)
+            bound_keys.append(rows * n_cols + (bound[rows] // _HOUR -
+                                               hour_min))
+    keys, inverse = np.unique(np.concatenate([event_keys] + bound_keys),
+                              return_inverse=True)
+    inverse = inverse[:len(event_keys)]
+    key_code = keys // n_cols
+    hour_lo = (keys % n_cols + hour_min) * _HOUR
+
+    # Weight and moment sums of each key hour, per event type
+    moment = weight * (times - times // _HOUR * _HOUR)
+    sums = {}
+    for name, sel in (('on', ~is_end), ('off', is_end)):
+        sums[name] = (np.bincount(inverse[sel], weight[sel], len(keys)),
+                      np.bincount(inverse[sel], moment[sel], len(keys)))
+    delta = sums['on'][0] - sums['off'][0]
+    level_end = pd.Series(delta).groupby(key_code).cumsum().to_numpy()
+    level = level_end - delta
+
+    mean = _hour_means(hour_lo, level,
+                       sums['on'] + (spans['max_on'][key_code],),
+                       sums['off'] + (spans['max_off'][key_code],),
+                       [(lo[key_code], end[key_code], present[key_code])
+                        for lo, end, present in span_bounds])
+    mean = pd.Series(mean).groupby(key_code).ffill().to_numpy()
+
+    # Hours between key hours hold the level after the previous key hour
+    # inside a span, or its mean forward filled outside of them
+    next_same = np.r_[key_code[1:] == key_code[:-1], False]
+    gap = np.where(next_same, np.r_[np.diff(hour_lo), 0] // _HOUR - 1, 0)
+    run_lo = hour_lo + _HOUR
+    in_span = np.zeros(len(keys), dtype=bool)
+    for lo, end, present in span_bounds:
+        in_span |= (present[key_code] & (run_lo >= lo[key_code]) &
+                    (run_lo + _HOUR <= end[key_code]))
+    run_value = np.where(in_span, level_end, mean)
+
+    # Rounding left overs of cancelled levels are not worth storing
+    tol = 1e-9 * max(1.0, np.abs(weight).max())
+    run_value[np.abs(run_value) < tol] = 0
+    mean[np.abs(mean) < tol] = 0
+    gap[run_value == 0] = 0
+
+    run_key = np.repeat(np.arange(len(keys)), gap)
+    run_step = np.arange(len(run_key)) - np.repeat(np.cumsum(gap) - gap, gap)
+    entry_code = np.concatenate((key_code, key_code[run_key]))
+    entry_hour = np.concatenate((hour_lo,
+                                 run_lo[run_key] + run_step * _HOUR))
+    entry_value = np.concatenate((mean, run_value[run_key]))
+
+    pos = (entry_hour - first) // _HOUR
+    keep = (pos >= 0) & (pos < len(index)) & (entry_value != 0)
+    entry_code, pos, entry_value = (entry_code[keep], pos[keep],
+                                    entry_value[keep])
+    order = np.lexsort((pos, entry_code))
+    indptr = np.r_[0, np.cumsum(np.bincount(entry_code, minlength=n_users))]
+    return UserMatrix(index, users, indptr, pos[order], entry_value[order])
+
+
+def _user_spans(times, is_end, code, n_users):
+    """Seconds covered per user, merged as in _hourly_mean.
+
+    Each event type spans from its first to its last event. The two spans
+    are sorted, and merged if they touch. 'end0' and 'end1' are one past
+    the last second of the first and second span.
+    """
+
+    spans = {}
+    for name, sel in (('on', ~is_end), ('off', is_end)):
+        t_min = np.full(n_users, np.iinfo('int64').max)
+        t_max = np.full(n_users, _NAT)
+        np.minimum.at(t_min, code[sel], times[sel])
+        np.maximum.at(t_max, code[sel], times[sel])
+        spans['min_' + name] = t_min
+        spans['max_' + name] = t_max
+    has_on = spans['max_on'] != _NAT
+    has_off = spans['max_off'] != _NAT
+
+    # Python tuple order: by first second, then by last second
+    on_first = has_on & (~has_off |
+                         (spans['min_on'] < spans['min_off']) |
+                         ((spans['min_on'] == spans['min_off']) &
+                          (spans['max_on'] <= spans['max_off'])))
+    lo0 = np.where(on_first, spans['min_on'], spans['min_off'])
+    hi0 = np.where(on_first, spans['max_on'], spans['max_off'])
+    lo1 = np.where(on_first, spans['min_off'], spans['min_on'])
+    hi1 = np.where(on_first, spans['max_off'], spans['max_on'])
+
+    two = has_on & has_off
+    merge = two & (lo1 <= hi0 + 1)
+    hi0 = np.where(merge, np.maximum(hi0, hi1), hi0)
+    two &= ~merge
+
+    spans.update(lo0=lo0, end0=hi0 + 1, lo1=lo1, end1=hi1 + 1,
+                 any=has_on | has_off, two=two,
+                 last_hour=np.where(two, hi1, hi0) // _HOUR)
+    return spans
@@ -1,9 +1,12 @@
 from datetime import datetime
 import plotly.graph_objects as go
 
+from viewclust_vis.use_store import store_series
+from viewclust_vis.write_fig import write_fig
+
 
 def viol_plot(d_from, cores_queued, cores_running, target, d_to='',
-              fig_out=''):
+              fig_out='', plotlyjs_root='', store=None):
     """Violin distribution usage plot.
 
     Parameters
@@ -23,6 +26,13 @@ def viol_plot(d_from, cores_queued, cores_running, target, d_to='',
     fig_out: str, optional
         Writes the generated figure to file as the given name.
         If empty, skips writing. Defaults to empty.
+    plotlyjs_root: str, optional
+        Folder holding one shared copy of plotly.js for all outputs.
+        If given, fig_out references it by relative path instead of
+        embedding it. Defaults to empty, embedding plotly.js.
+    store: UseStore, optional
+        If given, empty cores_queued and cores_running are read from the
+        store, over the d_from to d_to window only. Defaults to None.
 
     See Also
     -------
@@ -34,6 +44,14 @@ def viol_plot(d_from, cores_queued, cores_running, target, d_to='',
         now = datetime.now()
         d_to = now.strftime('%Y-%m-%dT%H:%M:%S')
 
+    if store is not None:
+        cores_queued, cores_running = store_series(
+            store, d_from, d_to, queued=cores_queued, running=cores_running)
+
+    if len(cores_queued) == 0 or len(cores_running) == 0:
+        raise AttributeError('invalid series, pass cores_queued and '
+                             'cores_running or a store holding them')
+
     fig = go.Figure()
     fig.add_trace(go.Violin(y=cores_running.loc[d_from:d_to].divide(
         int(target)) * 100,
@@ -68,4 +86,4 @@ def viol_plot(d_from, cores_queued, cores_running, target, d_to='',
         showlegend=False)
 
     if fig_out != '':
-        fig.write_html(fig_out)
+        write_fig(fig, fig_out, plotlyjs_root)
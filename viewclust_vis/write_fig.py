@@ -0,0 +1,277 @@
+import hashlib
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import plotly
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from viewclust_vis.encode_fig import encode_fig
+from viewclust_vis.stage_log import StageLog, log_stage
+
+# Cap on the default number of figure workers. Figure writing is mostly
+# memory bound, and callers such as batch_suite already run one process
+# per core.
+MAX_WORKERS = 4
+
+
+def plotlyjs_path(plotlyjs_root):
+    """Location of the shared plotly.js bundle inside an output root.
+
+    The file name carries the plotly version so that roots written by
+    different plotly releases never mix bundles.
+    """
+
+    return os.path.join(plotlyjs_root,
+                        'plotly-' + plotly.__version__ + '.min.js')
+
+
+def write_plotlyjs(plotlyjs_root):
+    """Writes the bundled plotly.js into plotlyjs_root if it is missing.
+
+    Works offline, the script comes from the installed plotly package.
+    The file is written under a temporary name and moved into place so
+    that concurrent writers never expose a partial bundle.
+
+    Parameters
+    -------
+    plotlyjs_root: str
+        Output root shared by all generated html files.
+
+    Returns
+    -------
+    js_path: str
+        Path of the shared plotly.js file.
+    """
+
+    js_path = plotlyjs_path(plotlyjs_root)
+    if not os.path.exists(js_path):
+        os.makedirs(plotlyjs_root, exist_ok=True)
+        tmp_path = js_path + '.' + uuid.uuid4().hex + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f_out:
+            f_out.write(get_plotlyjs())
+        os.replace(tmp_path, js_path)
+
+    return js_path
+
+
+def plotlyjs_src(fig_out, plotlyjs_root):
+    """Writes the shared plotly.js if needed and returns its path relative
+    to the folder of fig_out, as used in a script src attribute."""
+
+    js_path = write_plotlyjs(plotlyjs_root)
+    fig_dir = os.path.dirname(os.path.abspath(fig_out))
+    js_rel = os.path.relpath(os.path.abspath(js_path), fig_dir)
+    return js_rel.replace(os.sep, '/')
+
+
+def write_fig(fig, fig_out, plotlyjs_root='', binary=False, stage_log=None):
+    """Writes a figure to html, optionally against a shared plotly.js.
+
+    Parameters
+    -------
+    fig: plotly Figure or dict
+        Figure to write. A dict, as returned by fig.to_dict(), is written
+        without validating it again.
+    fig_out: str
+        Output html file name.
+    plotlyjs_root: str, optional
+        If given, plotly.js is written once into this folder and fig_out
+        references it by relative path instead of embedding ~3.5 MB of
+        script. Defaults to empty, embedding plotly.js as fig.write_html does.
+    binary: boolean, optional
+        If True, numeric arrays are written as base64 typed arrays and
+        dates as epoch offsets, see encode_fig. Defaults to False.
+    stage_log: StageLog, optional
+        If given, records the 'serialize' and 'write' stages of fig_out.
+    """
+
+    name = os.path.basename(fig_out)
+    with log_stage(stage_log, 'serialize', figure=name) as record:
+        if binary:
+            fig = encode_fig(fig)
+
+        include_plotlyjs = True
+        if plotlyjs_root != '':
+            include_plotlyjs = plotlyjs_src(fig_out, plotlyjs_root)
+
+        # A fixed div id keeps pages byte for byte reproducible
+        div_id = hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]
+        page = pio.to_html(fig, include_plotlyjs=include_plotlyjs,
+                           validate=not isinstance(fig, dict), div_id=div_id)
+        record['bytes'] = len(page)
+
+    with log_stage(stage_log, 'write', figure=name) as record:
+        with open(fig_out, 'w', encoding='utf-8') as f_out:
+            f_out.write(page)
+        record['bytes'] = os.path.getsize(fig_out)
+
+
+class FigWriter:
+    """Builds and writes figures on a pool while the caller goes on.
+
+    Figures are submitted one at a time, as soon as their inputs are
+    ready, and results waits for all of them. With a thread pool each
+    figure is built, serialized and written by a worker thread. With a
+    process pool the figure is built by the caller, then serialized and
+    written by a worker process, which sidesteps the GIL for the JSON
+    encoding of large figures.
+
+    Parameters
+    -------
+    plotlyjs_root: str, optional
+        See write_fig. Defaults to empty, embedding plotly.js.
+    workers: int, optional
+        Number of workers. 1 builds and writes every figure on submit,
+        without any pool. Defaults to 0, one per cpu up to MAX_WORKERS.
+    pool: str, optional
+        One of: {'thread', 'process'}. Defaults to 'thread'.
+    binary: boolean, optional
+        See write_fig. Defaults to False.
+    stage_log: StageLog, optional
+        If given, records the 'build', 'serialize' and 'write' stages of
+        every figure, including those run by worker processes.
+    """
+
+    def __init__(self, plotlyjs_root='', workers=0, pool='thread',
+                 binary=False, stage_log=None):
+        if pool not in ('thread', 'process'):
+            raise AttributeError('invalid pool')
+
+        self.plotlyjs_root = plotlyjs_root
+        self.binary = binary
+        self.stage_log = stage_log
+        self.process = pool == 'process'
+        self.order = []
+        self.figs = {}
+        self.futures = {}
+
+        if plotlyjs_root != '':
+            write_plotlyjs(plotlyjs_root)
+
+        if workers == 0:
+            workers = _default_workers()
+        self.executor = None
+        if workers > 1:
+            executor = (ProcessPoolExecutor if self.process
+                        else ThreadPoolExecutor)
+            self.executor = executor(max_workers=workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            # Figures not started yet are dropped with the failed run
+            for future in self.futures.values():
+                future.cancel()
+        self.close()
+
+    def submit(self, fig_out, build):
+        """Schedules the figure returned by build, a function taking no
+        argument, to be written to fig_out."""
+
+        self.order.append(fig_out)
+        if self.executor is None:
+            self.figs[fig_out] = self._build_and_write(fig_out, build)
+        elif self.process:
+            with log_stage(self.stage_log, 'build',
+                           figure=os.path.basename(fig_out)):
+                fig = build()
+            self.figs[fig_out] = fig
+            self.futures[fig_out] = self.executor.submit(
+                _write_logged, fig.to_dict(), fig_out, self.plotlyjs_root,
+                self.binary, self.stage_log is not None)
+        else:
+            self.futures[fig_out] = self.executor.submit(
+                self._build_and_write, fig_out, build)
+
+    def results(self):
+        """Waits for every submitted figure.
+
+        Returns
+        -------
+        figs: dict of str to plotly Figure
+            Written figures by output file name, in submission order.
+        """
+
+        figs = {}
+        for fig_out in self.order:
+            if fig_out not in self.futures:
+                figs[fig_out] = self.figs[fig_out]
+            elif self.process:
+                # Worker processes send back the records of their stages
+                for record in self.futures[fig_out].result():
+                    self.stage_log.add(record)
+                figs[fig_out] = self.figs[fig_out]
+            else:
+                figs[fig_out] = self.futures[fig_out].result()
+        return figs
+
+    def close(self):
+        """Waits for pending writes and shuts the pool down."""
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _build_and_write(self, fig_out, build):
+        with log_stage(self.stage_log, 'build',
+                       figure=os.path.basename(fig_out)):
+            fig = build()
+        write_fig(fig, fig_out, self.plotlyjs_root, self.binary,
+                  self.stage_log)
+        return fig
+
+
+def _write_logged(fig, fig_out, plotlyjs_root, binary, logged):
+    """Process pool entry: write_fig, returning the stage records."""
+
+    stage_log = StageLog() if logged else None
+    write_fig(fig, fig_out, plotlyjs_root, binary, stage_log)
+    return stage_log.records if logged else []
+
+
+def write_figs(builders, plotlyjs_root='', workers=0, pool='thread',
+               binary=False, stage_log=None):
+    """Builds and writes several figures concurrently.
+
+    Parameters
+    -------
+    builders: dict of str to callable
+        Output html file name mapped to a function taking no argument
+        and returning the figure to write there.
+    plotlyjs_root: str, optional
+        See write_fig. Defaults to empty, embedding plotly.js.
+    workers: int, optional
+        Number of workers. 1 builds and writes serially.
+        Defaults to 0, one per figure up to the cpu count and MAX_WORKERS.
+    pool: str, optional
+        One of: {'thread', 'process'}. See FigWriter.
+        Defaults to 'thread'.
+    binary: boolean, optional
+        See write_fig. Defaults to False.
+    stage_log: StageLog, optional
+        See FigWriter. Defaults to None.
+
+    Returns
+    -------
+    figs: dict of str to plotly Figure
+        Written figures, in the order of builders.
+    """
+
+    if workers == 0:
+        workers = max(min(len(builders), _default_workers()), 1)
+
+    with FigWriter(plotlyjs_root, workers, pool, binary,
+                   stage_log) as writer:
+        for fig_out, build in builders.items():
+            writer.submit(fig_out, build)
+        return writer.results()
+
+
+def _default_workers():
+    """One worker per cpu, up to MAX_WORKERS."""
+
+    return min(os.cpu_count() or 1, MAX_WORKERS)